@@ -0,0 +1,96 @@
+"""
+Shared helpers for the on-disk caches: data fingerprints and LRU pruning.
+"""
+from __future__ import annotations
+import hashlib, json, os, threading
+from pathlib import Path
+
+from .. import config
+
+_INDEX_FILE = "fingerprints.json"
+_memo: dict = {}
+_lock = threading.Lock()
+
+
+def cache_dir(*parts: str) -> Path:
+    """
+    Return (and create) a sub-directory of CACHE_DIR.
+    """
+    d = Path(config.CACHE_DIR).joinpath(*parts)
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def _hash_file(p: Path, block: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(p, "rb") as fh:
+        while chunk := fh.read(block):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fingerprint(path) -> str:
+    """
+    Content fingerprint of a data file: sha256 of the bytes plus the size.
+    The hash is only recomputed when size or mtime changed since last time,
+    so repeated calls cost a stat().
+    """
+    p  = Path(path).expanduser().resolve()
+    st = p.stat()
+    stamp = [st.st_size, st.st_mtime_ns]
+    with _lock:
+        hit = _memo.get(str(p))
+        if hit and hit[0] == stamp:
+            return hit[1]
+
+        index_path = cache_dir() / _INDEX_FILE
+        try:
+            index = json.loads(index_path.read_text())
+        except Exception:
+            index = {}
+        entry = index.get(str(p))
+        if entry and entry["stamp"] == stamp:
+            fp = entry["fp"]
+        else:
+            fp = f"{_hash_file(p)[:32]}-{st.st_size}"
+            index[str(p)] = {"stamp": stamp, "fp": fp}
+            tmp = index_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(index))
+            os.replace(tmp, index_path)
+        _memo[str(p)] = (stamp, fp)
+        return fp
+
+
+def touch(path: Path):
+    """
+    Mark a cache entry as recently used (mtime is the LRU clock).
+    """
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def prune_dir(root: Path, max_bytes: int, keep: tuple = ()):
+    """
+    Delete least-recently-used files under root until it fits in max_bytes.
+    Files sharing a stem (e.g. <key>.feather + <key>.json) go together.
+    """
+    groups: dict = {}
+    for f in root.iterdir():
+        if f.is_file():
+            g = groups.setdefault(f.stem.split(".")[0], [0, 0.0, []])
+            st = f.stat()
+            g[0] += st.st_size
+            g[1] = max(g[1], st.st_mtime)
+            g[2].append(f)
+
+    total = sum(g[0] for g in groups.values())
+    for stem, (size, _, files) in sorted(groups.items(), key=lambda kv: kv[1][1]):
+        if total <= max_bytes:
+            break
+        if stem in keep:
+            continue
+        for f in files:
+            f.unlink(missing_ok=True)
+        total -= size
@@ -0,0 +1,310 @@
+"""
+Host-side static checks on generated Python, run before a sandbox is used.
+
+validate(code, columns) looks for the failures that otherwise cost a full
+sandbox round trip:
+
+    syntax       the snippet does not parse
+    read_data    pd.read_csv / pd.read_excel / ... (df is already loaded)
+    column       df['x'] / df.loc[..., 'x'] with x not in the dataset
+    name         a name that is neither defined by the snippet nor in the
+                 sandbox's restricted builtins (open, isinstance, ...), read
+                 by a top-level statement that always runs
+    output       no output_data assignment (and no figure saved)
+
+and returns a traceback-shaped error for the debug prompt, or "" when the
+snippet may be run.  Every check only rejects what would certainly fail.
+"""
+from __future__ import annotations
+import ast, builtins, difflib, functools, threading
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+from .. import config
+from ..history import tracing
+from ..history import json_history as jh
+
+# put in the snippet's globals by the sandbox
+SANDBOX_NAMES = frozenset({"df", "__builtins__"})
+FRAME = "df"
+
+_stats: Counter = Counter()
+_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def safe_builtins() -> frozenset:
+    """
+    Names of the sandbox's restricted builtins (SAFE_BUILTINS of sandbox_entry).
+    """
+    from .sandbox.docker import sandbox_entry      # deferred: imports pandas
+    return frozenset(sandbox_entry.SAFE_BUILTINS)
+
+
+class Rejected(Exception):
+    def __init__(self, kind: str, node: Optional[ast.AST], message: str):
+        super().__init__(message)
+        self.kind, self.node, self.message = kind, node, message
+
+
+def _traceback(code: str, lineno: Optional[int], message: str, offset: Optional[int] = None) -> str:
+    """
+    Format a finding like the interpreter would, so the debug prompt reads the same.
+    """
+    lines = ["Traceback (most recent call last):"]
+    src = code.splitlines()
+    if lineno and 0 < lineno <= len(src):
+        lines.append(f'  File "<snippet>", line {lineno}, in <module>')
+        lines.append("    " + src[lineno - 1].strip())
+        if offset:
+            indent = len(src[lineno - 1]) - len(src[lineno - 1].lstrip())
+            lines.append("    " + " " * max(offset - 1 - indent, 0) + "^")
+    lines.append(message)
+    lines.append("(found by static checks before execution)")
+    return "\n".join(lines)
+
+
+def _bound_names(tree: ast.AST) -> set:
+    """
+    Every name the snippet binds anywhere (scopes are not distinguished).
+    """
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, ast.alias):
+            names.add((node.asname or node.name).split(".")[0])
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            names.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            names.add(node.rest)
+    return names
+
+
+def _pandas_names(tree: ast.AST) -> set:
+    """
+    Names the snippet binds to the pandas module (pd unless imported otherwise).
+    """
+    names = {"pd", "pandas"}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(a.asname or a.name for a in node.names if a.name == "pandas")
+    return names
+
+
+def _check_reads(tree: ast.AST):
+    pandas = _pandas_names(tree)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+                and isinstance(node.func.value, ast.Name) and node.func.value.id in pandas:
+            name = node.func.attr
+            if name.startswith("read_"):
+                raise Rejected("read_data", node,
+                               f"ContractError: {name}() is not allowed - the data is already "
+                               "loaded as the DataFrame `df`; use df directly.")
+
+
+# top-level statements that always run once reached (With descends into its body)
+_PLAIN_STMTS = (ast.Expr, ast.Assign, ast.AugAssign, ast.AnnAssign, ast.Delete,
+                ast.Import, ast.ImportFrom, ast.Assert, ast.Raise, ast.With)
+
+
+def _evaluated(node: ast.AST):
+    """
+    Nodes of a top-level statement that certainly run: not lambda bodies,
+    conditional branches, short-circuited operands or comprehension bodies.
+    """
+    if isinstance(node, ast.Lambda):
+        return
+    yield node
+    if isinstance(node, ast.IfExp):
+        children = [node.test]
+    elif isinstance(node, ast.BoolOp):
+        children = node.values[:1]
+    elif isinstance(node, (ast.ListComp, ast.SetComp, ast.GeneratorExp, ast.DictComp)):
+        children = [node.generators[0].iter]
+    elif isinstance(node, ast.With):
+        children = [*node.items, *node.body]
+    else:
+        children = ast.iter_child_nodes(node)
+    for child in children:
+        if isinstance(child, ast.stmt) and not isinstance(child, _PLAIN_STMTS):
+            continue
+        yield from _evaluated(child)
+
+
+def _check_names(tree: ast.Module):
+    """
+    Unbound names in statements that certainly run: top level, outside
+    try / if / loops / function bodies.
+    """
+    bound = _bound_names(tree) | safe_builtins() | SANDBOX_NAMES
+    top = [stmt for stmt in tree.body if isinstance(stmt, _PLAIN_STMTS)]
+    for node in (n for stmt in top for n in _evaluated(stmt)):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in bound:
+            hint = (" (not available in the sandbox's restricted builtins)"
+                    if hasattr(builtins, node.id) else "")
+            raise Rejected("name", node, f"NameError: name '{node.id}' is not defined{hint}")
+
+
+def _literal_keys(node: ast.AST):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple)) and all(
+            isinstance(e, ast.Constant) and isinstance(e.value, str) for e in node.elts):
+        return [e.value for e in node.elts]
+    return None
+
+
+def _on_labels(node: ast.AST) -> bool:
+    """
+    node is df.columns / df.axes or part of it (df.columns.values[0], ...).
+    """
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        if isinstance(node, ast.Attribute) and node.attr in ("columns", "axes") \
+                and isinstance(node.value, ast.Name) and node.value.id == FRAME:
+            return True
+        node = node.value
+    return False
+
+
+def _check_columns(tree: ast.AST, columns: list):
+    """
+    Literal column reads on the original df.  Skipped when df is rebound or
+    changed in ways that can add or rename columns the code may later read
+    (df.columns = ..., set_axis, rename, insert, ...).
+    """
+    known = set(columns)
+    created = set()
+    reads = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id == FRAME and not isinstance(node.ctx, ast.Load):
+            return                                          # df = ... : not the dataset any more
+        if isinstance(node, (ast.Attribute, ast.Subscript)) \
+                and not isinstance(node.ctx, ast.Load) and _on_labels(node):
+            return                                          # df.columns = ... : renamed
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+                and isinstance(node.func.value, ast.Name) and node.func.value.id == FRAME \
+                and (node.func.attr in {"insert", "rename", "set_axis", "set_index", "reset_index",
+                                       "pop"}
+                     or any(k.arg == "inplace" for k in node.keywords)):
+            return
+        target = None
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) \
+                and node.value.id == FRAME:
+            target = node.slice
+        elif isinstance(node, ast.Subscript) and isinstance(node.value, ast.Attribute) \
+                and node.value.attr == "loc" and isinstance(node.value.value, ast.Name) \
+                and node.value.value.id == FRAME and isinstance(node.slice, ast.Tuple) \
+                and len(node.slice.elts) == 2:
+            target = node.slice.elts[1]
+        if target is None:
+            continue
+        keys = _literal_keys(target)
+        if keys is None:
+            if not isinstance(node.ctx, ast.Load):
+                return                                      # df[name] = ... : unknown new column
+            continue
+        if isinstance(node.ctx, ast.Load):
+            reads.append((node, keys))
+        else:
+            created.update(keys)
+    for node, keys in sorted(reads, key=lambda r: (r[0].lineno, r[0].col_offset)):
+        for key in keys:
+            if key not in known and key not in created:
+                close = difflib.get_close_matches(key, columns, n=1)
+                hint = f" Did you mean '{close[0]}'?" if close else ""
+                raise Rejected("column", node,
+                               f"KeyError: '{key}' is not a column of df.{hint} "
+                               f"Columns: {', '.join(map(str, columns))}")
+
+
+def _check_output(tree: ast.AST):
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id == "output_data" and \
+                isinstance(node.ctx, ast.Store):
+            return
+        if isinstance(node, (ast.Global, ast.Nonlocal)) and "output_data" in node.names:
+            return
+        if isinstance(node, ast.Attribute) and node.attr == "savefig":
+            return                                          # a chart is the answer
+    raise Rejected("output", None,
+                   "ContractError: the code never assigns `output_data`; put the final "
+                   "answer in a variable called output_data.")
+
+
+def _find(code: str, columns: Optional[Iterable[str]]) -> Optional[Tuple[str, str]]:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        msg = f"SyntaxError: {e.msg}"
+        return "syntax", _traceback(code, e.lineno, msg, e.offset)
+    except ValueError as e:                                  # e.g. null bytes
+        return "syntax", _traceback(code, None, f"SyntaxError: {e}")
+    try:
+        _check_reads(tree)
+        _check_names(tree)
+        if columns:
+            _check_columns(tree, list(columns))
+        _check_output(tree)
+    except Rejected as r:
+        return r.kind, _traceback(code, getattr(r.node, "lineno", None), r.message)
+    return None
+
+
+def validate(code: str, columns: Optional[Iterable[str]] = None) -> str:
+    """
+    "" if the snippet may be run, else a traceback-like error message.
+    """
+    if not config.CODE_VALIDATION:
+        return ""
+    with tracing.span("code.validate") as s:
+        found = _find(code, columns)
+        kind = found[0] if found else "ok"
+        s.set(result=kind)
+    tracing.count("validate.checked")
+    with _lock:
+        _stats["checked"] += 1
+        _stats[kind] += 1
+    if not found:
+        return ""
+    tracing.count("validate.rejected")
+    tracing.count(f"validate.{kind}")
+    jh.logger.info(f"validation rejected a snippet before execution ({kind}): "
+                f"{found[1].splitlines()[-2]}")
+    return found[1]
+
+
+def stats() -> dict:
+    """
+    Programs checked, rejected, and rejections per kind in this process.
+    """
+    with _lock:
+        checked = _stats["checked"]
+        by_kind = {k: v for k, v in _stats.items() if k not in ("checked", "ok")}
+    rejected = sum(by_kind.values())
+    return {"checked": checked, "rejected": rejected,
+            "hit_rate": round(rejected / checked, 4) if checked else 0.0, **by_kind}
+
+
+def log_stats() -> Optional[str]:
+    """
+    Write the session's validation hit rate to the log and return the line.
+    """
+    st = stats()
+    if not st["checked"]:
+        return None
+    kinds = ", ".join(f"{k} {v}" for k, v in st.items()
+                      if k not in ("checked", "rejected", "hit_rate"))
+    line = (f"Static validation caught {st['rejected']} of {st['checked']} programs "
+            f"({st['hit_rate']:.0%}){': ' + kinds if kinds else ''}")
+    jh.logger.info(line)
+    return line
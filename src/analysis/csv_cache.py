@@ -0,0 +1,206 @@
+"""
+Content-addressed cache of parsed CSVs.
+
+The first parse of a CSV is written to CACHE_DIR/frames as Feather (Arrow),
+or as a pickle when pyarrow is not installed, next to a small JSON file with
+the dtypes pandas inferred.  Later sessions, and both sandbox backends, read
+that binary copy instead of parsing the CSV again.  CSVs too big to hold as
+one frame are written chunk by chunk during the streaming summary
+(StreamWriter, Feather only).
+"""
+from __future__ import annotations
+import importlib.util, json, os
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from .. import config
+from . import cache_utils
+
+if TYPE_CHECKING:  # pandas is imported on first use
+    import pandas as pd
+
+# probe without importing: pyarrow itself is only needed once a frame is written
+_FORMAT = "feather" if importlib.util.find_spec("pyarrow") else "pkl"
+
+
+def _frames_dir() -> Path:
+    return cache_utils.cache_dir("frames")
+
+
+def _meta_path(key: str) -> Path:
+    return _frames_dir() / f"{key}.json"
+
+
+def lookup(csv_path) -> Optional[Path]:
+    """
+    Return the cached binary copy of csv_path, or None if there is none yet.
+    """
+    if not config.CSV_CACHE_ENABLED:
+        return None
+    key  = cache_utils.fingerprint(csv_path)
+    meta = _meta_path(key)
+    if not meta.exists():
+        return None
+    data = _frames_dir() / json.loads(meta.read_text())["file"]
+    if not data.exists():
+        return None
+    cache_utils.touch(meta)
+    cache_utils.touch(data)
+    return data
+
+
+def data_path(csv_path) -> Path:
+    """
+    Best file for a sandbox to load: the cached copy if present, else the CSV.
+    """
+    return lookup(csv_path) or Path(csv_path)
+
+
+def read_frame(path) -> pd.DataFrame:
+    """
+    Load a frame from either a cached binary file or a plain CSV.
+    """
+    import pandas as pd
+    p = Path(path)
+    if p.suffix == ".feather":
+        return pd.read_feather(p)
+    if p.suffix == ".pkl":
+        return pd.read_pickle(p)
+    return pd.read_csv(p)
+
+
+def _restore_dtypes(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    for col, dt in dtypes.items():
+        if col in df.columns and str(df[col].dtype) != dt:
+            try:
+                df[col] = df[col].astype(dt)
+            except (TypeError, ValueError):
+                pass
+    return df
+
+
+def store(csv_path, df: pd.DataFrame) -> Optional[Path]:
+    """
+    Write df to the cache under the fingerprint of csv_path.
+    """
+    key   = cache_utils.fingerprint(csv_path)
+    fmt   = _FORMAT
+    out   = _frames_dir() / f"{key}.{fmt}"
+    tmp   = out.with_name(f"{key}.{os.getpid()}.tmp")
+    try:
+        if fmt == "feather":
+            try:
+                df.reset_index(drop=True).to_feather(tmp)
+            except Exception:
+                # e.g. mixed-type object columns Arrow refuses - pickle keeps them
+                fmt = "pkl"
+                out = _frames_dir() / f"{key}.pkl"
+        if fmt == "pkl":
+            df.to_pickle(tmp)
+        os.replace(tmp, out)
+    except Exception:
+        tmp.unlink(missing_ok=True)
+        return None
+
+    return _commit(csv_path, key, out, len(df), {c: str(t) for c, t in df.dtypes.items()})
+
+
+def _commit(csv_path, key: str, out: Path, rows: int, dtypes: dict) -> Path:
+    meta = {
+        "source": str(Path(csv_path).resolve()),
+        "file": out.name,
+        "rows": rows,
+        "dtypes": dtypes,
+    }
+    _meta_path(key).write_text(json.dumps(meta, ensure_ascii=False))
+    cache_utils.prune_dir(_frames_dir(), config.CSV_CACHE_MAX_BYTES, keep=(key,))
+    return out
+
+
+class StreamWriter:
+    """
+    Feather (Arrow IPC file) copy of a CSV written one chunk at a time.
+
+    Every chunk is cast to the first chunk's Arrow schema; integer columns
+    stay integer with nulls when a later chunk has missing values.  A chunk
+    that cannot be cast (e.g. text after an all-empty first chunk) abandons
+    the entry: the sandboxes then keep reading the CSV.
+    """
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.key  = cache_utils.fingerprint(csv_path)
+        self.out  = _frames_dir() / f"{self.key}.feather"
+        self.tmp  = self.out.with_name(f"{self.key}.{os.getpid()}.tmp")
+        self.rows = 0
+        self.failed = False
+        self._sink = self._writer = self._schema = None
+
+    @staticmethod
+    def available() -> bool:
+        return config.CSV_CACHE_ENABLED and _FORMAT == "feather"
+
+    def write(self, chunk: pd.DataFrame):
+        if self.failed:
+            return
+        import pyarrow as pa
+        try:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._writer is None:
+                # lz4 when built in, as DataFrame.to_feather does
+                codec = "lz4" if pa.Codec.is_available("lz4") else None
+                self._sink = pa.OSFile(str(self.tmp), "wb")
+                self._writer = pa.ipc.new_file(self._sink, table.schema,
+                                               options=pa.ipc.IpcWriteOptions(compression=codec))
+                self._schema = table.schema
+            elif not table.schema.equals(self._schema):
+                table = table.cast(self._schema)
+            self._writer.write_table(table)
+            self.rows += len(chunk)
+        except Exception:
+            self.abort()
+
+    def commit(self, dtypes: dict) -> Optional[Path]:
+        """
+        Finish the file and register it under the CSV's fingerprint.
+        """
+        if self.failed or self._writer is None:
+            self.abort()
+            return None
+        try:
+            self._writer.close()
+            self._sink.close()
+            os.replace(self.tmp, self.out)
+        except Exception:
+            self.abort()
+            return None
+        return _commit(self.csv_path, self.key, self.out, self.rows, dtypes)
+
+    def abort(self):
+        self.failed = True
+        for f in (self._writer, self._sink):
+            try:
+                if f is not None:
+                    f.close()
+            except Exception:
+                pass
+        self.tmp.unlink(missing_ok=True)
+
+
+def load(csv_path) -> pd.DataFrame:
+    """
+    Return the parsed CSV, from the cache when possible.
+    """
+    cached = lookup(csv_path)
+    if cached is not None:
+        try:
+            meta = json.loads(_meta_path(cache_utils.fingerprint(csv_path)).read_text())
+            return _restore_dtypes(read_frame(cached), meta["dtypes"])
+        except Exception:
+            pass  # unreadable entry - fall through and rebuild it
+
+    import pandas as pd
+    df = pd.read_csv(csv_path)
+    if config.CSV_CACHE_ENABLED:
+        store(csv_path, df)
+    return df
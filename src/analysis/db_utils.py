@@ -1,5 +1,25 @@
+from __future__ import annotations
 from pathlib import Path
-import sqlite3, pandas as pd
+import os, sqlite3, time
+from itertools import chain
+from typing import TYPE_CHECKING
+
+from .. import config
+from . import cache_utils
+
+if TYPE_CHECKING:  # pandas is imported on first use
+    import pandas as pd
+
+META_TABLE = "_csv_da_meta"
+
+# PRAGMAs for a one-shot bulk load into a private temp file
+_INGEST_PRAGMAS = (
+    "PRAGMA journal_mode=OFF",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA locking_mode=EXCLUSIVE",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-200000",
+)
 
 def csv_to_sqlite(df: pd.DataFrame, csv_path: str) -> Path:
     """
@@ -11,3 +31,113 @@ def csv_to_sqlite(df: pd.DataFrame, csv_path: str) -> Path:
     df.to_sql("data", con, if_exists="replace", index=False)
     con.close()
     return db_path
+
+def _affinity(dtype) -> str:
+    import pandas as pd
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+def quote(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+def query_deadline(db_path) -> float:
+    """
+    Wall-clock budget for one query, scaled to the database size.
+    """
+    gb = Path(db_path).stat().st_size / 1024**3
+    return min(config.SQL_TIMEOUT_S + config.SQL_TIMEOUT_PER_GB_S * gb, config.SQL_TIMEOUT_MAX_S)
+
+def stored_value(db_path: Path, key: str) -> str | None:
+    """
+    Entry of the DB's meta table, or None if unknown.
+    """
+    if not Path(db_path).exists():
+        return None
+    try:
+        con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            row = con.execute(
+                f"SELECT value FROM {META_TABLE} WHERE key = ?", (key,)
+            ).fetchone()
+        finally:
+            con.close()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+def stored_fingerprint(db_path: Path) -> str | None:
+    """
+    Fingerprint of the CSV the DB was built from, or None if unknown.
+    """
+    return stored_value(db_path, "fingerprint")
+
+def stored_rows(db_path: Path) -> int | None:
+    """
+    Row count of `data` recorded at ingest, or None if unknown.
+    """
+    rows = stored_value(db_path, "rows")
+    return int(rows) if rows else None
+
+def ingest_csv(csv_path, chunk_rows: int | None = None) -> Path:
+    """
+    Stream <csv> into the table  data  of <csv>.db without holding the whole
+    file in memory, and return the DB path.
+
+    The column list and declared types are fixed from the first chunk; every
+    chunk is bulk-inserted with executemany inside a single transaction into
+    a temp file that is atomically swapped in.  The source fingerprint is
+    stored in the DB, so an unchanged CSV is not ingested again.
+    """
+    csv_path = Path(csv_path)
+    db_path  = csv_path.with_suffix(".db")
+    fp = cache_utils.fingerprint(csv_path)
+    if stored_fingerprint(db_path) == fp:
+        return db_path
+
+    chunk_rows = chunk_rows or config.SQLITE_INGEST_CHUNK_ROWS
+    tmp = db_path.with_name(f"{db_path.name}.{os.getpid()}.tmp")
+    tmp.unlink(missing_ok=True)
+    t0 = time.perf_counter()
+    rows = 0
+    con = sqlite3.connect(tmp, isolation_level=None)
+    try:
+        for pragma in _INGEST_PRAGMAS:
+            con.execute(pragma)
+
+        import pandas as pd
+        reader = pd.read_csv(csv_path, chunksize=chunk_rows)
+        first  = next(reader)
+        cols   = list(first.columns)
+        con.execute(
+            "CREATE TABLE data ("
+            + ", ".join(f"{quote(c)} {_affinity(t)}" for c, t in first.dtypes.items())
+            + ")"
+        )
+        insert = f"INSERT INTO data VALUES ({', '.join('?' * len(cols))})"
+
+        con.execute("BEGIN")
+        for chunk in chain([first], reader):
+            chunk = chunk[cols]
+            # object dtype boxes numpy scalars into Python ints/floats sqlite3 can bind
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            con.executemany(insert, chunk.itertuples(index=False, name=None))
+            rows += len(chunk)
+        con.execute(f"CREATE TABLE {META_TABLE} (key TEXT PRIMARY KEY, value TEXT)")
+        con.executemany(
+            f"INSERT INTO {META_TABLE} VALUES (?, ?)",
+            [("fingerprint", fp), ("rows", str(rows))],
+        )
+        con.execute("COMMIT")
+        con.close()
+        os.replace(tmp, db_path)
+    except BaseException:
+        con.close()
+        tmp.unlink(missing_ok=True)
+        raise
+
+    dt = max(time.perf_counter() - t0, 1e-9)
+    print(f"🗄️  SQLite ingest: {rows:,} rows in {dt:.2f}s ({rows / dt:,.0f} rows/s) → {db_path.name}")
+    return db_path
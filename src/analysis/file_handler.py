@@ -1,30 +1,141 @@
-import pandas as pd
 from pathlib import Path
-from . import db_utils
+from .. import config
+from . import db_utils, csv_cache, cache_utils, profiler, index_advisor
+from ..history import tracing
+
+SAMPLE_SEED = 0  # fixed so the prompt (and its caches) stay stable across sessions
+
+def _reconcile(a, b):
+    """
+    Combine the dtypes pandas inferred for the same column in two chunks.
+    """
+    if a is None or a == b:
+        return b
+    import numpy as np
+    import pandas as pd
+    num = pd.api.types.is_numeric_dtype
+    is_bool = pd.api.types.is_bool_dtype
+    if num(a) and num(b) and not (is_bool(a) or is_bool(b)):
+        return np.result_type(a, b)             # int64 + float64 -> float64
+    if not num(a) and num(b):
+        return a                                # e.g. an all-NaN chunk of a text column
+    if num(a) and not num(b):
+        return b
+    return np.dtype(object)
+
+def summarize_csv(path, chunk_rows: int | None = None, sample_rows: int | None = None,
+                  column_profiler: "profiler.ColumnProfiler | None" = None,
+                  frame_writer: "csv_cache.StreamWriter | None" = None) -> dict:
+    """
+    Build the dataset summary in a single streaming pass over the CSV.
+    Peak memory is bounded by one chunk plus the reservoir sample.
+    A column_profiler and a frame_writer (the CSV cache copy), if given,
+    are fed the same chunks.
+    """
+    import numpy as np
+    import pandas as pd
+    chunk_rows  = chunk_rows or config.SUMMARY_CHUNK_ROWS
+    sample_rows = config.SUMMARY_SAMPLE_ROWS if sample_rows is None else sample_rows
+    rng = np.random.default_rng(SAMPLE_SEED)
+
+    columns, dtypes, head = None, {}, []
+    reservoir: list = []
+    seen = 0
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        if columns is None:
+            columns = chunk.columns.tolist()
+            head = chunk.head(5).to_dict(orient="records")
+        for c, t in chunk.dtypes.items():
+            dtypes[c] = _reconcile(dtypes.get(c), t)
+        if column_profiler is not None:
+            column_profiler.update(chunk)
+        if frame_writer is not None:
+            frame_writer.write(chunk)
+
+        # reservoir sampling (Algorithm R), vectorised over the chunk
+        n = len(chunk)
+        fill = max(0, min(sample_rows - len(reservoir), n))
+        if fill:
+            reservoir.extend(chunk.iloc[:fill].to_dict(orient="records"))
+        if n > fill and sample_rows:
+            pos  = np.arange(seen + fill, seen + n)
+            slot = rng.integers(0, pos + 1)
+            hits = np.flatnonzero(slot < sample_rows)
+            for i in hits:
+                reservoir[slot[i]] = chunk.iloc[fill + i].to_dict()
+        seen += n
+
+    return {
+        "columns": columns or [],
+        "rows": seen,
+        "dtypes": {c: str(t) for c, t in dtypes.items()},
+        "numeric_cols": [c for c, t in dtypes.items() if pd.api.types.is_numeric_dtype(t)],
+        "head": head,
+        "sample": reservoir,
+    }
 
 def load_csv(path: str):
     """
     Load a CSV file and return its contents along with a summary.
+    Files of STREAM_SUMMARY_MIN_BYTES or more are summarised out of core
+    and returned without a DataFrame (df is None).
     """
+    import pandas as pd  # deferred: importing this module must stay cheap
     p = Path(path).expanduser().resolve()
     if not p.exists() or p.suffix.lower() != ".csv":
         raise FileNotFoundError(f"{p} is not a valid CSV")
 
-    df = pd.read_csv(p)
-
-    # new functionality: convert to SQLite
-    db_path = db_utils.csv_to_sqlite(df, p)
-    # Generate a lightweight summary of the data
-    dtypes = {c: str(t) for c, t in df.dtypes.items()}
-    numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
-
-    summary = {
-        "path": str(p),                     
-        "columns": df.columns.tolist(),
-        "rows": len(df),
-        "dtypes": dtypes,
-        "numeric_cols": numeric_cols,
-        "head": df.head(5).to_dict(orient="records"),
-        "db_path": db_path,
-    }
+    with tracing.span("load_csv", path=p.name, bytes=p.stat().st_size) as s:
+        # new functionality: convert to SQLite (streamed, skipped when unchanged)
+        with tracing.span("sqlite.ingest"):
+            db_path = db_utils.ingest_csv(p)
+            index_advisor.reapply(db_path)
+
+        # column profile: reused from its sidecar, else computed in the same pass
+        fp = cache_utils.fingerprint(p)
+        profile = profiler.load(fp)
+        s.set(profile_cached=profile is not None)
+
+        if p.stat().st_size >= config.STREAM_SUMMARY_MIN_BYTES:
+            df = None
+            with tracing.span("summary", streaming=True):
+                col_prof = profiler.ColumnProfiler() if profile is None else None
+                # the sandboxes' binary copy is written in the same pass
+                writer = (csv_cache.StreamWriter(p)
+                          if csv_cache.StreamWriter.available() and csv_cache.lookup(p) is None
+                          else None)
+                try:
+                    summary = summarize_csv(p, column_profiler=col_prof, frame_writer=writer)
+                except BaseException:
+                    if writer is not None:
+                        writer.abort()
+                    raise
+                if col_prof is not None:
+                    profile = col_prof.result()
+                if writer is not None:
+                    s.set(frame_cached=writer.commit(summary["dtypes"]) is not None)
+        else:
+            with tracing.span("csv.parse"):
+                df = csv_cache.load(p)
+            with tracing.span("summary", streaming=False):
+                # Generate a lightweight summary of the data
+                dtypes = {c: str(t) for c, t in df.dtypes.items()}
+                numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+                k = min(config.SUMMARY_SAMPLE_ROWS, len(df))
+                summary = {
+                    "columns": df.columns.tolist(),
+                    "rows": len(df),
+                    "dtypes": dtypes,
+                    "numeric_cols": numeric_cols,
+                    "head": df.head(5).to_dict(orient="records"),
+                    "sample": df.sample(k, random_state=SAMPLE_SEED).to_dict(orient="records"),
+                }
+                if profile is None:
+                    profile = profiler.profile_frame(df)
+
+        if profiler.load(fp) is None:
+            profiler.save(fp, profile)
+        summary["profile"] = profile
+
+    summary = {"path": str(p), **summary, "db_path": db_path}
     return df, summary
@@ -0,0 +1,378 @@
+"""
+Index advisor for the per-session SQLite database (SQL mode).
+
+advise(db_path, queries) indexes the table `data` for the queries that were
+answered successfully - the SQL of the CSV's session histories
+(history_queries) or of a batch run:
+
+    plan        each distinct query goes through EXPLAIN QUERY PLAN; only
+                queries that scan `data` or sort in a temp B-tree are kept
+    candidates  from their WHERE / ON, GROUP BY and ORDER BY clauses:
+                equality columns then one range column, the grouping or
+                sort keys (after the equality columns), each filtered column
+    build       candidates of at least SQL_INDEX_MIN_USES queries, most used
+                first, up to SQL_INDEX_MAX indexes and SQL_INDEX_BUDGET of
+                the database size; ANALYZE then refreshes the statistics and
+                an index no query plan picks up is dropped again
+
+The advisor's indexes (csv_da_ix_*) are listed in the meta table under
+"indexes" and in <csv>.indexes.json next to the DB, so reapply() can build
+them again after a changed CSV is re-ingested.
+"""
+from __future__ import annotations
+import hashlib, json, re, sqlite3
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .. import config
+from ..history import tracing
+from ..history import json_history as jh
+from . import db_utils, sql_preflight
+
+PREFIX    = "csv_da_ix_"
+MAX_WIDTH = 4                 # columns per index
+SAMPLE    = 10_000            # rows sampled for the size estimate
+
+_TOKEN = re.compile(r"""
+    (?P<str>'(?:[^']|'')*')
+  | (?P<skip>--[^\n]*|/\*.*?\*/|\s+)
+  | (?P<id>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<num>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)
+  | (?P<op><=|>=|<>|!=|==|\|\||\S)
+""", re.X | re.S)
+_SCAN_DATA  = re.compile(r"^SCAN (?:TABLE )?data\b(?!.*\bUSING\b)")
+_USES_INDEX = re.compile(r"USING (?:COVERING )?INDEX (\S+)")
+_EQ_OPS     = {"=", "=="}
+_RANGE_OPS  = {"<", ">", "<=", ">="}
+_KEY_WORDS  = {"ASC", "DESC", "NULLS", "FIRST", "LAST"}
+# keywords that end the clause a column reference belongs to
+_RESETS     = {"SELECT", "FROM", "JOIN", "HAVING", "LIMIT", "OFFSET", "UNION",
+               "EXCEPT", "INTERSECT", "WINDOW", "VALUES"}
+
+
+def sidecar(db_path) -> Path:
+    return Path(db_path).with_suffix(".indexes.json")
+
+
+def history_queries(csv_path) -> List[str]:
+    """
+    SQL of every answered question in the CSV's session histories.
+    """
+    out = [r.get("code", "") for path in jh.history_files(csv_path)
+           for r in jh.read_rows(path)]
+    return [q for q in out if sql_preflight.first_keyword(q) in ("SELECT", "WITH")]
+
+
+# ── query analysis ─────────────────────────────────────────────────────────
+def _tokens(sql: str) -> List[Tuple[str, str]]:
+    out = []
+    for m in _TOKEN.finditer(sql):
+        kind = m.lastgroup
+        if kind == "skip":
+            continue
+        text = m.group()
+        if kind == "id":
+            text = text[1:-1].replace(text[0] * 2, text[0]) if text[0] != "[" else text[1:-1]
+        out.append((kind, text))
+    return out
+
+
+class _Frame:
+    """
+    Clause state of one parenthesis level.
+    """
+    def __init__(self, clause: Optional[str] = None):
+        self.clause, self.pending = clause, None
+        self.item: list = []
+        self.keys: list = []
+        self.plain = True
+
+
+def usage(sql: str, columns: Iterable[str]) -> dict:
+    """
+    Columns of `columns` a query compares with = / IN / IS ("eq") or < > /
+    BETWEEN ("range") in WHERE / ON, and its GROUP BY / ORDER BY key lists
+    ("group" / "order": leading plain-column keys, in order).
+    """
+    colmap = {c.lower(): c for c in columns}
+    toks = _tokens(sql)
+    eq, rng, keys = set(), set(), {"group": [], "order": []}
+
+    def column(tok) -> Optional[str]:
+        return colmap.get(tok[1].lower()) if tok[0] in ("word", "id") else None
+
+    def flush(f: _Frame):
+        item, f.item = f.item, []
+        if not f.plain or not item:
+            return
+        col = column(item[0])
+        if col and all(t[0] == "word" and t[1].upper() in _KEY_WORDS for t in item[1:]):
+            f.keys.append(col)
+        else:
+            f.plain = False
+
+    def close(f: _Frame):
+        if f.clause in keys:
+            flush(f)
+            if f.keys:
+                keys[f.clause].append(tuple(f.keys))
+        f.clause, f.pending, f.item, f.keys, f.plain = None, None, [], [], True
+
+    frames = [_Frame()]
+    for i, tok in enumerate(toks):
+        kind, text = tok
+        f = frames[-1]
+        up = text.upper() if kind == "word" else ""
+        if kind == "op" and text == "(":
+            if f.clause in keys:
+                f.item.append(tok)
+            frames.append(_Frame(f.clause if f.clause in ("where", "over") else None))
+        elif kind == "op" and text == ")":
+            if len(frames) > 1:
+                close(frames.pop())
+        elif kind == "op" and text == ";":
+            close(f)
+        elif up in _RESETS:
+            close(f)
+            f.clause = "select" if up == "SELECT" else None
+        elif up in ("WHERE", "ON"):
+            close(f)
+            f.clause = "where"
+        elif up == "OVER":
+            close(f)
+            f.clause = "over"
+        elif up in ("GROUP", "ORDER") and f.clause != "over":
+            close(f)
+            f.pending = up.lower()
+        elif up == "BY" and f.pending:
+            f.clause, f.pending = f.pending, None
+        elif f.clause in keys:
+            if kind == "op" and text == ",":
+                flush(f)
+            else:
+                f.item.append(tok)
+        elif f.clause == "where" and (col := column(tok)):
+            nxt  = toks[i + 1] if i + 1 < len(toks) else ("", "")
+            prev = toks[i - 1] if i else ("", "")
+            if prev == ("op", ".") and i >= 3:
+                prev = toks[i - 3]                     # alias.col
+            if nxt == ("op", "("):
+                continue                               # a function of the same name
+            nu = nxt[1].upper() if nxt[0] == "word" else ""
+            if (nxt[0] == "op" and nxt[1] in _EQ_OPS) or nu in ("IN", "IS") \
+                    or (prev[0] == "op" and prev[1] in _EQ_OPS):
+                eq.add(col)
+            elif (nxt[0] == "op" and nxt[1] in _RANGE_OPS) or nu == "BETWEEN" \
+                    or (prev[0] == "op" and prev[1] in _RANGE_OPS):
+                rng.add(col)
+    while frames:
+        close(frames.pop())
+    return {"eq": sorted(eq), "range": sorted(rng - eq), **keys}
+
+
+def candidates(u: dict) -> set:
+    """
+    Column tuples an index could serve the query with.
+    """
+    eq = list(u["eq"])
+    out = {(c,) for c in eq + u["range"]}
+    if eq or u["range"]:
+        out.add(tuple(eq + u["range"][:1]))
+    for k in u["group"]:
+        out.add(tuple(eq + [c for c in k if c not in eq]))
+    for k in u["order"]:
+        out.add(tuple(k))
+        if eq:
+            out.add(tuple(eq + [c for c in k if c not in eq]))
+    return {c[:MAX_WIDTH] for c in out if c}
+
+
+def _needs_index(plan: List[str]) -> bool:
+    return any(_SCAN_DATA.match(d) or "TEMP B-TREE" in d for d in plan)
+
+
+# ── database side ──────────────────────────────────────────────────────────
+def _name(cols: Tuple[str, ...]) -> str:
+    slug = re.sub(r"\W+", "_", "_".join(cols).lower()).strip("_")[:40]
+    return f"{PREFIX}{slug}_{hashlib.md5(repr(cols).encode()).hexdigest()[:6]}"
+
+
+def _existing(con: sqlite3.Connection) -> Dict[str, Tuple[str, ...]]:
+    """
+    Index name -> key columns of every index on data.
+    """
+    out = {}
+    for row in con.execute("PRAGMA index_list(data)").fetchall():
+        info = con.execute(f"PRAGMA index_info({db_utils.quote(row[1])})").fetchall()
+        out[row[1]] = tuple(r[2] for r in sorted(info))
+    return out
+
+
+def _used_bytes(con: sqlite3.Connection) -> int:
+    pages = con.execute("PRAGMA page_count").fetchone()[0]
+    free  = con.execute("PRAGMA freelist_count").fetchone()[0]
+    return (pages - free) * con.execute("PRAGMA page_size").fetchone()[0]
+
+
+def _estimate(con: sqlite3.Connection, cols: Tuple[str, ...], rows: int) -> int:
+    """
+    Approximate size of an index on cols: sampled key width plus rowid and
+    cell overhead per row.
+    """
+    widths = ", ".join(
+        f"avg(CASE typeof({q}) WHEN 'integer' THEN 4 WHEN 'real' THEN 8 WHEN 'null' THEN 0 "
+        f"ELSE length(CAST({q} AS BLOB)) END)" for q in map(db_utils.quote, cols))
+    avg = con.execute(f"SELECT {widths} FROM (SELECT * FROM data LIMIT {SAMPLE})").fetchone()
+    per_row = sum((w or 0) + 1 for w in avg) + 10
+    return int(rows * per_row * 1.1)
+
+
+def _create(con: sqlite3.Connection, name: str, cols: Tuple[str, ...]) -> int:
+    """
+    Build one index and return the bytes it added to the database.
+    """
+    before = _used_bytes(con)
+    con.execute(f"CREATE INDEX IF NOT EXISTS {db_utils.quote(name)} ON data ("
+                + ", ".join(map(db_utils.quote, cols)) + ")")
+    return max(_used_bytes(con) - before, 0)
+
+
+def _record(con: sqlite3.Connection, db_path, entries: List[dict]):
+    text = json.dumps(entries, ensure_ascii=False)
+    con.execute(f"INSERT OR REPLACE INTO {db_utils.META_TABLE} VALUES ('indexes', ?)", (text,))
+    sidecar(db_path).write_text(text, encoding="utf-8")
+
+
+def _recorded(db_path) -> List[dict]:
+    path = sidecar(db_path)
+    try:
+        return json.loads(path.read_text(encoding="utf-8")) if path.exists() else []
+    except ValueError:
+        return []
+
+
+def _connect(db_path) -> sqlite3.Connection:
+    # writable, autocommit; waits for the session's readers
+    return sqlite3.connect(db_path, timeout=30, isolation_level=None)
+
+
+def reapply(db_path) -> List[str]:
+    """
+    Build the recorded indexes missing from a (re-ingested) database; returns
+    their names.
+    """
+    entries = _recorded(db_path)
+    if not entries or not Path(db_path).exists():
+        return []
+    con = _connect(db_path)
+    try:
+        columns = {r[1] for r in con.execute("PRAGMA table_info(data)")}
+        present = _existing(con)
+        kept, built = [], []
+        for e in entries:
+            cols = tuple(e["columns"])
+            if not set(cols) <= columns:
+                continue                                  # column gone from the CSV
+            if e["name"] not in present:
+                with tracing.span("sql.index.create", index=e["name"]):
+                    e["bytes"] = _create(con, e["name"], cols)
+                built.append(e["name"])
+            kept.append(e)
+        if built:
+            con.execute("ANALYZE")
+        if built or len(kept) != len(entries):
+            _record(con, db_path, kept)
+    finally:
+        con.close()
+    if built:
+        jh.logger.info(f"Index advisor: rebuilt {', '.join(built)} in {Path(db_path).name}")
+    return built
+
+
+def advise(db_path, queries: Iterable[str]) -> List[dict]:
+    """
+    Create the indexes the queries would use; returns the new entries
+    ({"name", "columns", "uses", "bytes"}).
+    """
+    if not config.SQL_INDEX_ADVISOR or not Path(db_path).exists():
+        return []
+    queries = Counter(q.strip().rstrip(";") for q in queries if q and q.strip())
+    if not queries:
+        return []
+    with tracing.span("sql.index_advisor", queries=len(queries)) as s:
+        con = _connect(db_path)
+        try:
+            created = _advise(con, db_path, queries)
+        finally:
+            con.close()
+        s.set(created=len(created))
+    tracing.count("index_advisor.created", len(created))
+    for e in created:
+        jh.logger.info(f"Index advisor: created {e['name']} on ({', '.join(e['columns'])}), "
+                       f"{e['uses']} queries, {e['bytes']:,} bytes")
+    return created
+
+
+def _advise(con: sqlite3.Connection, db_path, queries: Counter) -> List[dict]:
+    columns = [r[1] for r in con.execute("PRAGMA table_info(data)")]
+    needy, score = [], Counter()
+    for sql, n in queries.items():
+        try:
+            plan = sql_preflight.explain(con, sql)
+        except (sqlite3.Error, PermissionError):
+            continue                                      # schema changed since
+        if not _needs_index(plan):
+            continue
+        needy.append(sql)
+        for cand in candidates(usage(sql, columns)):
+            score[cand] += n
+
+    present = _existing(con)
+    recorded = [e for e in _recorded(db_path) if e["name"] in present]
+
+    def covered(cols, by) -> bool:
+        return any(c[:len(cols)] == cols for c in by)
+
+    chosen: List[Tuple[str, ...]] = []
+    for cols, n in sorted(score.items(), key=lambda kv: (-kv[1], -len(kv[0]), kv[0])):
+        if n < config.SQL_INDEX_MIN_USES or covered(cols, present.values()):
+            continue
+        if not covered(cols, chosen):
+            chosen.append(cols)
+    # a chosen prefix of a longer chosen key is served by the longer index
+    chosen = [c for c in chosen if not covered(c, [o for o in chosen if len(o) > len(c)])]
+    chosen = chosen[:max(config.SQL_INDEX_MAX - len(recorded), 0)]
+    if not chosen:
+        return []
+
+    rows = db_utils.stored_rows(db_path) or con.execute("SELECT count(*) FROM data").fetchone()[0]
+    spent = sum(e.get("bytes", 0) for e in recorded)
+    budget = config.SQL_INDEX_BUDGET * max(_used_bytes(con) - spent, 0)
+    created = []
+    for cols in chosen:
+        if spent + _estimate(con, cols, rows) > budget:
+            continue
+        name = _name(cols)
+        with tracing.span("sql.index.create", index=name, columns=len(cols)):
+            size = _create(con, name, cols)
+        if spent + size > budget:
+            con.execute(f"DROP INDEX {db_utils.quote(name)}")
+            continue
+        spent += size
+        created.append({"name": name, "columns": list(cols), "uses": score[cols], "bytes": size})
+    if not created:
+        return []
+
+    con.execute("ANALYZE")
+    used = set()
+    for sql in needy:
+        for d in sql_preflight.explain(con, sql):
+            if m := _USES_INDEX.search(d):
+                used.add(m.group(1))
+    for e in [e for e in created if e["name"] not in used]:
+        con.execute(f"DROP INDEX {db_utils.quote(e['name'])}")
+        created.remove(e)
+    _record(con, db_path, recorded + created)
+    return created
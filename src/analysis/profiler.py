@@ -0,0 +1,173 @@
+"""
+Per-column profile of a dataset, computed in one vectorised pass.
+
+For every column: null count, min/max, approximate distinct count (KMV
+sketch), top-k values and a detected text format (date, currency,
+percentage, number with thousands separators).  The profile is persisted as
+a JSON sidecar keyed by the data fingerprint, so re-opening a file costs a
+single read.
+"""
+from __future__ import annotations
+import json, math
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from . import cache_utils
+
+if TYPE_CHECKING:  # numpy / pandas are imported on first use
+    import numpy as np
+    import pandas as pd
+
+KMV_K        = 1024     # sketch size for distinct counts (~3% error)
+TOP_K        = 5
+TOP_TRACKED  = 256      # candidate values kept per column between chunks
+FORMAT_SAMPLE = 1000    # non-null text values inspected for format detection
+FORMAT_MIN_SHARE = 0.9
+
+_FORMATS = {
+    "currency":   r"\s*[-+]?\s*[$€£¥]\s?\d[\d,]*(?:\.\d+)?\s*",
+    "percentage": r"\s*[-+]?\d+(?:\.\d+)?\s*%\s*",
+    "thousands":  r"\s*[-+]?\d{1,3}(?:,\d{3})+(?:\.\d+)?\s*",
+    "date":       r"\s*\d{4}[-/.]\d{1,2}[-/.]\d{1,2}(?:[ T]\d{1,2}:\d{2}(?::\d{2})?)?\s*"
+                  r"|\s*\d{1,2}[-/.]\d{1,2}[-/.]\d{4}\s*",
+}
+_UINT64_SPAN = float(2**64)
+
+
+def _py(v):
+    """
+    numpy scalar / NaN -> plain JSON value.
+    """
+    import numpy as np
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, float) and math.isnan(v):
+        return None
+    return v
+
+
+class _ColumnState:
+    def __init__(self):
+        import numpy as np
+        self.nulls   = 0
+        self.count   = 0
+        self.min     = None
+        self.max     = None
+        self.hashes  = np.empty(0, dtype=np.uint64)
+        self.top     = Counter()
+        self.samples: list = []
+        self.numeric = True
+
+
+class ColumnProfiler:
+    """
+    Accumulates a profile over one or more chunks of the same table.
+    """
+
+    def __init__(self):
+        self._cols: dict[str, _ColumnState] = {}
+
+    def update(self, chunk: pd.DataFrame):
+        import numpy as np
+        import pandas as pd
+        for name in chunk.columns:
+            s   = chunk[name]
+            st  = self._cols.setdefault(name, _ColumnState())
+            nn  = s.dropna()
+            st.nulls += int(len(s) - len(nn))
+            st.count += int(len(nn))
+            if nn.empty:
+                continue
+
+            is_num = pd.api.types.is_numeric_dtype(nn) and not pd.api.types.is_bool_dtype(nn)
+            st.numeric = st.numeric and is_num
+            if is_num:
+                lo, hi = nn.min(), nn.max()
+                st.min = lo if st.min is None else min(st.min, lo)
+                st.max = hi if st.max is None else max(st.max, hi)
+
+            # KMV distinct sketch: keep the K smallest 64-bit hashes seen so far
+            h = pd.util.hash_pandas_object(nn, index=False).to_numpy()
+            st.hashes = np.unique(np.concatenate([st.hashes, h]))[:KMV_K]
+
+            # heavy hitters: merge chunk counts, keep the strongest candidates
+            st.top.update(nn.value_counts().head(TOP_TRACKED).to_dict())
+            if len(st.top) > TOP_TRACKED:
+                st.top = Counter(dict(st.top.most_common(TOP_TRACKED)))
+
+            if not is_num and len(st.samples) < FORMAT_SAMPLE:
+                st.samples.extend(nn.astype(str).head(FORMAT_SAMPLE - len(st.samples)).tolist())
+
+    @staticmethod
+    def _distinct(hashes: np.ndarray) -> int:
+        if len(hashes) < KMV_K:
+            return int(len(hashes))
+        return int((KMV_K - 1) / (float(hashes[-1]) / _UINT64_SPAN))
+
+    @staticmethod
+    def _format(samples: list) -> str | None:
+        if not samples:
+            return None
+        import pandas as pd
+        s = pd.Series(samples, dtype=object)
+        for name, pattern in _FORMATS.items():
+            if s.str.fullmatch(pattern).mean() >= FORMAT_MIN_SHARE:
+                return name
+        return None
+
+    def result(self) -> dict:
+        out = {}
+        for name, st in self._cols.items():
+            col = {
+                "nulls": st.nulls,
+                "distinct": self._distinct(st.hashes),
+                "top": [[_py(v), int(c)] for v, c in st.top.most_common(TOP_K)],
+            }
+            if st.numeric and st.min is not None:
+                col["min"], col["max"] = _py(st.min), _py(st.max)
+            fmt = None if st.numeric else self._format(st.samples)
+            if fmt:
+                col["format"] = fmt
+            out[str(name)] = col
+        return out
+
+
+def profile_frame(df: pd.DataFrame) -> dict:
+    p = ColumnProfiler()
+    p.update(df)
+    return p.result()
+
+
+def _sidecar(fp: str) -> Path:
+    return cache_utils.cache_dir("profiles") / f"{fp}.json"
+
+
+def load(fp: str) -> dict | None:
+    """
+    Cached profile for this data fingerprint, if any.
+    """
+    try:
+        return json.loads(_sidecar(fp).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def save(fp: str, profile: dict):
+    _sidecar(fp).write_text(json.dumps(profile, ensure_ascii=False), encoding="utf-8")
+
+
+def compact(profile: dict, max_top: int = 3, max_len: int = 40) -> dict:
+    """
+    Prompt-sized form of the profile: drop empty fields and zero null
+    counts, trim top values.  min / max are kept even when 0.
+    """
+    out = {}
+    for name, col in profile.items():
+        c = {k: v for k, v in col.items()
+             if k != "top" and v is not None and not (k == "nulls" and v == 0)}
+        # spelling of categories matters; top values of free text / ids do not
+        if col.get("top") and 1 < col.get("distinct", 0) <= 50:
+            c["top"] = [str(v)[:max_len] for v, _ in col["top"][:max_top]]
+        out[name] = c
+    return out
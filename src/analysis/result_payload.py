@@ -0,0 +1,93 @@
+"""
+Host side of the sandbox result channel (the sandbox side is
+docker/sandbox_entry.py: BoundedStdout / encode_output).
+
+A large or tabular output_data does not come back inside result.json.  The
+sandbox writes it as an Arrow IPC file and result.json carries a descriptor
+
+    {"file": "output.arrow", "format": "arrow" | "pickle" | "json",
+     "rows": ..., "columns": [...], "bytes": ..., "preview": "<summary>",
+     "dropped": true  (only when over RESULT_MAX_BYTES; file is then None)}
+
+collect() moves the file to exports/outputs and turns the descriptor into the
+run's return_obj; only the preview is shown to the LLM, load() reads the full
+value back on demand.
+"""
+from __future__ import annotations
+import shutil, uuid
+from pathlib import Path
+from typing import Optional
+
+from .. import config
+
+OUTPUT_DIR = Path("exports/outputs")
+
+
+def sandbox_env() -> dict:
+    """
+    Size caps for sandbox_entry.py inside the box.
+    """
+    return {
+        "RESULT_STDOUT_MAX_CHARS": str(config.STDOUT_MAX_CHARS),
+        "RESULT_INLINE_MAX_BYTES": str(config.OUTPUT_INLINE_MAX_BYTES),
+        "RESULT_MAX_BYTES":        str(config.OUTPUT_MAX_BYTES),
+        "RESULT_PREVIEW_CHARS":    str(config.OUTPUT_PREVIEW_CHARS),
+        "RESULT_PREVIEW_ROWS":     str(config.OUTPUT_PREVIEW_ROWS),
+    }
+
+
+def collect(result: dict, out_dir: Path) -> dict:
+    """
+    Export an out-of-line output_data from out_dir and make its descriptor
+    the result's return_obj.
+    """
+    meta = result.pop("output", None)
+    if not meta:
+        return result
+    if meta.get("file"):
+        src  = Path(out_dir) / meta["file"]
+        dest = OUTPUT_DIR / f"output_{uuid.uuid4().hex[:12]}{src.suffix}"
+        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(src), dest)
+        meta["file"] = str(dest)
+    result["return_obj"] = {"output_file": meta.pop("file"), **meta}
+    return result
+
+
+def is_offloaded(obj) -> bool:
+    return isinstance(obj, dict) and "output_file" in obj and "preview" in obj
+
+
+def load(obj: dict):
+    """
+    Full output_data of an offloaded result (a DataFrame for arrow / pickle).
+    """
+    path = obj.get("output_file")
+    if not path:
+        raise ValueError(f"output_data was not kept: {obj['bytes']:,} bytes is over "
+                         "CSV_DA_OUTPUT_MAX_BYTES")
+    if obj["format"] == "json":
+        import json
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    import pandas as pd
+    return pd.read_feather(path) if obj["format"] == "arrow" else pd.read_pickle(path)
+
+
+def clip(text: str, limit: Optional[int] = None) -> str:
+    """
+    text cut to limit characters with a truncation marker.
+    """
+    limit = config.OUTPUT_PREVIEW_CHARS if limit is None else limit
+    if len(text) <= limit:
+        return text
+    return text[:limit] + f"\n...[{len(text) - limit:,} more characters]"
+
+
+def describe(obj: dict) -> str:
+    """
+    One-line description of an offloaded payload.
+    """
+    shape = f"{obj['rows']} rows x {len(obj['columns'])} columns, " if "rows" in obj else ""
+    where = (f"saved to {obj['output_file']}" if obj.get("output_file") else
+             "not kept (over CSV_DA_OUTPUT_MAX_BYTES)")
+    return f"{shape}{obj['bytes']:,} bytes as {obj['format']}, {where}"
@@ -0,0 +1,70 @@
+"""
+Cancellation of in-flight sandbox runs.
+
+A CancelToken is handed to a run; the backend registers how to stop it
+(SIGKILL the fork-server child, kill the container or subprocess,
+interrupt the SQLite connection) for as long as the run is in flight.
+Speculative rounds cancel the losing candidates this way.
+"""
+from __future__ import annotations
+import contextlib, threading
+from typing import Callable, List, Optional
+
+CANCELLED = "Sandbox run cancelled"
+
+
+class CancelToken:
+    """
+    One-shot: cancel() runs the registered stop hooks once; a hook
+    registered after that runs immediately.
+    """
+
+    def __init__(self):
+        self._lock  = threading.Lock()
+        self._hooks: List[Callable[[], None]] = []
+        self.cancelled = False
+
+    def cancel(self):
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            hooks, self._hooks = self._hooks, []
+        for fn in hooks:
+            _call(fn)
+
+    @contextlib.contextmanager
+    def hook(self, fn: Callable[[], None]):
+        """
+        Run fn on cancel() while the block is executing.
+        """
+        with self._lock:
+            late = self.cancelled
+            if not late:
+                self._hooks.append(fn)
+        if late:
+            _call(fn)
+        try:
+            yield
+        finally:
+            with self._lock:
+                if fn in self._hooks:
+                    self._hooks.remove(fn)
+
+
+def _call(fn: Callable[[], None]):
+    try:
+        fn()
+    except Exception:
+        pass        # the run is being abandoned; a failed stop must not mask that
+
+
+def on_cancel(token: Optional[CancelToken], fn: Callable[[], None]):
+    """
+    token.hook(fn), or a no-op context when the run is not cancellable.
+    """
+    return token.hook(fn) if token is not None else contextlib.nullcontext()
+
+
+def cancelled(token: Optional[CancelToken]) -> bool:
+    return token is not None and token.cancelled
@@ -0,0 +1,307 @@
+"""
+Static column-usage analysis of generated pandas code.
+
+projection(code, columns) returns the subset of `columns` a snippet can read
+from `df`, so a cold sandbox only loads those (USECOLS); it returns None,
+meaning "load everything", whenever the answer is not certain.
+
+A frame use is understood only when it ends in an explicit column selection:
+
+    df['a'], df[['a', 'b']], df.a, df.loc[rows, 'a' | ['a', 'b']]
+    df.groupby('k')['a'] / .agg({'a': ...}) / .agg(x=('a', ...)) / .size()
+    len(df), df.shape[0], df.index
+
+optionally after row-only steps (df[mask], sort_values, head, dropna(subset=),
+copy, ...).  A name bound to such a row-only chain (`d = df[df.a > 0]`) is
+tracked like df itself.  Any other use of a frame (df.describe(), print(df),
+df.iloc[...], passing df to a function, a non-literal key...) gives None.
+"""
+from __future__ import annotations
+import ast
+from typing import Dict, Iterable, List, Optional, Set
+
+FRAME = "df"
+
+# frame -> frame steps that keep every column
+_ROW_METHODS = {"sort_values", "sort_index", "head", "tail", "sample", "copy",
+                "nlargest", "nsmallest", "drop_duplicates", "dropna",
+                "reset_index", "set_index"}
+# row steps that consider *every* column unless subset= is given
+_NEED_SUBSET = {"drop_duplicates", "dropna"}
+_AGG_METHODS = {"agg", "aggregate"}
+
+
+class _Unknown(Exception):
+    pass
+
+
+def _read_only(name: str, tree: ast.AST, parent: Dict[ast.AST, ast.AST]) -> bool:
+    """
+    Every load of name is a subscript key (df[cols], df.loc[:, cols]) or an
+    argument of a method call (df.groupby(cols)), so the list cannot change.
+    """
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Name) and node.id == name
+                and isinstance(node.ctx, ast.Load)):
+            continue
+        up = parent.get(node)
+        if isinstance(up, ast.Tuple) and isinstance(parent.get(up), ast.Subscript) \
+                and parent[up].slice is up:
+            up = parent[up]
+        if isinstance(up, ast.keyword):
+            up = parent.get(up)
+            if isinstance(up, ast.Call) and isinstance(up.func, ast.Attribute):
+                continue
+            return False
+        if isinstance(up, ast.Subscript) and up.slice is not node and up.value is node:
+            return False                                # cols[0] / cols[0] = ...
+        if isinstance(up, ast.Subscript) and isinstance(up.ctx, ast.Load):
+            continue
+        if isinstance(up, ast.Call) and node in up.args \
+                and isinstance(up.func, ast.Attribute):
+            continue
+        return False                    # cols.append(...), f(cols), d = cols, ...
+    return True
+
+
+def _constants(tree: ast.AST) -> Dict[str, List[str]]:
+    """
+    Names bound exactly once, by `name = <string or list / tuple of strings>`;
+    a list must also never be mutated or handed to other code (_read_only).
+    """
+    stores: Dict[str, int] = {}
+    values: Dict[str, ast.AST] = {}
+    parent: Dict[ast.AST, ast.AST] = {}
+    for node in ast.walk(tree):
+        for child in ast.iter_child_nodes(node):
+            parent[child] = node
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            stores[node.id] = stores.get(node.id, 0) + 1
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 \
+                and isinstance(node.targets[0], ast.Name):
+            values[node.targets[0].id] = node.value
+    out = {}
+    for name, value in values.items():
+        if isinstance(value, ast.List) and not _read_only(name, tree, parent):
+            continue
+        if stores[name] == 1:
+            try:
+                out[name] = _literal_strings(value, {})
+            except _Unknown:
+                pass
+    return out
+
+
+def _literal_strings(node: ast.AST, consts: Dict[str, List[str]]) -> List[str]:
+    """
+    Strings named by a literal key / list of keys; raises _Unknown otherwise.
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [s for elt in node.elts for s in _literal_strings(elt, consts)]
+    if isinstance(node, ast.Name) and node.id in consts:
+        return list(consts[node.id])
+    raise _Unknown
+
+
+class _Analysis:
+    def __init__(self, tree: ast.AST, columns: Iterable[str]):
+        self.tree    = tree
+        self.columns = set(columns)
+        self.consts  = _constants(tree)
+        self.frames  = {FRAME}
+        self.used: Set[str] = set()
+        self.parent: Dict[ast.AST, ast.AST] = {}
+        for node in ast.walk(tree):
+            for child in ast.iter_child_nodes(node):
+                self.parent[child] = node
+
+    def keys(self, node: ast.AST) -> List[str]:
+        return _literal_strings(node, self.consts)
+
+    def add(self, names: Iterable[str]):
+        # unknown names are columns the snippet creates itself (or typos)
+        self.used.update(n for n in names if n in self.columns)
+
+    def _kw(self, call: ast.Call, name: str) -> Optional[ast.AST]:
+        return next((k.value for k in call.keywords if k.arg == name), None)
+
+    def _row_step(self, node: ast.AST) -> Optional[ast.AST]:
+        """
+        If node (a frame) is the subject of a row-only step, record the step's
+        columns and return the resulting frame expression.
+        """
+        up = self.parent.get(node)
+        if isinstance(up, ast.Subscript) and up.value is node and self._is_mask(up.slice):
+            return up                                  # df[mask] / df[a:b]
+        if isinstance(up, ast.Attribute) and up.value is node and up.attr in _ROW_METHODS:
+            call = self.parent.get(up)
+            if not (isinstance(call, ast.Call) and call.func is up):
+                return None
+            if up.attr in _NEED_SUBSET and self._kw(call, "subset") is None:
+                raise _Unknown
+            for arg in [*call.args, *(k.value for k in call.keywords)]:
+                try:
+                    self.add(self.keys(arg))
+                except _Unknown:
+                    if not isinstance(arg, ast.Constant):
+                        raise
+            return call
+        return None
+
+    def _is_mask(self, node: ast.AST) -> bool:
+        """
+        A row selector: a slice, a comparison / boolean combination, or a
+        method call on a frame expression (df['a'].isin(...), .notna(), ...).
+        """
+        if isinstance(node, (ast.Slice, ast.Compare, ast.BoolOp)):
+            return True
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Invert, ast.Not)):
+            return True
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr, ast.BitXor)):
+            return True
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            return any(isinstance(n, ast.Name) and n.id in self.frames for n in ast.walk(node))
+        return False
+
+    def _is_column(self, attr: ast.Attribute) -> bool:
+        """
+        df.<name> read as a column (not a method that happens to share its name).
+        """
+        call = self.parent.get(attr)
+        return attr.attr in self.columns and not (isinstance(call, ast.Call) and call.func is attr)
+
+    def _groupby(self, call: ast.Call) -> None:
+        """
+        df.groupby(keys) followed by a column selection, agg with explicit
+        columns, or size().
+        """
+        by = call.args[0] if call.args else self._kw(call, "by")
+        if by is None:
+            raise _Unknown
+        self.add(self.keys(by))
+        up = self.parent.get(call)
+        if isinstance(up, ast.Subscript) and up.value is call:
+            self.add(self.keys(up.slice))
+            return
+        if isinstance(up, ast.Attribute) and up.value is call:
+            if self._is_column(up):
+                self.add([up.attr])
+                return
+            inner = self.parent.get(up)
+            if not (isinstance(inner, ast.Call) and inner.func is up):
+                raise _Unknown
+            if up.attr == "size":
+                return
+            if up.attr in _AGG_METHODS:
+                if inner.args and isinstance(inner.args[0], ast.Dict) and not inner.keywords:
+                    self.add(self.keys(ast.List(elts=inner.args[0].keys)))
+                    return
+                if not inner.args and inner.keywords and all(
+                        isinstance(k.value, ast.Tuple) and k.value.elts for k in inner.keywords):
+                    self.add(s for k in inner.keywords for s in self.keys(k.value.elts[0]))
+                    return
+        raise _Unknown
+
+    def use(self, node: ast.AST) -> None:
+        """
+        Account for one load of a frame name; raises _Unknown if it may read
+        columns that cannot be named.
+        """
+        while True:
+            nxt = self._row_step(node)
+            if nxt is None:
+                break
+            node = nxt
+        up = self.parent.get(node)
+
+        if isinstance(up, ast.Subscript) and up.value is node:       # df['a'] / df[['a']]
+            self.add(self.keys(up.slice))
+            return
+        if isinstance(up, ast.Attribute) and up.value is node:
+            if self._is_column(up):                                   # df.a
+                self.add([up.attr])
+                return
+            if up.attr == "index":
+                return
+            if up.attr == "shape":
+                sub = self.parent.get(up)
+                if isinstance(sub, ast.Subscript) and isinstance(sub.slice, ast.Constant) \
+                        and sub.slice.value == 0:
+                    return
+                raise _Unknown
+            if up.attr == "loc":
+                sub = self.parent.get(up)
+                if isinstance(sub, ast.Subscript) and isinstance(sub.slice, ast.Tuple) \
+                        and len(sub.slice.elts) == 2:
+                    self.add(self.keys(sub.slice.elts[1]))
+                    return
+                raise _Unknown
+            if up.attr == "groupby":
+                call = self.parent.get(up)
+                if isinstance(call, ast.Call) and call.func is up:
+                    self._groupby(call)
+                    return
+            raise _Unknown
+        if isinstance(up, ast.Call) and isinstance(up.func, ast.Name) \
+                and up.func.id == "len" and up.args == [node]:
+            return
+        if isinstance(up, ast.Assign) and up.value is node and len(up.targets) == 1 \
+                and isinstance(up.targets[0], ast.Name):
+            if up.targets[0].id not in self.frames:
+                raise _Unknown      # alias picked up too late; handled by run()
+            return                  # d = <row-only chain on a frame>
+        raise _Unknown
+
+    def _derived_frames(self) -> Set[str]:
+        """
+        Names bound to a row-only chain on a tracked frame, to a fixpoint.
+        """
+        while True:
+            before = len(self.frames)
+            for node in ast.walk(self.tree):
+                if not (isinstance(node, ast.Assign) and len(node.targets) == 1
+                        and isinstance(node.targets[0], ast.Name)):
+                    continue
+                expr = node.value
+                while isinstance(expr, ast.Call) and isinstance(expr.func, ast.Attribute) \
+                        and expr.func.attr in _ROW_METHODS:
+                    expr = expr.func.value
+                while isinstance(expr, ast.Subscript) and self._is_mask(expr.slice):
+                    expr = expr.value
+                if isinstance(expr, ast.Name) and expr.id in self.frames \
+                        and expr is not node.value:
+                    self.frames.add(node.targets[0].id)
+                elif isinstance(node.value, ast.Name) and node.value.id in self.frames:
+                    self.frames.add(node.targets[0].id)          # plain alias
+            if len(self.frames) == before:
+                return self.frames
+
+    def run(self) -> Set[str]:
+        self._derived_frames()
+        for node in ast.walk(self.tree):
+            if isinstance(node, ast.Name) and node.id in self.frames:
+                if isinstance(node.ctx, ast.Load):
+                    self.use(node)
+                elif isinstance(node.ctx, ast.Del):
+                    raise _Unknown
+            elif isinstance(node, (ast.Global, ast.Nonlocal)) or (
+                    isinstance(node, ast.Name) and node.id in {"globals", "locals", "vars", "eval", "exec"}):
+                raise _Unknown
+        return self.used
+
+
+def projection(code: str, columns: Iterable[str]) -> Optional[List[str]]:
+    """
+    Columns of `columns` that `code` reads from df, in their original order,
+    or None when the whole frame must be loaded.
+    """
+    columns = list(columns)
+    try:
+        used = _Analysis(ast.parse(code), columns).run()
+    except (SyntaxError, ValueError, RecursionError, _Unknown):
+        return None
+    if not used or len(used) == len(set(columns)):
+        return None
+    return [c for c in columns if c in used]
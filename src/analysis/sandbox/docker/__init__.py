@@ -0,0 +1,5 @@
+"""
+Modules copied into the sandbox image (see Dockerfile), where they run as
+top-level scripts.  The host imports them from here as well, so the
+builtins whitelist, SQL caps and messages have a single source.
+"""
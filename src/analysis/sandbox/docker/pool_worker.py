@@ -0,0 +1,98 @@
+"""
+Long-lived worker for the warm container pool.
+
+pandas / matplotlib are imported and the session data is opened once; the
+host then drops jobs into /workspace/session/jobs and waits for a `done`
+marker.  Python snippets run in a forked child so nothing they do to `df`
+or the interpreter leaks into the next job.
+"""
+import json, os, sqlite3, time, traceback
+from pathlib import Path
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: F401  (warm import for snippets)
+import pandas as pd
+
+from sandbox_entry import load_frame, run_user, write_result
+from sql_driver import connect_ro, run_query
+
+SESSION   = Path("/workspace/session")
+JOBS      = SESSION / "jobs"
+HEARTBEAT = SESSION / "heartbeat"
+READY     = SESSION / "ready"
+POLL_SECONDS      = 0.01
+HEARTBEAT_SECONDS = 1.0
+
+
+def _run_python(job_dir: Path, df):
+    """
+    Fork a child that executes the snippet against the preloaded frame.
+    """
+    out_dir = job_dir / "out"
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.chdir(job_dir)
+            code_text = (job_dir / "snippet.py").read_text()
+            stdout, error, ret_obj = run_user(code_text, {"df": df})
+            write_result(out_dir, job_dir, stdout, error, ret_obj)
+        except BaseException:
+            write_result(out_dir, job_dir, "", traceback.format_exc(), None)
+        finally:
+            os._exit(0)
+
+    _, status = os.waitpid(pid, 0)
+    if not (out_dir / "result.json").exists():
+        write_result(out_dir, job_dir, "",
+                     f"Snippet process died (wait status {status}).", None)
+
+
+def _run_sql(job_dir: Path, con: sqlite3.Connection):
+    """
+    Run a read-only query on the worker's persistent connection.
+    """
+    query = (job_dir / "query.sql").read_text()
+    data  = Path(os.environ["DATA_PATH"])
+    result, err = run_query(con, query, float(os.environ.get("SQL_TIMEOUT_S", "30")), data,
+                            job_dir / "out")
+    (job_dir / "out" / "result.json").write_text(json.dumps(
+        dict(stdout="", error=err, return_obj=result, plots=[]),
+        ensure_ascii=False))
+
+
+def main():
+    kind = os.environ.get("POOL_KIND", "python")
+    data = Path(os.environ["DATA_PATH"])
+    if kind == "sql":
+        state = connect_ro(data)
+        runner = _run_sql
+    else:
+        state = load_frame(data)
+        runner = _run_python
+
+    JOBS.mkdir(exist_ok=True)
+    READY.write_text(str(os.getpid()))
+    last_beat = 0.0
+    while True:
+        now = time.monotonic()
+        if now - last_beat >= HEARTBEAT_SECONDS:
+            HEARTBEAT.touch()
+            last_beat = now
+
+        tickets = sorted(JOBS.glob("*.job"))
+        if not tickets:
+            time.sleep(POLL_SECONDS)
+            continue
+        for ticket in tickets:
+            job_dir = JOBS / ticket.stem
+            ticket.unlink()
+            try:
+                runner(job_dir, state)
+            except Exception:
+                write_result(job_dir / "out", job_dir, "", traceback.format_exc(), None)
+            (job_dir / "done").touch()
+
+
+if __name__ == "__main__":
+    main()
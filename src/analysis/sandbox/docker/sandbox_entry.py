@@ -1,7 +1,16 @@
 """
 Run user-provided code in a sandboxed environment.
+
+Result channel (see src/analysis/result_payload.py for the host side):
+stdout is capped at RESULT_STDOUT_MAX_CHARS, keeping its head and tail around
+a truncation marker.  A small JSON-serialisable output_data travels inline in
+result.json; DataFrames / Series / arrays and anything over
+RESULT_INLINE_MAX_BYTES are written next to it as an Arrow IPC file
+(output.arrow) and result.json only carries a descriptor with a short
+preview.  Payloads over RESULT_MAX_BYTES are dropped, keeping the preview.
 """
 import json, io, contextlib, importlib.util, traceback, os, sys, types, uuid, inspect
+from collections import deque
 from pathlib import Path
 import pandas as pd 
 
@@ -16,6 +25,56 @@ SAFE_BUILTINS = {
 }
 
 
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, str(default)))
+
+
+class BoundedStdout(io.TextIOBase):
+    """
+    stdout replacement that keeps the first and last limit/2 characters.
+    """
+
+    def __init__(self, limit: int):
+        self.half    = max(limit // 2, 1)
+        self.head    = []
+        self.head_n  = 0
+        self.tail    = deque()
+        self.tail_n  = 0
+        self.dropped = 0
+
+    def writable(self):
+        return True
+
+    def write(self, s: str) -> int:
+        n = len(s)
+        room = self.half - self.head_n
+        if room > 0:
+            self.head.append(s[:room])
+            self.head_n += len(self.head[-1])
+            s = s[room:]
+        if s:
+            self.tail.append(s)
+            self.tail_n += len(s)
+            excess = self.tail_n - self.half
+            while excess > 0:
+                first = self.tail[0]
+                cut = min(len(first), excess)
+                if cut == len(first):
+                    self.tail.popleft()
+                else:
+                    self.tail[0] = first[cut:]
+                self.tail_n  -= cut
+                self.dropped += cut
+                excess       -= cut
+        return n
+
+    def getvalue(self) -> str:
+        out = "".join(self.head)
+        if self.dropped:
+            out += f"\n...[stdout truncated: {self.dropped:,} characters omitted]...\n"
+        return out + "".join(self.tail)
+
+
 def run_user(code_text: str, local_ctx: dict):
     """
     Execute user code in a controlled environment with restricted builtins.
@@ -25,7 +84,7 @@ def run_user(code_text: str, local_ctx: dict):
         g (dict): The execution context including any output data.
     """
     g = {"__builtins__": SAFE_BUILTINS, **local_ctx}
-    out_buf = io.StringIO()
+    out_buf = BoundedStdout(_env_int("RESULT_STDOUT_MAX_CHARS", 20000))
     err = ""
     try:
         with contextlib.redirect_stdout(out_buf):
@@ -34,6 +93,143 @@ def run_user(code_text: str, local_ctx: dict):
         err = traceback.format_exc()
     return out_buf.getvalue(), err, g.get("output_data")
 
+def load_frame(path: Path, usecols=None) -> pd.DataFrame:
+    """
+    Load the session data: a cached Feather / pickle copy or the raw CSV,
+    optionally only the columns in usecols.
+    """
+    if path.suffix == ".feather":
+        return pd.read_feather(path, columns=usecols)
+    if path.suffix == ".pkl":
+        df = pd.read_pickle(path)
+        return df[usecols] if usecols else df
+    return pd.read_csv(path, usecols=usecols)
+
+
+def env_usecols():
+    """
+    Column projection chosen by the host (USECOLS, a JSON list), or None.
+    """
+    raw = os.environ.get("USECOLS")
+    return json.loads(raw) if raw else None
+
+def _as_frame(obj):
+    """
+    DataFrame view of a tabular output_data, or None.
+    """
+    if isinstance(obj, pd.DataFrame):
+        return obj
+    if isinstance(obj, pd.Series):
+        return obj.to_frame(obj.name if obj.name is not None else "value")
+    if type(obj).__module__ == "numpy" and getattr(obj, "ndim", 3) in (1, 2):
+        return pd.DataFrame(obj)
+    return None
+
+
+def _clip(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[:limit] + f"\n...[{len(text) - limit:,} more characters]"
+
+
+def summarise(frame: pd.DataFrame = None, text: str = None) -> str:
+    """
+    Short preview of an output_data payload for the LLM prompt.
+    """
+    limit = _env_int("RESULT_PREVIEW_CHARS", 4000)
+    if frame is None:
+        return _clip(text, limit)
+    rows = _env_int("RESULT_PREVIEW_ROWS", 20)
+    lines = [f"{type(frame).__name__}: {len(frame)} rows x {frame.shape[1]} columns",
+             "columns: " + ", ".join(f"{c} ({t})" for c, t in frame.dtypes.items()),
+             f"first {min(rows, len(frame))} rows (CSV):",
+             frame.head(rows).to_csv().rstrip("\n")]
+    numeric = frame.select_dtypes("number")
+    if len(frame) > rows and numeric.shape[1]:
+        lines += ["numeric summary (CSV):",
+                  numeric.agg(["min", "max", "mean", "sum"]).T.to_csv().rstrip("\n")]
+    return _clip("\n".join(lines), limit)
+
+
+def _write_frame(frame: pd.DataFrame, out_dir: Path) -> Path:
+    """
+    Arrow IPC (Feather v2) file, or a pickle when the frame cannot be
+    expressed in Arrow (mixed-type object columns etc.).
+    """
+    flat = frame if isinstance(frame.index, pd.RangeIndex) and frame.index.start == 0 \
+        and frame.index.step == 1 and frame.index.name is None else frame.reset_index()
+    flat = flat.set_axis([str(c) for c in flat.columns], axis=1)
+    path = out_dir / "output.arrow"
+    try:
+        flat.to_feather(path)
+    except Exception:
+        path.unlink(missing_ok=True)
+        path = out_dir / "output.pkl"
+        frame.to_pickle(path)
+    return path
+
+
+def encode_output(ret_obj, out_dir: Path):
+    """
+    Split output_data into (inline value, descriptor, error) for result.json.
+    """
+    if ret_obj is None:
+        return None, None, ""
+    inline_max = _env_int("RESULT_INLINE_MAX_BYTES", 64 * 1024)
+    max_bytes  = _env_int("RESULT_MAX_BYTES", 256 * 1024**2)
+
+    frame, text = _as_frame(ret_obj), None
+    if frame is None:
+        try:
+            text = json.dumps(ret_obj, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            return None, None, (f"output_data is not JSON-serialisable ({e}); use plain "
+                                "Python types or a pandas DataFrame / Series.")
+        if len(text.encode()) <= inline_max:
+            return ret_obj, None, ""
+        if isinstance(ret_obj, list) and ret_obj and all(isinstance(r, dict) for r in ret_obj):
+            try:
+                frame = pd.DataFrame(ret_obj)       # records travel column-wise
+            except Exception:
+                frame = None
+
+    if frame is not None:
+        preview = summarise(frame)
+        path = _write_frame(frame, out_dir)
+        meta = {"file": path.name, "format": "arrow" if path.suffix == ".arrow" else "pickle",
+                "rows": int(len(frame)), "columns": [str(c) for c in frame.columns]}
+    else:
+        preview = summarise(text=text)
+        path = out_dir / "output.json"
+        path.write_text(text, encoding="utf-8")
+        meta = {"file": path.name, "format": "json"}
+    meta.update(bytes=path.stat().st_size, preview=preview)
+    if meta["bytes"] > max_bytes:
+        path.unlink()
+        meta.update(file=None, dropped=True)
+    return None, meta, ""
+
+
+def write_result(out_dir: Path, search_root: Path, stdout: str, error: str, ret_obj):
+    """
+    Move every PNG produced under search_root into out_dir and write result.json.
+    """
+    pngs = list(search_root.rglob("*.png"))
+    for p in pngs:
+        target = out_dir / p.name
+        try:
+            p.replace(target)
+        except Exception:
+            pass
+    plot_files = [str(p) for p in out_dir.glob("*.png")]
+    try:
+        ret_obj, output, enc_err = encode_output(ret_obj, out_dir)
+    except Exception:
+        ret_obj, output, enc_err = None, None, traceback.format_exc()
+    result = dict(stdout=stdout, error=error or enc_err,
+                  return_obj=ret_obj, output=output, plots=plot_files)
+    (out_dir / "result.json").write_text(json.dumps(result, ensure_ascii=False))
+
 def main():
     """
     Main entry point for sandbox execution. Reads user code and input data,
@@ -44,8 +240,7 @@ def main():
     out_dir   = Path("/workspace/out")
     out_dir.mkdir(exist_ok=True)
 
-    import pandas as pd
-    df = pd.read_csv(csv_path)
+    df = load_frame(csv_path, env_usecols())
 
     code_text = code_path.read_text()
     try:
@@ -55,17 +250,7 @@ def main():
         error = traceback.format_exc()
     finally:
         # Save results
-        pngs = list(Path("/workspace").rglob("*.png"))
-        for p in pngs:
-            target = out_dir / p.name
-            try:
-                p.replace(target)
-            except Exception:
-                pass
-        plot_files = [str(p) for p in out_dir.glob("*.png")]
-        result = dict(stdout=stdout, error=error,
-                      return_obj=ret_obj, plots=plot_files)
-        (out_dir / "result.json").write_text(json.dumps(result, ensure_ascii=False))
+        write_result(out_dir, Path("/workspace"), stdout, error, ret_obj)
 
 if __name__ == "__main__":
     main()
@@ -1,33 +1,157 @@
 """
 Called inside the sandbox to run a SQL string against data.db
 and emit result.json.
+
+This is the single implementation of the read-only connection, the query
+deadline and the capped columnar result: pool_worker.py uses it in the box,
+and the host's sql_local_runner / sql_result import it from here (with the
+caps from config instead of the environment).  Queries are cancelled with
+Connection.interrupt() at a wall-clock deadline (SQL_TIMEOUT_S, computed by
+the host from the database size) instead of a VM-step budget.  See
+src/analysis/sql_result.py for the result format.
 """
-import json, os, sqlite3, traceback
+import csv, json, os, sqlite3, threading, traceback
 from pathlib import Path
+from typing import Optional
+
+TIMEOUT_PREFIX = "QueryTimeout"
+SPILL_NAME     = "result_full.csv"
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, str(default)))
+
+
+def _plain(v):
+    return v.hex() if isinstance(v, (bytes, memoryview)) else v
+
+
+def fetch_columnar(cur, spill: Optional[Path] = None, max_rows: Optional[int] = None,
+                   max_bytes: Optional[int] = None, fetch_rows: Optional[int] = None) -> dict:
+    """
+    Drain an executed cursor with fetchmany into the capped columnar format;
+    with a spill path every row is also written there as CSV.  Caps left as
+    None come from SQL_RESULT_MAX_ROWS / SQL_RESULT_MAX_BYTES / SQL_FETCH_ROWS.
+    """
+    max_rows   = _env_int("SQL_RESULT_MAX_ROWS", 1000) if max_rows is None else max_rows
+    max_bytes  = _env_int("SQL_RESULT_MAX_BYTES", 1024**2) if max_bytes is None else max_bytes
+    fetch_rows = _env_int("SQL_FETCH_ROWS", 500) if fetch_rows is None else fetch_rows
+    cols   = [c[0] for c in cur.description]
+    values = [[] for _ in cols]
+    kept = size = total = 0
+    truncated = False
+    fh = open(spill, "w", newline="", encoding="utf-8") if spill else None
+    try:
+        writer = csv.writer(fh) if fh else None
+        if writer:
+            writer.writerow(cols)
+        while True:
+            batch = cur.fetchmany(fetch_rows)
+            if not batch:
+                break
+            total += len(batch)
+            if writer:
+                writer.writerows(batch)
+            if truncated:
+                continue
+            for row in batch:
+                if kept >= max_rows or size >= max_bytes:
+                    truncated = True
+                    break
+                for i, v in enumerate(row):
+                    values[i].append(_plain(v))
+                size += sum(len(str(v)) + 2 for v in row)   # ~ JSON size
+                kept += 1
+            if truncated and not writer:
+                break       # nothing else needs the remaining rows
+    except BaseException:
+        if spill:
+            Path(spill).unlink(missing_ok=True)
+        raise
+    finally:
+        if fh:
+            fh.close()
+    return {"columns": cols, "values": values, "rows": kept,
+            "total_rows": None if truncated and not spill else total,
+            "truncated": truncated, "spill_path": str(spill) if spill else None}
+
+
+def connect_ro(db_file, cache_kib: Optional[int] = None, mmap_bytes: Optional[int] = None,
+               statement_cache: Optional[int] = None) -> sqlite3.Connection:
+    """
+    Read-only connection with a larger page cache, mmap I/O and a statement
+    cache; settings left as None come from SQL_CACHE_KIB / SQL_MMAP_BYTES /
+    SQL_STATEMENT_CACHE.
+    """
+    cache_kib  = _env_int("SQL_CACHE_KIB", 65536) if cache_kib is None else cache_kib
+    mmap_bytes = _env_int("SQL_MMAP_BYTES", 1024**3) if mmap_bytes is None else mmap_bytes
+    statement_cache = (_env_int("SQL_STATEMENT_CACHE", 128) if statement_cache is None
+                       else statement_cache)
+    con = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True, check_same_thread=False,
+                          cached_statements=statement_cache)
+    con.execute("PRAGMA query_only=1")
+    con.execute(f"PRAGMA cache_size=-{int(cache_kib)}")
+    con.execute(f"PRAGMA mmap_size={int(mmap_bytes)}")
+    con.execute("PRAGMA temp_store=MEMORY")
+    return con
+
+
+def timeout_message(seconds: float, db_file) -> str:
+    mb = os.path.getsize(db_file) / 1024**2
+    return (f"{TIMEOUT_PREFIX}: the query was cancelled after {seconds:.1f}s, the wall-clock "
+            f"limit for this {mb:,.0f} MB database (CSV_DA_SQL_TIMEOUT_S raises it).\n"
+            "Make the query cheaper: filter early, aggregate instead of returning raw rows, "
+            "or add a LIMIT.")
+
+
+def run_query(con: sqlite3.Connection, query: str, deadline_s: float, db_file,
+              out_dir: Optional[Path] = None, spill: Optional[Path] = None, **caps):
+    """
+    Execute query, interrupting it after deadline_s seconds.  The full result
+    is spilled to `spill`, or to out_dir/result_full.csv when SQL_SPILL=1;
+    caps are passed on to fetch_columnar.  Returns (result, error).
+    """
+    if spill is None and out_dir is not None and os.environ.get("SQL_SPILL") == "1":
+        spill = Path(out_dir) / SPILL_NAME
+    fired = threading.Event()
+
+    def _cancel():
+        fired.set()
+        con.interrupt()
+
+    timer = threading.Timer(deadline_s, _cancel)
+    timer.daemon = True
+    timer.start()
+    try:
+        cur  = con.cursor()
+        cur.execute(query)
+        return fetch_columnar(cur, spill, **caps), ""
+    except sqlite3.OperationalError:
+        if fired.is_set():
+            return None, timeout_message(deadline_s, db_file)
+        return None, traceback.format_exc()
+    except Exception:
+        return None, traceback.format_exc()
+    finally:
+        timer.cancel()
+
 
 def main():
-    db_file   = Path("/workspace/session/data.db")
+    db_file   = Path(os.environ.get("DB_PATH", "/workspace/data/data.db"))
     sql_file  = Path(os.environ["USER_SQL"])
     out_file  = Path("/workspace/out/result.json")
 
     query = sql_file.read_text()
 
-    con = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
-    con.set_progress_handler(lambda: 1/0, 100_000)
-    err = ""
+    con = connect_ro(db_file)
     try:
-        cur  = con.cursor()
-        cur.execute(query)
-        cols = [c[0] for c in cur.description]
-        rows = [dict(zip(cols, r)) for r in cur.fetchall()]
-    except Exception:
-        rows = []
-        err  = traceback.format_exc()
+        result, err = run_query(con, query, float(os.environ.get("SQL_TIMEOUT_S", "30")),
+                                db_file, out_file.parent)
     finally:
         con.close()
 
     out_file.write_text(json.dumps(
-        dict(stdout="", error=err, return_obj=rows, plots=[]),
+        dict(stdout="", error=err, return_obj=result, plots=[]),
         ensure_ascii=False))
 
 if __name__ == "__main__":
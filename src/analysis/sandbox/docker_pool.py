@@ -0,0 +1,299 @@
+"""
+Warm pool of pre-started sandbox containers.
+
+Each worker runs docker/pool_worker.py: pandas is already imported and the
+session's data is already loaded, so a job only costs writing the snippet
+and waiting for the `done` marker.  Workers are recycled after
+SANDBOX_POOL_MAX_RUNS jobs, or as soon as they are tainted (timeout,
+cancelled job, dead container, missing result, failed health check).
+"""
+from __future__ import annotations
+import atexit, json, queue, shutil, tempfile, threading, time, uuid
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from ... import config
+from ...history import tracing
+from .. import db_utils, result_payload
+from .cancel import CANCELLED, CancelToken, cancelled, on_cancel
+
+SESSION_DIR = "/workspace/session"
+DATA_DIR    = "/workspace/data"
+_CODE_NAME  = {"python": "snippet.py", "sql": "query.sql"}
+
+
+def data_volume(data_path) -> Tuple[str, dict]:
+    """
+    Read-only bind mount of the dataset, shared in place instead of copied.
+    Returns the in-container path and the `volumes` entry for it.
+    """
+    host = Path(data_path).resolve()
+    in_box = f"{DATA_DIR}/data{host.suffix}"
+    return in_box, {host.as_posix(): {"bind": in_box, "mode": "ro"}}
+
+
+def sql_env(db_path) -> dict:
+    """
+    Connection tuning, query deadline and result caps for sql_driver.py
+    inside the box.
+    """
+    return {
+        "SQL_TIMEOUT_S":        str(db_utils.query_deadline(db_path)),
+        "SQL_CACHE_KIB":        str(config.SQL_CACHE_KIB),
+        "SQL_MMAP_BYTES":       str(config.SQL_MMAP_BYTES),
+        "SQL_STATEMENT_CACHE":  str(config.SQL_STATEMENT_CACHE),
+        "SQL_FETCH_ROWS":       str(config.SQL_FETCH_ROWS),
+        "SQL_RESULT_MAX_ROWS":  str(config.SQL_RESULT_MAX_ROWS),
+        "SQL_RESULT_MAX_BYTES": str(config.SQL_RESULT_MAX_BYTES),
+        "SQL_SPILL":            "1" if config.SQL_RESULT_SPILL else "0",
+    }
+
+
+class _Worker:
+    def __init__(self, container, session_dir: Path):
+        self.container   = container
+        self.session_dir = session_dir
+        self.runs        = 0
+        self.tainted     = False
+
+    def healthy(self) -> bool:
+        """
+        Container still running and heartbeat fresh.
+        """
+        try:
+            self.container.reload()
+            if self.container.status != "running":
+                return False
+            beat = (self.session_dir / "heartbeat").stat().st_mtime
+        except Exception:
+            return False
+        return time.time() - beat < config.SANDBOX_POOL_HEARTBEAT_S
+
+    def destroy(self):
+        try:
+            self.container.remove(force=True)
+        except Exception:
+            pass
+        shutil.rmtree(self.session_dir, ignore_errors=True)
+
+
+class WarmPool:
+    """
+    Fixed-size pool of workers for one (kind, data file) pair.
+    """
+
+    def __init__(self, client, kind: str, data_path: str,
+                 size: int, max_runs: int, mem_limit: str):
+        self.client    = client
+        self.kind      = kind
+        self.data_path = Path(data_path)
+        self.max_runs  = max_runs
+        self.mem_limit = mem_limit
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._closed  = False
+        self._pending = 0
+        self._spawn_error = ""
+        self._plock   = threading.Lock()
+        for _ in range(size):
+            self._spawn_async()
+
+    # ── lifecycle ─────────────────────────────────────────────
+    def _spawn(self) -> _Worker:
+        session = Path(tempfile.mkdtemp(prefix=f"csv_da_pool_{self.kind}_"))
+        # the unprivileged `sandbox` user writes heartbeat / results here
+        session.chmod(0o777)
+        data_in_box, data_vol = data_volume(self.data_path)
+        (session / "jobs").mkdir(mode=0o777)
+        (session / "jobs").chmod(0o777)
+
+        container = self.client.containers.run(
+            image="csv_da_sandbox",
+            user="sandbox",
+            working_dir="/workspace",
+            entrypoint=["python", "pool_worker.py"],
+            environment={
+                "POOL_KIND": self.kind,
+                "DATA_PATH": data_in_box,
+                **(sql_env(self.data_path) if self.kind == "sql" else
+                   result_payload.sandbox_env()),
+            },
+            volumes={session.as_posix(): {"bind": SESSION_DIR, "mode": "rw"},
+                     **data_vol},
+            network_mode="none",
+            mem_limit=self.mem_limit,
+            nano_cpus=1_000_000_000,
+            detach=True,
+            remove=False,
+        )
+        worker = _Worker(container, session)
+
+        deadline = time.monotonic() + config.SANDBOX_POOL_STARTUP_S
+        while not (session / "ready").exists():
+            container.reload()
+            if container.status == "exited" or time.monotonic() > deadline:
+                logs = container.logs().decode(errors="ignore")
+                worker.destroy()
+                raise RuntimeError(f"Pool worker failed to start.\nLogs:\n{logs}")
+            time.sleep(0.05)
+        return worker
+
+    def _spawn_async(self):
+        def _inner():
+            try:
+                worker = self._spawn()
+            except Exception as e:
+                self._spawn_error = str(e)
+                worker = None
+            with self._plock:
+                self._pending -= 1
+            if worker is None:
+                return
+            if self._closed:
+                worker.destroy()
+            else:
+                self._idle.put(worker)
+        with self._plock:
+            self._pending += 1
+        threading.Thread(target=_inner, daemon=True).start()
+
+    def _acquire(self) -> _Worker:
+        deadline = time.monotonic() + config.SANDBOX_POOL_STARTUP_S
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError("No healthy sandbox worker became available")
+            try:
+                worker = self._idle.get(timeout=min(remaining, 0.1))
+            except queue.Empty:
+                with self._plock:
+                    starved = self._pending == 0
+                if starved and self._spawn_error:
+                    # every spawn failed - surface why instead of waiting it out
+                    raise RuntimeError(self._spawn_error)
+                if starved:
+                    self._spawn_async()
+                continue
+            if worker.healthy():
+                return worker
+            worker.destroy()
+            self._spawn_async()
+
+    def _release(self, worker: _Worker):
+        if self._closed or worker.tainted or worker.runs >= self.max_runs:
+            worker.destroy()
+            if not self._closed:
+                self._spawn_async()
+        else:
+            self._idle.put(worker)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().destroy()
+            except queue.Empty:
+                break
+
+    # ── execution ─────────────────────────────────────────────
+    def run(self, payload: str, timeout: int, cancel: Optional[CancelToken] = None) -> dict:
+        """
+        Execute one snippet / query and return the worker's result dict,
+        with plot paths rewritten to host paths.  Cancelling kills the
+        worker's container; the pool replaces it.
+        """
+        with tracing.span("sandbox.acquire", backend="docker_pool", kind=self.kind) as s:
+            worker = self._acquire()
+            s.set(worker_runs=worker.runs)
+        job_id  = uuid.uuid4().hex
+        job_dir = worker.session_dir / "jobs" / job_id
+        try:
+            (job_dir / "out").mkdir(parents=True)
+            job_dir.chmod(0o777)
+            (job_dir / "out").chmod(0o777)
+            (job_dir / _CODE_NAME[self.kind]).write_text(payload)
+            # the ticket is what the worker polls for, so create it last
+            ticket = worker.session_dir / "jobs" / f"{job_id}.job"
+            ticket.with_suffix(".tmp").touch()
+            ticket.with_suffix(".tmp").rename(ticket)
+
+            def _stop():
+                worker.tainted = True
+                worker.container.kill()
+
+            with tracing.span("sandbox.wait", backend="docker_pool", kind=self.kind), \
+                    on_cancel(cancel, _stop):
+                deadline = time.monotonic() + timeout
+                while not (job_dir / "done").exists():
+                    if cancelled(cancel):
+                        raise RuntimeError(CANCELLED)
+                    if time.monotonic() > deadline:
+                        worker.tainted = True
+                        raise RuntimeError(f"Sandbox timed out after {timeout} seconds")
+                    time.sleep(0.005)
+
+            result_path = job_dir / "out" / "result.json"
+            if not result_path.exists():
+                worker.tainted = True
+                logs = worker.container.logs().decode(errors="ignore")
+                raise RuntimeError(
+                    f"Pool worker did not create result.json.\nLogs:\n{logs}"
+                )
+            with tracing.span("result.parse"):
+                result = json.loads(result_path.read_text())
+            # move the outputs off the worker so recycling it cannot race the export
+            keep = Path(tempfile.mkdtemp(prefix="csv_da_job_"))
+            shutil.move(str(job_dir / "out"), keep / "out")
+            result["container_logs"] = ""
+            result["plots"] = [
+                str(keep / "out" / Path(p).name) for p in result.get("plots", [])
+            ]
+            result["job_dir"] = str(keep)
+            return result
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            worker.runs += 1
+            self._release(worker)
+
+
+_pools: Dict[Tuple[str, str, int, int], WarmPool] = {}
+_lock = threading.Lock()
+
+
+def get_pool(client, kind: str, data_path: str, mem_limit: str) -> WarmPool:
+    """
+    Return the session pool for this data file, starting it on first use.
+    A replaced data file (new inode / size) gets a fresh pool and the old one
+    is closed.  Not keyed on mtime: the CSV cache touches its files on every
+    lookup.
+    """
+    p = Path(data_path).resolve()
+    st = p.stat()
+    key = (kind, str(p), st.st_ino, st.st_size)
+    with _lock:
+        pool = _pools.get(key)
+        if pool is None:
+            for old in [k for k in _pools if k[:2] == key[:2]]:
+                _pools.pop(old).close()
+            pool = WarmPool(client, kind, str(p),
+                            size=config.SANDBOX_POOL_SIZE,
+                            max_runs=config.SANDBOX_POOL_MAX_RUNS,
+                            mem_limit=mem_limit)
+            _pools[key] = pool
+        return pool
+
+
+def discard_job(result: dict):
+    """
+    Remove a finished job's output directory once its plots have been exported.
+    """
+    job_dir = result.pop("job_dir", None)
+    if job_dir:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+
+@atexit.register
+def shutdown_all():
+    with _lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -1,10 +1,27 @@
 import json
 import shutil
 import tempfile
+import threading
 from pathlib import Path
-import docker
+from ... import config
+from ...history import tracing
+from .. import csv_cache, result_payload
+from . import docker_pool
+from .cancel import CANCELLED, CancelToken, cancelled, on_cancel
 
-client = docker.from_env()
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Docker client shared by the Python and SQL runners, created on first use.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            import docker
+            _client = docker.from_env()
+    return _client
 
 # Generated plot will be saved here
 EXPORT_PLOTS_DIR = Path("exports/plots")
@@ -13,19 +30,38 @@ def run_in_sandbox(
     code: str, 
     csv_path: str, 
     mem_limit: str = "2g", 
-    timeout: int = 120
+    timeout: int = 120,
+    usecols: list = None,
+    cancel: CancelToken = None,
 ) -> dict:
     """
     Run the given code in a sandbox container and retrieve the result.
+    Uses a warm pooled worker when SANDBOX_POOL_SIZE > 0; otherwise the
+    container loads only the usecols columns when a projection is given.
+    Cancelling kills the container.
     """
+    if config.SANDBOX_POOL_SIZE > 0:
+        data = csv_cache.data_path(csv_path)
+        pool = docker_pool.get_pool(get_client(), "python", data, mem_limit)
+        result = pool.run(code, timeout, cancel)
+        try:
+            result_payload.collect(result, Path(result["job_dir"]) / "out")
+            with tracing.span("plot.export", n=len(result["plots"])):
+                result["plots"] = _export_plots(result["plots"])
+        finally:
+            docker_pool.discard_job(result)
+        return result
+
     tmp_dir = Path(tempfile.mkdtemp(prefix="csv_da_"))
     try:
         # Create temporary files and directories
         code_file = tmp_dir / "snippet.py"
         code_file.write_text(code)
 
-        csv_copy = tmp_dir / "data.csv"
-        shutil.copy2(csv_path, csv_copy)
+        # parsed binary copy from the CSV cache when available,
+        # mounted read-only in place rather than copied per run
+        data = csv_cache.data_path(csv_path)
+        CSV_IN_BOX, data_vol = docker_pool.data_volume(data)
 
         out_dir = tmp_dir / "out"
         out_dir.mkdir()
@@ -33,37 +69,45 @@ def run_in_sandbox(
         # Container file paths
         SESSION_DIR = "/workspace/session"
         USER_CODE   = f"{SESSION_DIR}/snippet.py"
-        CSV_IN_BOX  = f"{SESSION_DIR}/data.csv"
         RESULT_JSON = f"{SESSION_DIR}/out/result.json"
 
         # Start the container
-        container = client.containers.run(
-            image="csv_da_sandbox",
-            user="sandbox",
-            working_dir="/workspace",
-            environment={
-                "USER_CODE": USER_CODE,
-                "CSV_PATH":  CSV_IN_BOX,
-            },
-            volumes={
-                tmp_dir.as_posix():     {"bind": SESSION_DIR,   "mode": "rw"},
-                out_dir.as_posix():     {"bind": "/workspace/out", "mode": "rw"},
-            },
-            network_mode="none",
-            mem_limit=mem_limit,
-            nano_cpus=1_000_000_000,
-            detach=True,
-            stdout=True,
-            stderr=True,
-            remove=False,
-        )
+        with tracing.span("sandbox.create", backend="docker"):
+            container = get_client().containers.run(
+                image="csv_da_sandbox",
+                user="sandbox",
+                working_dir="/workspace",
+                environment={
+                    "USER_CODE": USER_CODE,
+                    "CSV_PATH":  CSV_IN_BOX,
+                    "USECOLS":   json.dumps(usecols) if usecols else "",
+                    **result_payload.sandbox_env(),
+                },
+                volumes={
+                    tmp_dir.as_posix():     {"bind": SESSION_DIR,   "mode": "rw"},
+                    out_dir.as_posix():     {"bind": "/workspace/out", "mode": "rw"},
+                    **data_vol,
+                },
+                network_mode="none",
+                mem_limit=mem_limit,
+                nano_cpus=1_000_000_000,
+                detach=True,
+                stdout=True,
+                stderr=True,
+                remove=False,
+            )
 
         # Wait for container completion
-        try:
-            exit_res = container.wait(timeout=timeout)
-        except Exception:
-            container.kill()
-            raise RuntimeError(f"Sandbox timed out after {timeout} seconds")
+        with tracing.span("sandbox.wait", backend="docker") as s:
+            try:
+                with on_cancel(cancel, container.kill):
+                    exit_res = container.wait(timeout=timeout)
+            except Exception:
+                container.kill()
+                raise RuntimeError(f"Sandbox timed out after {timeout} seconds")
+            s.set(exit_code=exit_res.get("StatusCode"))
+        if cancelled(cancel):
+            raise RuntimeError(CANCELLED)
 
         logs = container.logs(stdout=True, stderr=True).decode(errors="ignore")
 
@@ -75,38 +119,49 @@ def run_in_sandbox(
                 f"but did not create result.json.\nLogs:\n{logs}"
             )
 
-        result = json.loads(result_json_path.read_text())
-        result["container_logs"] = logs
-        result["plots"] = [
-            str(out_dir / Path(p).name) for p in result.get("plots", [])
-        ]
-
-        if result["plots"]:
-            EXPORT_PLOTS_DIR.mkdir(parents=True, exist_ok=True)
-            new_paths = []
-            for plot in result["plots"]:
-                src = Path(plot)
-                if src.exists():
-                    dest = EXPORT_PLOTS_DIR / src.name
-                    shutil.copy2(src, dest)
-                    new_paths.append(str(dest))
-            result["plots"] = new_paths
+        with tracing.span("result.parse"):
+            result = json.loads(result_json_path.read_text())
+            result["container_logs"] = logs
+            result["plots"] = [
+                str(out_dir / Path(p).name) for p in result.get("plots", [])
+            ]
+            result_payload.collect(result, out_dir)
+
+        with tracing.span("plot.export", n=len(result["plots"])):
+            result["plots"] = _export_plots(result["plots"])
         return result
 
     finally:
         # Clean up
-        try:
-            container.remove(force=True)
-        except Exception:
-            pass
-        shutil.rmtree(tmp_dir, ignore_errors=True)
+        with tracing.span("sandbox.teardown", backend="docker"):
+            try:
+                container.remove(force=True)
+            except Exception:
+                pass
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def _export_plots(plots: list) -> list:
+    """
+    Copy plots out of the sandbox directory into EXPORT_PLOTS_DIR.
+    """
+    if not plots:
+        return []
+    EXPORT_PLOTS_DIR.mkdir(parents=True, exist_ok=True)
+    new_paths = []
+    for plot in plots:
+        src = Path(plot)
+        if src.exists():
+            dest = EXPORT_PLOTS_DIR / src.name
+            shutil.copy2(src, dest)
+            new_paths.append(str(dest))
+    return new_paths
 
-def try_run(code: str, csv_path: str):
+def try_run(code: str, csv_path: str, usecols: list = None, cancel: CancelToken = None):
     """
     Execute code in the sandbox and return stdout, returned object, plots, and errors.
     """
     try:
-        r = run_in_sandbox(code, csv_path)
+        r = run_in_sandbox(code, csv_path, usecols=usecols, cancel=cancel)
         return r["stdout"], r["return_obj"], r["plots"], r["error"]
     except Exception as e:
         return "", None, [], str(e)
\ No newline at end of file
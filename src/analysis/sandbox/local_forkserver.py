@@ -0,0 +1,174 @@
+"""
+Fork server for the local backend (started by local_runner, one per dataset).
+
+pandas / numpy / matplotlib (Agg) are imported and the data is loaded once;
+every snippet then runs in a forked child that shares the frame
+copy-on-write, under the _set_limits rlimits and the restricted builtins of
+docker/sandbox_entry.py.  The child writes result.json exactly like the
+Docker backends do.
+
+Protocol, one JSON object per line:
+    server -> host  {"ready": <pid>}              once the data is loaded
+    host -> server  {"id", "job_dir", "mem_bytes", "timeout"}
+    host -> server  {"cancel": <id>}              SIGKILL that job's child
+    server -> host  {"id", "status"[, "timed_out" | "cancelled"]}
+                                                  when the child has exited
+A child still running a second after its own alarm (stuck in C code) is
+SIGKILLed by the server and reported with "timed_out"; other jobs are not
+affected.
+The server exits when its stdin is closed.  It is single-threaded: jobs are
+forked from the main loop and reaped there on SIGCHLD.
+
+Only the standard library is imported at module level: local_runner imports
+_set_limits from here.
+"""
+import json, os, resource, selectors, signal, sys, time, traceback
+from pathlib import Path
+
+ENTRY_DIR = Path(__file__).resolve().parent / "docker"
+TIMEOUT_EXIT = 124      # exit code of a child stopped by its alarm (as timeout(1))
+
+
+class SandboxTimeout(BaseException):
+    """
+    Raised in the snippet by the wall-clock alarm; not an Exception, so
+    neither run_user nor the snippet's own handlers turn it into a traceback.
+    """
+
+
+def _set_limits(mem_bytes: int, cpu_seconds: int):
+    def _alarm(*_):
+        raise SandboxTimeout(cpu_seconds)
+
+    def _inner():
+        resource.setrlimit(resource.RLIMIT_AS,  (mem_bytes, mem_bytes))
+        # SIGXCPU at the soft limit (reported as a timeout), SIGKILL a second later
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+        signal.signal(signal.SIGALRM, _alarm)
+        signal.alarm(cpu_seconds + 1)
+    return _inner
+
+
+def _child(job: dict, df, run_user, write_result):
+    """
+    Body of the forked child; never returns.
+    """
+    job_dir = Path(job["job_dir"])
+    out_dir = job_dir / "out"
+    try:
+        # the protocol pipes belong to the server
+        devnull = os.open(os.devnull, os.O_RDWR)
+        os.dup2(devnull, 0)
+        os.dup2(devnull, 1)
+        _set_limits(job["mem_bytes"], job["timeout"])()
+        os.chdir(job_dir)
+        code_text = (job_dir / "snippet.py").read_text()
+        stdout, error, ret_obj = run_user(code_text, {"df": df})
+        write_result(out_dir, job_dir, stdout, error, ret_obj)
+    except SandboxTimeout:
+        os._exit(TIMEOUT_EXIT)          # no result.json: the host reports the timeout
+    except BaseException:
+        write_result(out_dir, job_dir, "", traceback.format_exc(), None)
+    finally:
+        os._exit(0)
+
+
+def serve():
+    sys.path.insert(0, str(ENTRY_DIR))
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401  (warm import for snippets)
+    import numpy              # noqa: F401
+    from sandbox_entry import load_frame, run_user, write_result
+
+    df = load_frame(Path(os.environ["CSV_PATH"]))
+    out = sys.stdout
+    children = {}       # pid -> {"id", "deadline", "reason"}
+    by_id = {}          # job id -> pid
+
+    # single-threaded on purpose: fork() only ever runs here, never beside other
+    # threads.  SIGCHLD wakes the select loop through the wakeup pipe.
+    wake_r, wake_w = os.pipe()
+    os.set_blocking(wake_r, False)
+    os.set_blocking(wake_w, False)
+    signal.set_wakeup_fd(wake_w)
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+
+    def reply(msg: dict):
+        out.write(json.dumps(msg) + "\n")
+        out.flush()
+
+    def start(job: dict):
+        pid = os.fork()
+        if pid == 0:
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            os.close(wake_r)
+            os.close(wake_w)
+            _child(job, df, run_user, write_result)
+        children[pid] = {"id": job["id"], "reason": None,
+                         "deadline": time.monotonic() + job["timeout"] + 2}
+        by_id[job["id"]] = pid
+
+    def kill(pid: int, reason: str):
+        child = children[pid]
+        if child["reason"] is None:
+            child["reason"] = reason
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def reap():
+        while children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            child = children.pop(pid)
+            del by_id[child["id"]]
+            msg = {"id": child["id"], "status": status}
+            if child["reason"]:
+                msg[child["reason"]] = True
+            reply(msg)
+
+    def handle(msg: dict):
+        if "cancel" in msg:
+            pid = by_id.get(msg["cancel"])
+            if pid is not None:
+                kill(pid, "cancelled")
+        else:
+            start(msg)
+
+    sel = selectors.DefaultSelector()
+    sel.register(0, selectors.EVENT_READ)
+    sel.register(wake_r, selectors.EVENT_READ)
+    reply({"ready": os.getpid()})
+    pending = b""
+    while True:
+        now = time.monotonic()
+        for pid, child in list(children.items()):
+            if child["deadline"] <= now:
+                kill(pid, "timed_out")
+        deadlines = [c["deadline"] for c in children.values() if c["reason"] is None]
+        wait = max(min(deadlines) - now, 0) if deadlines else None
+        for key, _ in sel.select(wait):
+            if key.fd == wake_r:
+                while True:
+                    try:
+                        if not os.read(wake_r, 512):
+                            break
+                    except BlockingIOError:
+                        break
+                continue
+            chunk = os.read(0, 1 << 16)
+            if not chunk:           # host closed stdin
+                return
+            *lines, pending = (pending + chunk).split(b"\n")
+            for line in lines:
+                if line.strip():
+                    handle(json.loads(line))
+        reap()
+
+
+if __name__ == "__main__":
+    serve()
@@ -1,95 +1,268 @@
 """
 Light-weight fallback when Docker is unavailable.
 !!!! Not a hard security boundary - use with trusted code only.
+
+Snippets are sent to a per-dataset fork server (local_forkserver.py) that
+has pandas imported and the data loaded; each one runs in a forked child.
+With CSV_DA_LOCAL_FORKSERVER=0 every snippet gets a fresh interpreter instead.
 """
 from __future__ import annotations
-import json, io, contextlib, traceback, tempfile, shutil, sys, os, signal, resource, subprocess, builtins
+import atexit, json, tempfile, shutil, sys, os, signal, subprocess, threading, uuid
 from pathlib import Path
-from typing import Dict, Any
-
-SAFE_BUILTINS = {
-    "abs": abs, "min": min, "max": max, "sum": sum,
-    "range": range, "len": len, "print": print,
-    "int": int, "float": float, "str": str,
-    "list": list, "dict": dict, "tuple": tuple, "set": set,
-    "enumerate": enumerate, "zip": zip, "sorted": sorted, "reversed": reversed,
-    "any": any, "all": all, "round": round,
-    "__import__": __import__, 
-}
-
-def _set_limits(mem_bytes: int, cpu_seconds: int):
-    def _inner():
-        resource.setrlimit(resource.RLIMIT_AS,  (mem_bytes, mem_bytes))
-        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
-        signal.signal(signal.SIGALRM, lambda *_: sys.exit(1))
-        signal.alarm(cpu_seconds + 1)
-    return _inner
+from typing import Dict, Any, Optional, Tuple
+from ... import config
+from .. import csv_cache, result_payload
+from ...history import tracing
+from .cancel import CANCELLED, CancelToken, cancelled, on_cancel
+from .local_forkserver import ENTRY_DIR, TIMEOUT_EXIT, _set_limits
 
+SERVER_SCRIPT    = Path(__file__).resolve().parent / "local_forkserver.py"
+EXPORT_PLOTS_DIR = Path("exports/plots")
 
-def run_in_sandbox(code: str, csv_path: str,
-                   mem_limit: str = "2g", timeout: int = 120) -> Dict[str, Any]:
-    """Execute snippet in a temp dir using the host Python interpreter."""
-    tmp = Path(tempfile.mkdtemp(prefix="csv_da_"))
-    try:
-        # prepare session files
-        code_file = tmp / "snippet.py"; code_file.write_text(code)
-        csv_copy  = tmp / "data.csv";   shutil.copy2(csv_path, csv_copy)
-        out_dir   = tmp / "out";        out_dir.mkdir()
 
-        # driver script (runs inside the same interpreter via -c)
-        driver = f"""
-import json, io, contextlib, traceback, os, builtins
-from pathlib import Path
-import pandas as pd
+class ForkServer:
+    """
+    Host handle on one fork server process; run() may be called from many threads.
+    """
+
+    def __init__(self, data_path: Path):
+        self.dir = Path(tempfile.mkdtemp(prefix="csv_da_fork_"))
+        self.log = open(self.dir / "server.log", "w+")
+        self.proc = subprocess.Popen(
+            [sys.executable, str(SERVER_SCRIPT)],
+            cwd=self.dir,
+            env={**os.environ, "CSV_PATH": str(data_path), **result_payload.sandbox_env()},
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self.log,
+            text=True, start_new_session=True,     # children share its process group
+        )
+        self._waiting: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if not self.proc.stdout.readline():
+            self.close()
+            raise RuntimeError(f"Local fork server failed to start.\n{self.logs()}")
+        threading.Thread(target=self._read, name="forkserver-reader", daemon=True).start()
+
+    def _read(self):
+        for line in self.proc.stdout:
+            msg = json.loads(line)
+            with self._lock:
+                slot = self._waiting.pop(msg["id"], None)
+            if slot:
+                slot["reply"] = msg
+                slot["event"].set()
+        with self._lock:                    # server gone: release every waiter
+            for slot in self._waiting.values():
+                slot["event"].set()
+            self._waiting.clear()
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def logs(self) -> str:
+        if self.log.closed:
+            return ""
+        self.log.seek(0)
+        return self.log.read()
+
+    def run(self, job_dir: Path, mem_bytes: int, timeout: int,
+            cancel: Optional[CancelToken] = None) -> Optional[int]:
+        """
+        Run job_dir/snippet.py in a forked child; returns its wait status
+        (None if the server died).  Cancelling kills only that child.
+        """
+        job_id = uuid.uuid4().hex
+        slot = {"event": threading.Event(), "reply": {}}
+        with self._lock:
+            self._waiting[job_id] = slot
+            self._send({"id": job_id, "job_dir": str(job_dir),
+                        "mem_bytes": mem_bytes, "timeout": timeout})
+        # the server SIGKILLs a child that outlives its alarm; silence well past
+        # that deadline means the server itself is wedged
+        with on_cancel(cancel, lambda: self._kill(job_id)):
+            answered = slot["event"].wait(timeout + 5)
+        if not answered:
+            self.close()
+            raise RuntimeError(f"Sandbox timed out after {timeout} seconds")
+        if slot["reply"].get("cancelled"):
+            raise RuntimeError(CANCELLED)
+        if slot["reply"].get("timed_out"):
+            raise RuntimeError(f"Sandbox timed out after {timeout} seconds")
+        return slot["reply"].get("status")
+
+    def _kill(self, job_id: str):
+        with self._lock:
+            if job_id in self._waiting:
+                self._send({"cancel": job_id})
+
+    def _send(self, msg: dict):
+        # callers hold self._lock
+        self.proc.stdin.write(json.dumps(msg) + "\n")
+        self.proc.stdin.flush()
+
+    def close(self):
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.proc.wait()
+        self.log.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+_servers: Dict[Tuple[str, int, int], ForkServer] = {}
+_lock = threading.Lock()
+
 
-SAFE = {list(SAFE_BUILTINS.keys())}
-g = {{'__builtins__': {{k: getattr(builtins, k) for k in SAFE}}}}
-g['df'] = pd.read_csv(os.environ['CSV_PATH'])
+def get_server(data_path) -> ForkServer:
+    """
+    Session server for this data file; a replaced file (new inode / size) or
+    a dead server gets a new one.  Not keyed on mtime: the CSV cache touches
+    its files on every lookup.
+    """
+    p = Path(data_path).resolve()
+    st = p.stat()
+    key = (str(p), st.st_ino, st.st_size)
+    with _lock:
+        server = _servers.get(key)
+        if server is not None and not server.alive():
+            _servers.pop(key).close()
+            server = None
+        if server is None:
+            for old in [k for k in _servers if k[0] == key[0]]:
+                _servers.pop(old).close()
+            with tracing.span("sandbox.spawn", backend="local"):
+                server = _servers[key] = ForkServer(p)
+        return server
 
+
+@atexit.register
+def shutdown_all():
+    with _lock:
+        for server in _servers.values():
+            server.close()
+        _servers.clear()
+
+
+def _run_subprocess(tmp: Path, data: Path, mem_bytes: int, timeout: int,
+                    usecols: Optional[list] = None, cancel: Optional[CancelToken] = None):
+    """
+    One fresh interpreter per snippet (CSV_DA_LOCAL_FORKSERVER=0).
+    Returns (exit code, stderr).
+    """
+    # driver script (runs inside the same interpreter via -c); it reuses the
+    # in-box entry module so stdout caps and output_data encoding match docker
+    driver = f"""
+import os, sys
+from pathlib import Path
+sys.path.insert(0, {str(ENTRY_DIR)!r})
+from sandbox_entry import env_usecols, load_frame, run_user, write_result
+
+df   = load_frame(Path(os.environ['CSV_PATH']), env_usecols())
 code = Path(os.environ['USER_CODE']).read_text()
-buf  = io.StringIO(); err = ''
-try:
-    with contextlib.redirect_stdout(buf):
-        exec(code, g)
-except Exception:
-    err = traceback.format_exc()
-
-plots = [str(p) for p in Path('.').glob('*.png')]
-res   = dict(stdout=buf.getvalue(), error=err,
-             return_obj=g.get('output_data'), plots=plots)
-Path(os.environ['OUT_DIR']).write_text(json.dumps(res, ensure_ascii=False))
+stdout, err, ret = run_user(code, {{'df': df}})
+write_result(Path(os.environ['OUT_DIR']), Path('.'), stdout, err, ret)
 """
+    with subprocess.Popen(
+        [sys.executable, "-c", driver],
+        cwd=tmp,
+        env={**os.environ,
+             "USER_CODE": str(tmp / "snippet.py"),
+             "CSV_PATH":  str(data),
+             "OUT_DIR":   str(tmp / "out"),
+             "USECOLS":   json.dumps(usecols) if usecols else "",
+             **result_payload.sandbox_env()},
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True,
+        preexec_fn=_set_limits(mem_bytes, timeout),
+    ) as proc:
+        with on_cancel(cancel, proc.kill):
+            try:
+                stdout, stderr = proc.communicate(timeout=timeout + 2)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                raise
+    return proc.returncode, f"stdout:\n{stdout}\n\nstderr:\n{stderr}"
+
+
+def _timed_out(status: Optional[int]) -> bool:
+    """
+    The child was stopped by its wall-clock alarm or CPU-time limit.
+    """
+    if status is None:
+        return False
+    if os.WIFSIGNALED(status):
+        return os.WTERMSIG(status) in (signal.SIGALRM, signal.SIGXCPU)
+    return os.WEXITSTATUS(status) == TIMEOUT_EXIT
+
+
+def _describe_status(status: Optional[int]) -> str:
+    if status is None:
+        return "fork server exited"
+    if os.WIFSIGNALED(status):
+        sig = signal.Signals(os.WTERMSIG(status)).name
+        return f"snippet killed by {sig}; it may have hit the CPU-time or memory limit"
+    return f"snippet exited with code {os.WEXITSTATUS(status)}"
+
+
+def run_in_sandbox(code: str, csv_path: str,
+                   mem_limit: str = "2g", timeout: int = 120,
+                   usecols: Optional[list] = None,
+                   cancel: Optional[CancelToken] = None) -> Dict[str, Any]:
+    """Execute snippet in a temp dir using the host Python interpreter.
+    usecols only applies to a fresh interpreter: the fork server already holds the frame."""
+    tmp = Path(tempfile.mkdtemp(prefix="csv_da_"))
+    try:
+        # prepare session files
+        with tracing.span("sandbox.create", backend="local"):
+            (tmp / "snippet.py").write_text(code)
+            # the dataset is opened in place (never copied); only outputs live in tmp
+            data      = csv_cache.data_path(csv_path)
+            out_dir   = tmp / "out";        out_dir.mkdir()
+
         mem_bytes = int(float(mem_limit.rstrip("g")) * (1024**3))
-        proc = subprocess.run(
-            [sys.executable, "-c", driver],
-            cwd=tmp,
-            env={**os.environ,
-                 "USER_CODE": str(code_file),
-                 "CSV_PATH":  str(csv_copy),
-                 "OUT_DIR":   str(out_dir/"result.json")},
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-            timeout=timeout + 2,
-            text=True,
-            preexec_fn=_set_limits(mem_bytes, timeout),
-        )
+        data = Path(data).resolve()
+        if config.LOCAL_FORKSERVER:
+            server = get_server(data)
+            with tracing.span("sandbox.wait", backend="local") as s:
+                status = server.run(tmp, mem_bytes, timeout, cancel)
+                s.set(wait_status=status)
+            if _timed_out(status):
+                # not a snippet traceback, so never cached as a deterministic failure
+                raise RuntimeError(f"Sandbox timed out after {timeout} seconds")
+            failure, logs = _describe_status(status), server.logs()
+        else:
+            # interpreter start-up, data load and the snippet all happen in this one call
+            with tracing.span("sandbox.wait", backend="local") as s:
+                exit_code, logs = _run_subprocess(tmp, data, mem_bytes, timeout, usecols, cancel)
+                s.set(exit_code=exit_code)
+            if cancelled(cancel):
+                raise RuntimeError(CANCELLED)
+            if exit_code in (-signal.SIGALRM, -signal.SIGXCPU):
+                raise RuntimeError(f"Sandbox timed out after {timeout} seconds")
+            failure = f"exit {exit_code}"
 
         result_path = out_dir / "result.json"
         if not result_path.exists():
-            raise RuntimeError(
-                f"Local runner failed (exit {proc.returncode}).\n"
-                f"stdout:\n{proc.stdout}\n\nstderr:\n{proc.stderr}"
-            )
-        res = json.loads(result_path.read_text())
-        res["container_logs"] = proc.stderr
-        res["plots"] = [str(out_dir / Path(p).name) for p in res.get("plots", [])]
+            raise RuntimeError(f"Local runner failed ({failure}).\n{logs}")
+        with tracing.span("result.parse"):
+            res = json.loads(result_path.read_text())
+        res["container_logs"] = "" if config.LOCAL_FORKSERVER else logs
+        # copy outputs out before the temp dir is removed
+        EXPORT_PLOTS_DIR.mkdir(parents=True, exist_ok=True)
+        res["plots"] = [shutil.copy2(out_dir / Path(p).name, EXPORT_PLOTS_DIR)
+                        for p in res.get("plots", []) if (out_dir / Path(p).name).exists()]
+        result_payload.collect(res, out_dir)
         return res
     finally:
-        shutil.rmtree(tmp, ignore_errors=True)
+        with tracing.span("sandbox.teardown", backend="local"):
+            shutil.rmtree(tmp, ignore_errors=True)
 
 
-def try_run(code: str, csv_path: str):
+def try_run(code: str, csv_path: str, usecols: Optional[list] = None,
+            cancel: Optional[CancelToken] = None):
     try:
-        r = run_in_sandbox(code, csv_path)
+        r = run_in_sandbox(code, csv_path, usecols=usecols, cancel=cancel)
         return r["stdout"], r["return_obj"], r["plots"], r["error"]
     except Exception as exc:
         return "", None, [], str(exc)
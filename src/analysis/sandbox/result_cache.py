@@ -0,0 +1,101 @@
+"""
+Cache of sandbox results keyed on (normalised code / SQL, data fingerprint).
+
+A hit returns the stored (stdout, return_obj, plots, error) without starting
+a sandbox.  Only deterministic outcomes are stored: clean runs and errors
+raised by the snippet itself (a Python traceback), never infrastructure
+failures such as timeouts or a missing result file.
+"""
+from __future__ import annotations
+import ast, hashlib, json, re, shutil
+from pathlib import Path
+from typing import Optional, Tuple
+
+from ... import config
+from .. import cache_utils, db_utils, result_payload
+
+EXPORT_PLOTS_DIR = Path("exports/plots")
+_SQL_TOKENS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\s+")
+
+
+def normalise_python(code: str) -> str:
+    """
+    Canonical source: formatting and comments do not change the key.
+    """
+    try:
+        return ast.unparse(ast.parse(code))
+    except (SyntaxError, ValueError):
+        return "\n".join(l.rstrip() for l in code.strip().splitlines())
+
+
+def normalise_sql(sql: str) -> str:
+    """
+    Collapse whitespace outside quoted literals and drop trailing semicolons.
+    """
+    s = _SQL_TOKENS.sub(lambda m: m.group(0) if m.group(0)[0] in "'\"" else " ", sql)
+    return s.strip().rstrip(";").strip()
+
+
+def _data_fingerprint(kind: str, data_path) -> str:
+    if kind == "sql":
+        # the DB records which CSV it was built from; indexes don't change results
+        return db_utils.stored_fingerprint(Path(data_path)) or cache_utils.fingerprint(data_path)
+    return cache_utils.fingerprint(data_path)
+
+
+def make_key(kind: str, code: str, data_path) -> str:
+    norm = normalise_sql(code) if kind == "sql" else normalise_python(code)
+    blob = f"{kind}\0{_data_fingerprint(kind, data_path)}\0{norm}"
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _dir() -> Path:
+    return cache_utils.cache_dir("results")
+
+
+def get(key: str) -> Optional[Tuple[str, object, list, str]]:
+    meta_path = _dir() / f"{key}.json"
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+    ret = meta["return_obj"]
+    if result_payload.is_offloaded(ret) and ret["output_file"] and \
+            not Path(ret["output_file"]).exists():
+        return None               # exported output_data has been removed since
+    plots = []
+    for i, name in enumerate(meta["plots"]):
+        src = _dir() / f"{key}.{i}.png"
+        if not src.exists():
+            return None           # partially evicted - treat as a miss
+        EXPORT_PLOTS_DIR.mkdir(parents=True, exist_ok=True)
+        dest = EXPORT_PLOTS_DIR / name
+        shutil.copy2(src, dest)
+        plots.append(str(dest))
+    cache_utils.touch(meta_path)
+    return meta["stdout"], meta["return_obj"], plots, meta["error"]
+
+
+def put(key: str, stdout: str, return_obj, plots: list, error: str) -> bool:
+    """
+    Store a result if it is cacheable; returns whether it was stored.
+    """
+    if error and not error.lstrip().startswith("Traceback"):
+        return False
+    if any(not Path(p).exists() for p in plots or []):
+        return False
+    try:
+        payload = json.dumps(
+            dict(stdout=stdout, return_obj=return_obj, error=error,
+                 plots=[Path(p).name for p in plots or []]),
+            ensure_ascii=False,
+        )
+    except (TypeError, ValueError):
+        return False
+
+    for i, p in enumerate(plots or []):
+        shutil.copy2(p, _dir() / f"{key}.{i}.png")
+    (_dir() / f"{key}.json").write_text(payload, encoding="utf-8")
+    cache_utils.prune_dir(_dir(), config.RESULT_CACHE_MAX_BYTES, keep=(key,))
+    return True
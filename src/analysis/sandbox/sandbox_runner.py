@@ -1,39 +1,123 @@
 """
 auto-selects Docker or Local backend.
+
+The choice is made on first use, not at import: the Docker probe (SDK
+import + daemon ping) runs once per process in a background thread that
+start_probe() kicks off early, and its result is cached.
 """
 from __future__ import annotations
-import shutil, importlib.util, importlib
-import sys, os 
-
-# Check if user wants to force local execution
-# Check if Docker is available 
-if os.getenv("CSV_DA_FORCE_LOCAL"): 
-    from . import local_runner as _backend
-    _USING_DOCKER = False
-else:
+import functools
+import threading
+import os
+from ... import config
+from . import column_usage, result_cache
+from .cancel import CancelToken, cancelled
+from ...history import tracing
+
+_probe_done   = threading.Event()
+_probe_thread = None
+_USING_DOCKER = False
+_backend      = None
+_try_run_sql  = None
+_lock         = threading.Lock()
+
+def _docker_available() -> bool:
+    # Check if user wants to force local execution
+    if os.getenv("CSV_DA_FORCE_LOCAL"):
+        return False
+    # Check if Docker is available
     try:
-        import docker                 
-        from . import docker_runner as _backend
-        _backend.client.ping()           
-        _USING_DOCKER = True
+        from . import docker_runner
+        docker_runner.get_client().ping()
+        return True
     except Exception:
-        from . import local_runner as _backend
-        _USING_DOCKER = False
-
-# Banner (prints once per interpreter session)
-print(
-    "🐳  Using **Docker** sandbox (image csv_da_sandbox)."
-    if _USING_DOCKER
-    else "⚠️  Docker not available → using **LOCAL** sandbox (limited isolation)."
-)
-
-if _USING_DOCKER:
-    from .sql_docker_runner import try_run_sql as _try_run_sql
-else:
-    from .sql_local_runner import try_run_sql as _try_run_sql
-
-run_in_sandbox = _backend.run_in_sandbox         
-try_run        = _backend.try_run  
-try_run_sql = _try_run_sql         
-
-__all__ = ["run_in_sandbox", "try_run", "try_run_sql"]
+        return False
+
+def _probe():
+    global _USING_DOCKER
+    try:
+        _USING_DOCKER = _docker_available()
+    finally:
+        _probe_done.set()
+
+def start_probe():
+    """
+    Start the Docker probe in the background (no-op once started).
+    """
+    global _probe_thread
+    with _lock:
+        if _probe_thread is None:
+            _probe_thread = threading.Thread(target=_probe, name="docker-probe", daemon=True)
+            _probe_thread.start()
+
+def using_docker() -> bool:
+    start_probe()
+    _probe_done.wait()
+    return _USING_DOCKER
+
+def _select():
+    """
+    Resolve (and cache) the backend; prints the banner once per interpreter session.
+    """
+    global _backend, _try_run_sql
+    if _backend is not None:
+        return _backend
+    docker_ok = using_docker()
+    with _lock:
+        if _backend is None:
+            if docker_ok:
+                from . import docker_runner as backend
+                from .sql_docker_runner import try_run_sql
+            else:
+                from . import local_runner as backend
+                from .sql_local_runner import try_run_sql
+            print(
+                "🐳  Using **Docker** sandbox (image csv_da_sandbox)."
+                if docker_ok
+                else "⚠️  Docker not available → using **LOCAL** sandbox (limited isolation)."
+            )
+            _try_run_sql = try_run_sql
+            _backend = backend
+    return _backend
+
+def run_in_sandbox(code: str, csv_path: str, **kwargs) -> dict:
+    return _select().run_in_sandbox(code, csv_path, **kwargs)
+
+def _cached(kind: str, runner, code: str, data_path, cancel: CancelToken = None):
+    """
+    Serve a run from the result cache, or execute it and store the outcome
+    (a cancelled run's outcome is never stored).
+    """
+    with tracing.span("sandbox.execute", kind=kind,
+                      backend="docker" if _USING_DOCKER else "local") as s:
+        if not config.RESULT_CACHE_ENABLED:
+            out = runner(code, data_path)
+        else:
+            key = result_cache.make_key(kind, code, data_path)
+            out = result_cache.get(key)
+            s.set(cache_hit=out is not None)
+            if out is None:
+                out = runner(code, data_path)
+                if not cancelled(cancel):
+                    result_cache.put(key, *out)
+        if out[3]:
+            s.set(error=out[3].strip().splitlines()[-1][:200])
+        return out
+
+def try_run(code: str, csv_path: str, columns=None, cancel: CancelToken = None):
+    """
+    Run a Python snippet.  With the dataset's `columns` given, a cold
+    sandbox loads only the ones the code reads (see column_usage);
+    `cancel` stops the run early.
+    """
+    usecols = column_usage.projection(code, columns) if columns else None
+    if columns:
+        tracing.count("columns.pruned" if usecols else "columns.full")
+    runner = functools.partial(_select().try_run, usecols=usecols, cancel=cancel)
+    return _cached("python", runner, code, csv_path, cancel)
+
+def try_run_sql(sql: str, db_path: str, cancel: CancelToken = None):
+    _select()
+    return _cached("sql", functools.partial(_try_run_sql, cancel=cancel), sql, db_path, cancel)
+
+__all__ = ["run_in_sandbox", "try_run", "try_run_sql", "start_probe", "using_docker"]
@@ -3,41 +3,64 @@ Host helper mirroring docker_runner.py but for SQL strings.
 """
 import json, shutil, tempfile
 from pathlib import Path
-import docker, uuid
+import uuid
+from ... import config
+from ...history import tracing
+from .. import db_utils, sql_result
+from . import docker_pool
+from .cancel import CANCELLED, cancelled, on_cancel
+from .docker_runner import get_client
 
-client = docker.from_env()
 EXPORT_PLOTS_DIR = Path("exports/plots")   # unlikely for SQL mode but kept
 
 def run_in_sandbox(sql: str, db_path: str,
-                   mem_limit="512m", timeout=60) -> dict:
+                   mem_limit="512m", timeout=60, cancel=None) -> dict:
+    # the query cancels itself at its deadline; the container gets some slack on top
+    timeout = max(timeout, db_utils.query_deadline(db_path) + 15)
+    if config.SANDBOX_POOL_SIZE > 0:
+        result = docker_pool.get_pool(get_client(), "sql", db_path, mem_limit).run(sql, timeout, cancel)
+        try:
+            _export_spill(result, Path(result["job_dir"]) / "out")
+        finally:
+            docker_pool.discard_job(result)
+        return result
+
     tmp = Path(tempfile.mkdtemp(prefix="csv_da_sql_"))
     try:
         sql_file = tmp / "query.sql"; sql_file.write_text(sql)
-        db_copy  = tmp / "data.db";   shutil.copy2(db_path, db_copy)
+        db_in_box, db_vol = docker_pool.data_volume(db_path)
         out_dir  = tmp / "out"
         out_dir.mkdir()
         # Make the directory writeable by the unprivileged `sandbox`
         out_dir.chmod(0o777)
 
         SESSION = "/workspace/session"
-        container = client.containers.run(
-            image="csv_da_sandbox",
-            user="sandbox",
-            working_dir="/workspace",
-            entrypoint=["python", "sql_driver.py"],
-            environment={
-                "USER_SQL": f"{SESSION}/query.sql",
-            },
-            volumes={
-                tmp.as_posix(): {"bind": SESSION, "mode": "rw"},
-                out_dir.as_posix(): {"bind": "/workspace/out", "mode": "rw"},
-            },
-            network_mode="none",
-            mem_limit=mem_limit,
-            detach=True,
-            stdout=True, stderr=True, remove=False,
-        )
-        exit_res = container.wait(timeout=timeout)
+        with tracing.span("sandbox.create", backend="docker", kind="sql"):
+            container = get_client().containers.run(
+                image="csv_da_sandbox",
+                user="sandbox",
+                working_dir="/workspace",
+                entrypoint=["python", "sql_driver.py"],
+                environment={
+                    "USER_SQL": f"{SESSION}/query.sql",
+                    "DB_PATH":  db_in_box,
+                    **docker_pool.sql_env(db_path),
+                },
+                volumes={
+                    tmp.as_posix(): {"bind": SESSION, "mode": "rw"},
+                    out_dir.as_posix(): {"bind": "/workspace/out", "mode": "rw"},
+                    **db_vol,
+                },
+                network_mode="none",
+                mem_limit=mem_limit,
+                detach=True,
+                stdout=True, stderr=True, remove=False,
+            )
+        with tracing.span("sandbox.wait", backend="docker", kind="sql"), \
+                on_cancel(cancel, container.kill):
+            exit_res = container.wait(timeout=timeout)
+        if cancelled(cancel):
+            raise RuntimeError(CANCELLED)
         logs = container.logs(stdout=True, stderr=True).decode()
 
         result_path = out_dir / "result.json"
@@ -46,14 +69,30 @@ def run_in_sandbox(sql: str, db_path: str,
                 "Sandbox exited without creating result.json.\n"
                 f"Container logs:\n{logs}"
             )
-        result = json.loads(result_path.read_text())
+        with tracing.span("result.parse"):
+            result = json.loads(result_path.read_text())
         result["container_logs"] = logs
+        _export_spill(result, out_dir)
         return result
     finally:
-        try: container.remove(force=True)  # type: ignore
-        except Exception: pass
-        shutil.rmtree(tmp, ignore_errors=True)
+        with tracing.span("sandbox.teardown", backend="docker", kind="sql"):
+            try: container.remove(force=True)  # type: ignore
+            except Exception: pass
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def _export_spill(result: dict, out_dir: Path):
+    """
+    Move a spilled full result out of the sandbox directory.
+    """
+    ret = result.get("return_obj")
+    if not (sql_result.is_columnar(ret) and ret.get("spill_path")):
+        return
+    src  = out_dir / Path(ret["spill_path"]).name
+    dest = sql_result.spill_path() or sql_result.SPILL_DIR / src.name
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    shutil.move(str(src), dest)
+    ret["spill_path"] = str(dest)
 
-def try_run_sql(sql: str, db_path: str):
-    r = run_in_sandbox(sql, db_path)
+def try_run_sql(sql: str, db_path: str, cancel=None):
+    r = run_in_sandbox(sql, db_path, cancel=cancel)
     return r["stdout"], r["return_obj"], [], r["error"]
@@ -1,28 +1,95 @@
 """
 Execute a read-only SQL query against the per-session sqlite DB
+
+Connections come from a small per-database pool (read-only, tuned page
+cache / mmap, statement cache) and every query is cancelled with
+Connection.interrupt() at a wall-clock deadline scaled to the database size.
 """
 from __future__ import annotations
-import sqlite3, json, traceback, tempfile, shutil
+import sqlite3, threading, queue
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Tuple
+from ... import config
+from .. import db_utils, sql_result
+from ...history import tracing
+from .cancel import CANCELLED, cancelled, on_cancel
+from .docker import sql_driver
+
+TIMEOUT_PREFIX = sql_driver.TIMEOUT_PREFIX
+
+
+def _connect(db_path) -> sqlite3.Connection:
+    return sql_driver.connect_ro(db_path, cache_kib=config.SQL_CACHE_KIB,
+                                 mmap_bytes=config.SQL_MMAP_BYTES,
+                                 statement_cache=config.SQL_STATEMENT_CACHE)
+
+
+class ConnectionPool:
+    """
+    Up to `size` idle read-only connections to one database file.
+    """
+
+    def __init__(self, db_path, size: int):
+        self.db_path = str(db_path)
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=max(size, 1))
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return _connect(self.db_path)
+
+    def release(self, con: sqlite3.Connection):
+        try:
+            self._idle.put_nowait(con)
+        except queue.Full:
+            con.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools: Dict[Tuple[str, int], ConnectionPool] = {}
+_lock = threading.Lock()
+
+
+def get_pool(db_path) -> ConnectionPool:
+    """
+    Session pool for this database; a re-ingested file (new mtime) gets a new one.
+    """
+    p = Path(db_path).resolve()
+    key = (str(p), p.stat().st_mtime_ns)
+    with _lock:
+        pool = _pools.get(key)
+        if pool is None:
+            for old in [k for k in _pools if k[0] == key[0]]:
+                _pools.pop(old).close()
+            pool = _pools[key] = ConnectionPool(p, config.SQL_POOL_SIZE)
+        return pool
 
-def _run_query(db_path: str, query: str, timeout_steps: int = 100_000):
-    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
 
-    # Abort long‑running queries
-    con.set_progress_handler(lambda: 1/0, timeout_steps)
+def _run_query(db_path: str, query: str, deadline_s: float | None = None, cancel=None):
+    deadline_s = deadline_s or db_utils.query_deadline(db_path)
+    pool = get_pool(db_path)
+    con  = pool.acquire()
     try:
-        cur = con.cursor()
-        cur.execute(query)
-        cols = [c[0] for c in cur.description]
-        rows = [dict(zip(cols, r)) for r in cur.fetchall()]
-        return "", rows, ""
-    except Exception as e:
-        return "", [], traceback.format_exc()
+        # aborted with Connection.interrupt() at the wall-clock deadline or on cancel
+        with on_cancel(cancel, con.interrupt):
+            result, err = sql_driver.run_query(con, query, deadline_s, db_path,
+                                               spill=sql_result.spill_path(), **sql_result.caps())
+        if cancelled(cancel):
+            return "", None, CANCELLED
+        return "", result, err
     finally:
-        con.close()
+        pool.release(con)
 
 
-def try_run_sql(sql: str, db_path: str):
-    stdout, rows, err = _run_query(db_path, sql)
-    return stdout, rows, [], err  # plots list left empty
+def try_run_sql(sql: str, db_path: str, cancel=None):
+    with tracing.span("sandbox.wait", backend="local", kind="sql") as s:
+        stdout, result, err = _run_query(db_path, sql, cancel=cancel)
+        s.set(rows=result["rows"] if result else 0, timed_out=err.startswith(TIMEOUT_PREFIX))
+    return stdout, result, [], err  # plots list left empty
@@ -0,0 +1,134 @@
+"""
+Host-side pre-flight for generated SQL, run before a sandbox is used.
+
+check(sql, db_path) rejects, without starting a runner:
+
+    incomplete   sqlite3.complete_statement fails (unbalanced quotes / parens)
+    statement    anything but one read-only SELECT / WITH query
+    plan         EXPLAIN QUERY PLAN fails: unknown table / column, syntax
+
+The EXPLAIN runs on a pooled read-only connection to the session DB (the
+same pool sql_local_runner uses) with an authorizer that only allows reads,
+so nothing is executed.  A full table scan of a table with at least
+SQL_FULL_SCAN_ROWS rows is reported as a warning, not an error.
+"""
+from __future__ import annotations
+import difflib, re, sqlite3
+from typing import List, Tuple
+
+from .. import config
+from ..history import tracing
+from ..history import json_history as jh
+from . import db_utils
+from .sandbox import sql_local_runner
+
+_READ_ONLY = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ,
+              sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+_COMMENTS  = re.compile(r"(--[^\n]*|/\*.*?\*/|\s)+", re.S)
+_SCAN      = re.compile(r"^SCAN (?:TABLE )?(\S+)(?!.*\bUSING\b)")
+
+
+def first_keyword(sql: str) -> str:
+    body = _COMMENTS.sub(" ", sql).strip()
+    return body.split(None, 1)[0].upper() if body else ""
+
+
+def _error(message: str) -> str:
+    return message + "\n(found by the SQL pre-flight before execution)"
+
+
+def _column_hint(con: sqlite3.Connection, message: str) -> str:
+    m = re.search(r"no such column: (?:\w+\.)?(\S+)", message)
+    if not m:
+        return ""
+    cols = [r[1] for r in con.execute("PRAGMA table_info(data)")]
+    close = difflib.get_close_matches(m.group(1).strip('"`[]'), cols, n=1)
+    hint = f". Did you mean \"{close[0]}\"?" if close else ""
+    return f"{hint}\nColumns of `data`: " + ", ".join(f'"{c}"' for c in cols)
+
+
+def explain(con: sqlite3.Connection, sql: str) -> List[str]:
+    """
+    EXPLAIN QUERY PLAN details of sql, preparing it under a read-only
+    authorizer.  Raises sqlite3 errors; PermissionError for a write.
+    """
+    denied = []
+
+    def _authorize(action, *_):
+        if action in _READ_ONLY:
+            return sqlite3.SQLITE_OK
+        denied.append(action)
+        return sqlite3.SQLITE_DENY
+
+    con.set_authorizer(_authorize)
+    try:
+        return [row[3] for row in con.execute("EXPLAIN QUERY PLAN " + sql)]
+    except sqlite3.DatabaseError:
+        if denied:
+            raise PermissionError("statement is not read-only") from None
+        raise
+    finally:
+        con.set_authorizer(None)
+
+
+def _find(sql: str, db_path) -> Tuple[str, str, List[str]]:
+    """
+    (kind, error, plan); kind is "ok" when the query may be run.
+    """
+    if not sql.strip():
+        return "statement", _error("Error: empty query; write a single SELECT statement."), []
+    body = sql.strip()
+    if not sqlite3.complete_statement(body if body.endswith(";") else body + ";"):
+        return "incomplete", _error(
+            "sqlite3.OperationalError: incomplete input - unbalanced quotes, "
+            "parentheses or comment"), []
+    if first_keyword(body) not in ("SELECT", "WITH", "VALUES"):
+        return "statement", _error(
+            f"Error: only a single SELECT query is allowed, got {first_keyword(body)}."), []
+
+    pool = sql_local_runner.get_pool(db_path)
+    con  = pool.acquire()
+    try:
+        return "ok", "", explain(con, body)
+    except PermissionError:
+        return "statement", _error(
+            "Error: only a single read-only SELECT query is allowed "
+            "(the statement would modify the database)."), []
+    except sqlite3.ProgrammingError as e:
+        return "statement", _error(f"sqlite3.ProgrammingError: {e} Send one SELECT only."), []
+    except sqlite3.Error as e:
+        return "plan", _error(f"sqlite3.{type(e).__name__}: {e}" + _column_hint(con, str(e))), []
+    finally:
+        pool.release(con)
+
+
+def full_scans(plan: List[str], db_path) -> List[str]:
+    """
+    Warnings for full table scans when the table is large.
+    """
+    rows = db_utils.stored_rows(db_path)
+    if rows is None or rows < config.SQL_FULL_SCAN_ROWS:
+        return []
+    return [f"full scan of {m.group(1)} ({rows:,} rows): {d}"
+            for d in plan if (m := _SCAN.match(d)) and m.group(1) != "CONSTANT"]
+
+
+def check(sql: str, db_path) -> Tuple[str, List[str]]:
+    """
+    ("", warnings) if the query may be run, else (error for the debug prompt, []).
+    """
+    if not config.SQL_PREFLIGHT:
+        return "", []
+    with tracing.span("sql.preflight") as s:
+        kind, error, plan = _find(sql, db_path)
+        warnings = full_scans(plan, db_path) if not error else []
+        s.set(result=kind, plan=" | ".join(plan)[:500], full_scan=bool(warnings))
+    tracing.count("sql_preflight.checked")
+    if warnings:
+        tracing.count("sql_preflight.full_scan")
+        jh.logger.info("SQL pre-flight: " + "; ".join(warnings))
+    if error:
+        tracing.count("sql_preflight.rejected")
+        tracing.count(f"sql_preflight.{kind}")
+        jh.logger.info(f"SQL pre-flight rejected a query ({kind}): {error.splitlines()[0]}")
+    return error, warnings
@@ -0,0 +1,102 @@
+"""
+Column-wise, size-capped transport for SQL results.
+
+A query result travels as
+
+    {"columns": [...], "values": [[col 0 values], [col 1 values], ...],
+     "rows": <rows kept>, "total_rows": <rows produced, or None if unknown>,
+     "truncated": bool, "spill_path": <CSV with every row, or None>}
+
+Rows are pulled with fetchmany and kept until SQL_RESULT_MAX_ROWS /
+SQL_RESULT_MAX_BYTES; with spilling on, the full result is streamed to a CSV
+instead of being held in memory.  fetch_columnar itself lives in
+sandbox/docker/sql_driver.py, shared with the sandbox.
+"""
+from __future__ import annotations
+import csv, io, math, uuid
+from pathlib import Path
+from typing import Optional
+
+from .. import config
+from .sandbox.docker import sql_driver
+
+SPILL_DIR = Path("exports/sql_results")
+
+
+def caps() -> dict:
+    """
+    Result caps from config, as keyword arguments of sql_driver.fetch_columnar.
+    """
+    return {"max_rows": config.SQL_RESULT_MAX_ROWS, "max_bytes": config.SQL_RESULT_MAX_BYTES,
+            "fetch_rows": config.SQL_FETCH_ROWS}
+
+
+def fetch_columnar(cur, max_rows: Optional[int] = None, max_bytes: Optional[int] = None,
+                   spill: Optional[Path] = None) -> dict:
+    """
+    Drain an executed cursor into the columnar result format.
+    """
+    limits = caps()
+    if max_rows is not None:
+        limits["max_rows"] = max_rows
+    if max_bytes is not None:
+        limits["max_bytes"] = max_bytes
+    return sql_driver.fetch_columnar(cur, spill, **limits)
+
+
+def spill_path() -> Optional[Path]:
+    """
+    Fresh CSV path for a full result, or None when spilling is off.
+    """
+    if not config.SQL_RESULT_SPILL:
+        return None
+    SPILL_DIR.mkdir(parents=True, exist_ok=True)
+    return SPILL_DIR / f"result_{uuid.uuid4().hex[:12]}.csv"
+
+
+def is_columnar(obj) -> bool:
+    return isinstance(obj, dict) and "columns" in obj and "values" in obj
+
+
+def preview(result: dict, n: Optional[int] = None) -> str:
+    """
+    First n rows as CSV text.
+    """
+    n = config.SQL_PREVIEW_ROWS if n is None else n
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow(result["columns"])
+    for i in range(min(n, result["rows"])):
+        w.writerow([col[i] for col in result["values"]])
+    return buf.getvalue().rstrip("\n")
+
+
+def _fmt(v) -> str:
+    return f"{v:.6g}" if isinstance(v, float) else str(v)
+
+
+def describe(result: dict) -> str:
+    """
+    Shape of the result and per-column aggregates over the rows kept.
+    """
+    total = result["total_rows"]
+    head = f"{result['rows']} rows x {len(result['columns'])} columns"
+    if result["truncated"]:
+        head += (f" kept of {total} produced" if total is not None else
+                 " kept; the query produced more (truncated)")
+    lines = [head]
+    if result.get("spill_path"):
+        lines.append(f"full result: {result['spill_path']}")
+    for name, col in zip(result["columns"], result["values"]):
+        vals  = [v for v in col if v is not None]
+        nulls = len(col) - len(vals)
+        nums  = [v for v in vals if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        if vals and len(nums) == len(vals):
+            finite = [v for v in nums if not (isinstance(v, float) and math.isnan(v))]
+            mean = sum(finite) / len(finite) if finite else float("nan")
+            lines.append(f"{name}: numeric, min {_fmt(min(nums))}, max {_fmt(max(nums))}, "
+                         f"mean {_fmt(mean)}, sum {_fmt(sum(nums))}, nulls {nulls}")
+        else:
+            distinct = len(set(map(str, vals)))
+            lines.append(f"{name}: {distinct} distinct, nulls {nulls}")
+    return "\n".join(lines)
@@ -0,0 +1,157 @@
+"""
+Non-interactive batch mode: answer a JSONL file of questions about one CSV.
+
+    python -m src.batch data.csv questions.jsonl -o results.jsonl --mode sql
+
+Each input line is a JSON object with a `question` (or `title` / `body`)
+and an optional `id` / `request_id`.  Questions are independent: they are
+processed concurrently, with separate bounds on in-flight LLM calls and
+sandbox executions, and every result is appended to the output JSONL as soon
+as it is done (in completion order, tagged with its input line).
+"""
+from __future__ import annotations
+import argparse, asyncio, json, time, traceback
+from pathlib import Path
+from typing import List
+
+from .analysis import code_validator, file_handler, index_advisor
+from .analysis.sandbox import sandbox_runner
+from .history import tracing
+from .llm import llm_wrapper
+from .main import MAX_RETRY, build_prompt, execute, render_output, session_tag
+
+
+def read_questions(path) -> List[dict]:
+    items = []
+    for i, line in enumerate(Path(path).read_text(encoding="utf-8").splitlines(), 1):
+        if not line.strip():
+            continue
+        rec = json.loads(line)
+        question = rec.get("question") or "\n\n".join(
+            x for x in (rec.get("title"), rec.get("body")) if x)
+        items.append({"line": i,
+                      "id": rec.get("id", rec.get("request_id", i)),
+                      "question": question})
+    return items
+
+
+async def solve(item: dict, summary: dict, csv_path: str, is_sql: bool,
+                llm_slots: asyncio.Semaphore, run_slots: asyncio.Semaphore,
+                with_answer: bool = True) -> dict:
+    """
+    Run the generate / execute / retry loop for one question and return a
+    result record with per-stage timings.
+    """
+    with tracing.span("question", mode="sql" if is_sql else "python",
+                      id=str(item["id"])) as q:
+        res = await _solve(item, summary, csv_path, is_sql, llm_slots, run_slots, with_answer)
+        q.set(status=res["status"], attempts=res["attempts"])
+    return res
+
+
+async def _solve(item, summary, csv_path, is_sql, llm_slots, run_slots, with_answer) -> dict:
+    t0 = time.perf_counter()
+    timings = {"llm_s": 0.0, "sandbox_s": 0.0, "answer_s": 0.0}
+    res = {**item, "status": "failed", "attempts": 0, "code": "", "error": None,
+           "output": "", "plots": "", "answer": ""}
+    error, last_code = None, ""
+    try:
+        for attempt in range(1, MAX_RETRY + 1):
+            res["attempts"] = attempt
+            if attempt > 1:
+                tracing.count("retries")
+            with tracing.span("prompt.build", attempt=attempt):
+                msgs = build_prompt(is_sql, item["question"], summary, "", error, last_code)
+            t = time.perf_counter()
+            async with llm_slots:
+                code = await llm_wrapper.achat(msgs)
+            timings["llm_s"] += time.perf_counter() - t
+            last_code = res["code"] = code
+
+            t = time.perf_counter()
+            async with run_slots:
+                stdout, ret_obj, plots, error = await asyncio.to_thread(
+                    execute, is_sql, code, csv_path, summary["columns"])
+            timings["sandbox_s"] += time.perf_counter() - t
+            res["error"] = error or None
+            if error:
+                continue
+
+            preview, plots_preview, combined = render_output(stdout, ret_obj, plots)
+            res.update(status="ok", output=preview, plots=plots_preview)
+            if with_answer:
+                t = time.perf_counter()
+                async with llm_slots:
+                    with tracing.span("llm.answer"):
+                        res["answer"] = await asyncio.to_thread(
+                            llm_wrapper.answer, item["question"], summary, code, combined)
+                timings["answer_s"] += time.perf_counter() - t
+            break
+    except Exception:
+        res.update(status="crashed", error=traceback.format_exc())
+    res["timings"] = {k: round(v, 4) for k, v in
+                      {**timings, "total_s": time.perf_counter() - t0}.items()}
+    return res
+
+
+async def run_batch(csv_path: str, questions_path: str, out_path: str,
+                    is_sql: bool = False, llm_concurrency: int = 4,
+                    sandbox_concurrency: int = 2, with_answer: bool = True) -> dict:
+    items = read_questions(questions_path)
+    tracing.configure(f"batch_{session_tag}")
+    sandbox_runner.start_probe()   # overlaps with loading the CSV
+    _, summary = await asyncio.to_thread(file_handler.load_csv, csv_path)
+    llm_slots = asyncio.Semaphore(llm_concurrency)
+    run_slots = asyncio.Semaphore(sandbox_concurrency)
+
+    out = Path(out_path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    counts = {"ok": 0, "failed": 0, "crashed": 0}
+    answered = []
+    t0 = time.perf_counter()
+    with out.open("a", encoding="utf-8") as fh:
+        tasks = [solve(it, summary, csv_path, is_sql, llm_slots, run_slots, with_answer)
+                 for it in items]
+        for done, fut in enumerate(asyncio.as_completed(tasks), 1):
+            res = await fut
+            counts[res["status"]] += 1
+            if res["status"] == "ok" and is_sql:
+                answered.append(res["code"])
+            fh.write(json.dumps(res, ensure_ascii=False, default=str) + "\n")
+            fh.flush()
+            print(f"[{done}/{len(items)}] {res['status']:<7} "
+                  f"{res['timings']['total_s']:.2f}s  {str(res['id'])[:40]}")
+    counts["wall_s"] = round(time.perf_counter() - t0, 3)
+    counts["validation"] = code_validator.stats()
+    if answered:
+        created = await asyncio.to_thread(index_advisor.advise, summary["db_path"], answered)
+        counts["indexes"] = [e["name"] for e in created]
+    code_validator.log_stats()
+    tracing.write_metrics()
+    return counts
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m src.batch", description=__doc__.strip().splitlines()[0])
+    ap.add_argument("csv", help="CSV file to analyse")
+    ap.add_argument("questions", help="JSONL file, one question per line")
+    ap.add_argument("-o", "--out", default="exports/batch_results.jsonl")
+    ap.add_argument("--mode", choices=("python", "sql"), default="python")
+    ap.add_argument("--llm-concurrency", type=int, default=4)
+    ap.add_argument("--sandbox-concurrency", type=int, default=2)
+    ap.add_argument("--no-answer", action="store_true",
+                    help="skip the natural-language answer call")
+    args = ap.parse_args(argv)
+
+    counts = asyncio.run(run_batch(
+        args.csv, args.questions, args.out,
+        is_sql=args.mode == "sql",
+        llm_concurrency=args.llm_concurrency,
+        sandbox_concurrency=args.sandbox_concurrency,
+        with_answer=not args.no_answer,
+    ))
+    print(f"Done: {counts} → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Start-up regression check for the CLI entry points.
+
+    python -m src.bench.import_time --budget 1.0
+
+Each target is imported / run in a fresh interpreter (--repeat times, median
+reported).  The check fails when a target is slower than --budget seconds or
+when importing it pulls in a heavy library (pandas, docker, openai, ...):
+those must only be loaded on first use.
+"""
+from __future__ import annotations
+import argparse, json, statistics, subprocess, sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+
+HEAVY = ("pandas", "numpy", "pyarrow", "matplotlib", "docker", "openai",
+         "transformers", "torch", "tiktoken")
+IMPORTS = ("src.main", "src.batch", "src.analysis.sandbox.sandbox_runner")
+COMMANDS = (("python -m src.main --help", ["-m", "src.main", "--help"]),
+            ("python -m src.batch --help", ["-m", "src.batch", "--help"]))
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {mod}
+dt = time.perf_counter() - t0
+print(json.dumps({{"s": dt, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(mod: str, repeat: int) -> dict:
+    samples, heavy = [], []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", _PROBE.format(mod=mod, heavy=HEAVY)],
+                             cwd=ROOT, capture_output=True, text=True, check=True)
+        rec = json.loads(out.stdout.strip().splitlines()[-1])
+        samples.append(rec["s"])
+        heavy = rec["heavy"]
+    return {"median_s": statistics.median(samples), "heavy": heavy}
+
+
+def time_command(args: list, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, check=True)
+        samples.append(time.perf_counter() - t0)
+    return {"median_s": statistics.median(samples), "heavy": []}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m src.bench.import_time")
+    ap.add_argument("--budget", type=float, default=1.0,
+                    help="max seconds per import / command (median)")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    results = {f"import {m}": time_import(m, args.repeat) for m in IMPORTS}
+    results.update({name: time_command(cmd, args.repeat) for name, cmd in COMMANDS})
+
+    failed = False
+    for name, r in results.items():
+        problems = []
+        if r["median_s"] > args.budget:
+            problems.append(f"over budget {args.budget:.2f}s")
+        if r["heavy"]:
+            problems.append("eager imports: " + ", ".join(r["heavy"]))
+        failed = failed or bool(problems)
+        print(f"{name:<48} {r['median_s'] * 1000:8.1f} ms  {'; '.join(problems) or 'ok'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
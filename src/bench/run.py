@@ -0,0 +1,209 @@
+"""
+End-to-end benchmark of the hot paths, fully offline.
+
+    python -m src.bench.run --rows 200000 --cols 12 -o bench_results/
+    python -m src.bench.run --compare old.json new.json --threshold 0.2
+
+Generates a synthetic CSV, switches the LLM to the deterministic fake
+backend (or, with --llm hf, a small local model such as
+CSV_DA_HF_MODEL=Qwen/Qwen2.5-0.5B-Instruct on CPU) and times each stage (CSV load, SQLite ingest, summary, prompt
+build, LLM round trip, local / Docker sandbox runs, SQL runners).  Every
+stage is repeated --repeat times and reported as min / median / p95 in a
+JSON file named after the current commit, so two reports can be compared
+and a slowdown beyond --threshold fails the run.
+"""
+from __future__ import annotations
+import argparse, json, os, platform, statistics, subprocess, sys, tempfile, time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+# must be set before the LLM wrapper is imported
+os.environ.setdefault("CSV_DA_MODEL", "fake")
+
+from .. import config
+from . import synth
+
+BENCH_CODE = "output_data = {'rows': int(len(df)), 'mean': float(df.select_dtypes('number').iloc[:, 0].mean())}"
+BENCH_SQL  = "SELECT COUNT(*) AS n FROM data"
+
+
+def _git_sha() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True,
+            cwd=Path(__file__).resolve().parents[2],
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def _stats(samples: List[float]) -> Dict[str, float]:
+    s = sorted(samples)
+    p95 = s[min(len(s) - 1, int(round(0.95 * (len(s) - 1))))]
+    return {"n": len(s), "min_s": round(s[0], 6), "median_s": round(statistics.median(s), 6),
+            "p95_s": round(p95, 6), "mean_s": round(statistics.fmean(s), 6)}
+
+
+class Bench:
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.stages: Dict[str, dict] = {}
+
+    def time(self, name: str, fn: Callable, repeat: int | None = None,
+             setup: Callable | None = None):
+        samples = []
+        out = None
+        for _ in range(repeat or self.repeat):
+            if setup:
+                setup()
+            t0 = time.perf_counter()
+            out = fn()
+            samples.append(time.perf_counter() - t0)
+        self.stages[name] = _stats(samples)
+        print(f"  {name:<32} median {self.stages[name]['median_s'] * 1000:10.2f} ms")
+        return out
+
+    def skip(self, name: str, reason: str):
+        self.stages[name] = {"skipped": reason}
+        print(f"  {name:<32} skipped ({reason})")
+
+
+def run(rows: int, cols: int, str_width: int, repeat: int, out_dir: Path,
+        with_docker: bool = True, llm: str = "fake") -> Path:
+    work = Path(tempfile.mkdtemp(prefix="csv_da_bench_"))
+    csv_path = work / "bench.csv"
+    db_path  = csv_path.with_suffix(".db")
+    cache    = work / "cache"
+
+    # every run starts from empty caches; the result cache would hide sandbox cost
+    config.CACHE_DIR = cache
+    config.RESULT_CACHE_ENABLED = False
+    config.LLM_CACHE_ENABLED = False
+    config.MODEL_BACKEND = llm
+
+    from ..history import tracing
+    tracing.configure("bench", work)   # spans stay on, so their overhead is measured
+    from ..analysis import csv_cache, db_utils, file_handler
+    from ..llm import llm_wrapper
+    from ..llm.prompts import builder
+    from ..analysis.sandbox import local_runner, sql_local_runner
+
+    b = Bench(repeat)
+    print(f"bench: {rows:,} rows x {cols} cols → {work}")
+    b.time("synth_csv", lambda: synth.write_csv(csv_path, rows, cols, str_width=str_width), repeat=1)
+
+    def _cold():
+        import shutil
+        shutil.rmtree(cache, ignore_errors=True)
+        db_path.unlink(missing_ok=True)
+
+    b.time("load_csv_cold", lambda: file_handler.load_csv(csv_path), setup=_cold)
+    df, summary = b.time("load_csv_warm", lambda: file_handler.load_csv(csv_path))
+    if df is None:
+        df = csv_cache.load(csv_path)
+    b.time("csv_cache_read", lambda: csv_cache.load(csv_path))
+    b.time("csv_to_sqlite", lambda: db_utils.csv_to_sqlite(df, work / "inmem.csv"))
+    b.time("ingest_csv_cold", lambda: db_utils.ingest_csv(csv_path),
+           setup=lambda: db_path.unlink(missing_ok=True))
+    b.time("ingest_csv_warm", lambda: db_utils.ingest_csv(csv_path))
+    b.time("summarize_csv_stream", lambda: file_handler.summarize_csv(csv_path))
+
+    def _prompts():
+        summary.pop(builder.SCHEMA_KEY, None)
+        builder.build_code_prompt("How many rows?", summary)
+        builder.build_sql_prompt("How many rows?", summary)
+    b.time("prompt_build", _prompts)
+    msgs = builder.build_code_prompt("How many rows?", summary)
+    b.time(f"llm_{llm}_chat", lambda: llm_wrapper.chat(msgs))
+    if llm == "hf":
+        # a follow-up question shares the system prompt + schema prefix with msgs
+        follow = builder.build_code_prompt("What is the mean of the first numeric column?", summary)
+        b.time("llm_hf_chat_prefix_reuse", lambda: llm_wrapper.chat(follow))
+
+    b.time("local_sandbox_run", lambda: local_runner.run_in_sandbox(BENCH_CODE, str(csv_path)))
+    b.time("sql_local_run", lambda: sql_local_runner.try_run_sql(BENCH_SQL, str(db_path)))
+
+    if with_docker:
+        try:
+            from ..analysis.sandbox import docker_runner, sql_docker_runner
+            docker_runner.get_client().ping()
+        except Exception as e:
+            for name in ("docker_sandbox_cold", "docker_sandbox_pooled",
+                         "sql_docker_cold", "sql_docker_pooled"):
+                b.skip(name, f"docker unavailable: {type(e).__name__}")
+        else:
+            pool_size = config.SANDBOX_POOL_SIZE
+            config.SANDBOX_POOL_SIZE = 0
+            b.time("docker_sandbox_cold", lambda: docker_runner.run_in_sandbox(BENCH_CODE, str(csv_path)))
+            b.time("sql_docker_cold", lambda: sql_docker_runner.run_in_sandbox(BENCH_SQL, str(db_path)))
+            config.SANDBOX_POOL_SIZE = max(pool_size, 1)
+            # first call pays for the pool start-up; time the steady state
+            docker_runner.run_in_sandbox(BENCH_CODE, str(csv_path))
+            sql_docker_runner.run_in_sandbox(BENCH_SQL, str(db_path))
+            b.time("docker_sandbox_pooled", lambda: docker_runner.run_in_sandbox(BENCH_CODE, str(csv_path)))
+            b.time("sql_docker_pooled", lambda: sql_docker_runner.run_in_sandbox(BENCH_SQL, str(db_path)))
+            config.SANDBOX_POOL_SIZE = pool_size
+
+    report = {
+        "meta": {
+            "commit": _git_sha(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {"rows": rows, "cols": cols, "str_width": str_width, "repeat": repeat,
+                       "llm": llm if llm == "fake" else f"hf:{config.HF_MODEL}"},
+            "csv_bytes": csv_path.stat().st_size,
+        },
+        "stages": b.stages,
+    }
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out = out_dir / f"bench_{report['meta']['commit']}_{rows}x{cols}.json"
+    out.write_text(json.dumps(report, indent=2))
+    print(f"report → {out}")
+    return out
+
+
+def compare(base_path, new_path, threshold: float) -> int:
+    """
+    Print per-stage median deltas; return 1 if any stage regressed beyond threshold.
+    """
+    base = json.loads(Path(base_path).read_text())["stages"]
+    new  = json.loads(Path(new_path).read_text())["stages"]
+    regressed = []
+    for name, st in new.items():
+        old = base.get(name, {})
+        if "median_s" not in st or "median_s" not in old or old["median_s"] == 0:
+            continue
+        delta = st["median_s"] / old["median_s"] - 1
+        flag = "  REGRESSION" if delta > threshold else ""
+        print(f"{name:<32} {old['median_s'] * 1000:10.2f} → {st['median_s'] * 1000:10.2f} ms "
+              f"({delta:+.1%}){flag}")
+        if flag:
+            regressed.append(name)
+    return 1 if regressed else 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m src.bench.run")
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--cols", type=int, default=12)
+    ap.add_argument("--str-width", type=int, default=16)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("-o", "--out-dir", default="bench_results")
+    ap.add_argument("--no-docker", action="store_true")
+    ap.add_argument("--llm", choices=("fake", "hf"), default="fake",
+                    help="fake: canned responses; hf: local model (CSV_DA_HF_MODEL)")
+    ap.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"))
+    ap.add_argument("--threshold", type=float, default=0.2,
+                    help="allowed relative slowdown of a stage median")
+    args = ap.parse_args(argv)
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+    run(args.rows, args.cols, args.str_width, args.repeat, Path(args.out_dir),
+        with_docker=not args.no_docker, llm=args.llm)
+
+
+if __name__ == "__main__":
+    main()
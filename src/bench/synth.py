@@ -0,0 +1,84 @@
+"""
+Synthetic CSV generator for benchmarks.
+
+    python -m src.bench.synth out.csv --rows 1000000 --cols 20 --dtypes int,float,str,cat,date,money
+
+Columns cycle through the requested dtypes; `str` columns are random text of
+--str-width characters, `cat` columns draw from a small vocabulary, `money`
+columns look like " $1,234 " (the format the sample data uses).
+"""
+from __future__ import annotations
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DTYPES = ("int", "float", "str", "cat", "date", "money")
+_ALPHABET = np.array(list("abcdefghijklmnopqrstuvwxyz0123456789 "))
+
+
+def _column(kind: str, rows: int, width: int, rng: np.random.Generator):
+    if kind == "int":
+        return rng.integers(0, 1_000_000, rows)
+    if kind == "float":
+        v = rng.normal(100, 25, rows).round(3)
+        v[rng.random(rows) < 0.01] = np.nan          # a few nulls
+        return v
+    if kind == "str":
+        chars = rng.choice(_ALPHABET, size=(rows, width))
+        return chars.view(f"<U{width}").ravel()
+    if kind == "cat":
+        return rng.choice(["North", "South", "East", "West", "Central"], rows)
+    if kind == "date":
+        start = np.datetime64("2015-01-01")
+        return (start + rng.integers(0, 3650, rows).astype("timedelta64[D]")).astype(str)
+    if kind == "money":
+        return np.char.add(np.char.add(" $", np.char.mod("%d,000", rng.integers(1, 99, rows))), " ")
+    raise ValueError(f"unknown dtype {kind!r}; choose from {DTYPES}")
+
+
+def make_frame(rows: int, cols: int, dtypes=DTYPES, str_width: int = 16,
+               seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(cols):
+        kind = dtypes[i % len(dtypes)]
+        data[f"{kind}_{i}"] = _column(kind, rows, str_width, rng)
+    return pd.DataFrame(data)
+
+
+def write_csv(path, rows: int, cols: int, dtypes=DTYPES, str_width: int = 16,
+              seed: int = 0, chunk_rows: int = 200_000) -> Path:
+    """
+    Write the synthetic table in chunks so large files don't need the RAM.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    part = 0
+    while written < rows or part == 0:
+        n = min(chunk_rows, rows - written)
+        df = make_frame(n, cols, dtypes, str_width, seed + part)
+        df.to_csv(path, mode="w" if part == 0 else "a", header=part == 0, index=False)
+        written += n
+        part += 1
+    return path
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m src.bench.synth")
+    ap.add_argument("out")
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--cols", type=int, default=12)
+    ap.add_argument("--dtypes", default=",".join(DTYPES))
+    ap.add_argument("--str-width", type=int, default=16)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+    p = write_csv(args.out, args.rows, args.cols, tuple(args.dtypes.split(",")),
+                  args.str_width, args.seed)
+    print(f"wrote {p} ({p.stat().st_size / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
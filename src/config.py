@@ -15,3 +15,114 @@ DATA_DIR = ROOT / "data"
 # API keys and tokens
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 HF_ACCESS_TOKEN = os.getenv("HF_ACCESS_TOKEN", "")
+
+# Warm sandbox pool (Docker backend); size 0 disables it
+SANDBOX_POOL_SIZE       = int(os.getenv("CSV_DA_POOL_SIZE", "2"))
+SANDBOX_POOL_MAX_RUNS   = int(os.getenv("CSV_DA_POOL_MAX_RUNS", "25"))
+SANDBOX_POOL_STARTUP_S  = float(os.getenv("CSV_DA_POOL_STARTUP_S", "60"))
+SANDBOX_POOL_HEARTBEAT_S = float(os.getenv("CSV_DA_POOL_HEARTBEAT_S", "5"))
+
+# Local backend: fork each snippet from a server that already holds the data;
+# 0 starts a fresh interpreter per snippet instead
+LOCAL_FORKSERVER        = os.getenv("CSV_DA_LOCAL_FORKSERVER", "1") != "0"
+
+# On-disk caches (parsed CSVs, profiles, results, ...)
+CACHE_DIR = Path(os.getenv("CSV_DA_CACHE_DIR", Path(__file__).resolve().parents[1] / ".cache"))
+CSV_CACHE_ENABLED   = os.getenv("CSV_DA_CSV_CACHE", "1") != "0"
+CSV_CACHE_MAX_BYTES = int(os.getenv("CSV_DA_CSV_CACHE_MAX_BYTES", str(4 * 1024**3)))
+
+# Streaming CSV -> SQLite ingest
+SQLITE_INGEST_CHUNK_ROWS = int(os.getenv("CSV_DA_INGEST_CHUNK_ROWS", "100000"))
+
+# Dataset summary: above this size the CSV is summarised in one streaming
+# pass (bounded memory) instead of being loaded as a whole DataFrame
+STREAM_SUMMARY_MIN_BYTES = int(os.getenv("CSV_DA_STREAM_SUMMARY_MIN_BYTES", str(512 * 1024**2)))
+SUMMARY_CHUNK_ROWS  = int(os.getenv("CSV_DA_SUMMARY_CHUNK_ROWS", "100000"))
+SUMMARY_SAMPLE_ROWS = int(os.getenv("CSV_DA_SUMMARY_SAMPLE_ROWS", "10"))
+
+# Persistent LLM response cache (only deterministic, temperature-0 calls)
+LLM_CACHE_ENABLED     = os.getenv("CSV_DA_LLM_CACHE", "1") != "0"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("CSV_DA_LLM_CACHE_MAX_ENTRIES", "20000"))
+LLM_CACHE_MAX_BYTES   = int(os.getenv("CSV_DA_LLM_CACHE_MAX_BYTES", str(256 * 1024**2)))
+LLM_CACHE_TTL_S       = float(os.getenv("CSV_DA_LLM_CACHE_TTL_S", str(30 * 24 * 3600)))
+
+# Static checks on generated Python before it is sent to a sandbox
+CODE_VALIDATION = os.getenv("CSV_DA_VALIDATE", "1") != "0"
+
+# Sandbox execution result cache
+RESULT_CACHE_ENABLED   = os.getenv("CSV_DA_RESULT_CACHE", "1") != "0"
+RESULT_CACHE_MAX_BYTES = int(os.getenv("CSV_DA_RESULT_CACHE_MAX_BYTES", str(512 * 1024**2)))
+
+# CLI: async pipeline with streamed answers (1); the default is the blocking loop
+ASYNC_PIPELINE = os.getenv("CSV_DA_ASYNC", "0") != "0"
+
+# Speculative retries (both CLI loops): N candidate programs generated and executed in
+# parallel per attempt, first one satisfying the output contract wins (0/1 = off)
+SPECULATIVE_CANDIDATES   = int(os.getenv("CSV_DA_SPECULATIVE_N", "0"))
+SPECULATIVE_TEMPERATURES = [float(t) for t in os.getenv("CSV_DA_SPECULATIVE_TEMPS", "0,0.4,0.8").split(",")]
+SPECULATIVE_MAX_PARALLEL = int(os.getenv("CSV_DA_SPECULATIVE_PARALLEL", "3"))
+
+# Chat history (append-only JSONL): fsync "always", "interval" or "never"
+HISTORY_FSYNC        = os.getenv("CSV_DA_HISTORY_FSYNC", "interval")
+HISTORY_FSYNC_S      = float(os.getenv("CSV_DA_HISTORY_FSYNC_S", "1.0"))
+HISTORY_CACHE_ROWS   = int(os.getenv("CSV_DA_HISTORY_CACHE_ROWS", "64"))
+
+# Prompt schema block: token budget and per-cell truncation
+SCHEMA_TOKEN_BUDGET = int(os.getenv("CSV_DA_SCHEMA_TOKEN_BUDGET", "1500"))
+SCHEMA_CELL_CHARS   = int(os.getenv("CSV_DA_SCHEMA_CELL_CHARS", "40"))
+
+# Per-question tracing spans, exported to log/traces_<session>.jsonl
+TRACING_ENABLED = os.getenv("CSV_DA_TRACING", "1") != "0"
+
+# Local Hugging Face backend (any CSV_DA_MODEL other than openai / fake);
+# on CPU-only boxes pick a small instruct model, e.g.
+# CSV_DA_HF_MODEL=Qwen/Qwen2.5-0.5B-Instruct
+HF_MODEL        = os.getenv("CSV_DA_HF_MODEL", DEFAULT_HF_MODEL)
+HF_DEVICE       = os.getenv("CSV_DA_HF_DEVICE", "auto")   # auto / cpu / cuda / mps
+HF_DTYPE        = os.getenv("CSV_DA_HF_DTYPE", "auto")    # auto / float32 / bfloat16 / float16
+HF_MAX_BATCH    = int(os.getenv("CSV_DA_HF_MAX_BATCH", "4"))
+HF_BATCH_WAIT_S = float(os.getenv("CSV_DA_HF_BATCH_WAIT_S", "0.02"))
+HF_PREFIX_CACHE_ENTRIES = int(os.getenv("CSV_DA_HF_PREFIX_CACHE", "4"))
+
+# SQL mode: pooled read-only connections and a wall-clock query deadline of
+# SQL_TIMEOUT_S + SQL_TIMEOUT_PER_GB_S per GB of database, at most SQL_TIMEOUT_MAX_S
+SQL_POOL_SIZE        = int(os.getenv("CSV_DA_SQL_POOL_SIZE", "4"))
+SQL_CACHE_KIB        = int(os.getenv("CSV_DA_SQL_CACHE_KIB", str(64 * 1024)))
+SQL_MMAP_BYTES       = int(os.getenv("CSV_DA_SQL_MMAP_BYTES", str(1024**3)))
+SQL_STATEMENT_CACHE  = int(os.getenv("CSV_DA_SQL_STATEMENT_CACHE", "128"))
+SQL_TIMEOUT_S        = float(os.getenv("CSV_DA_SQL_TIMEOUT_S", "10"))
+SQL_TIMEOUT_PER_GB_S = float(os.getenv("CSV_DA_SQL_TIMEOUT_PER_GB_S", "30"))
+SQL_TIMEOUT_MAX_S    = float(os.getenv("CSV_DA_SQL_TIMEOUT_MAX_S", "300"))
+
+# SQL pre-flight on the host: completeness, single read-only SELECT and
+# EXPLAIN QUERY PLAN before a runner is used; full scans of tables with at
+# least SQL_FULL_SCAN_ROWS rows are reported
+SQL_PREFLIGHT       = os.getenv("CSV_DA_SQL_PREFLIGHT", "1") != "0"
+SQL_FULL_SCAN_ROWS  = int(os.getenv("CSV_DA_SQL_FULL_SCAN_ROWS", "1000000"))
+
+# Index advisor (SQL mode): at the end of a session, columns filtered, grouped
+# or sorted on by at least SQL_INDEX_MIN_USES successful queries are indexed
+# in <csv>.db, at most SQL_INDEX_MAX indexes taking at most SQL_INDEX_BUDGET
+# (a fraction of the database size) of disk
+SQL_INDEX_ADVISOR   = os.getenv("CSV_DA_INDEX_ADVISOR", "1") != "0"
+SQL_INDEX_MIN_USES  = int(os.getenv("CSV_DA_INDEX_MIN_USES", "2"))
+SQL_INDEX_MAX       = int(os.getenv("CSV_DA_INDEX_MAX", "6"))
+SQL_INDEX_BUDGET    = float(os.getenv("CSV_DA_INDEX_BUDGET", "1.0"))
+
+# SQL results: fetched in batches, returned column-wise and capped; with
+# spilling on, every row is also written to exports/sql_results/*.csv
+SQL_FETCH_ROWS       = int(os.getenv("CSV_DA_SQL_FETCH_ROWS", "500"))
+SQL_RESULT_MAX_ROWS  = int(os.getenv("CSV_DA_SQL_RESULT_MAX_ROWS", "1000"))
+SQL_RESULT_MAX_BYTES = int(os.getenv("CSV_DA_SQL_RESULT_MAX_BYTES", str(1024**2)))
+SQL_RESULT_SPILL     = os.getenv("CSV_DA_SQL_SPILL", "0") != "0"
+SQL_PREVIEW_ROWS     = int(os.getenv("CSV_DA_SQL_PREVIEW_ROWS", "20"))
+
+# Python sandbox result channel: stdout keeps its head and tail up to
+# STDOUT_MAX_CHARS; output_data over OUTPUT_INLINE_MAX_BYTES (and every
+# DataFrame / Series) comes back as an Arrow IPC file in exports/outputs,
+# with only a preview in the prompt; payloads over OUTPUT_MAX_BYTES are dropped
+STDOUT_MAX_CHARS        = int(os.getenv("CSV_DA_STDOUT_MAX_CHARS", "20000"))
+OUTPUT_INLINE_MAX_BYTES = int(os.getenv("CSV_DA_OUTPUT_INLINE_MAX_BYTES", str(64 * 1024)))
+OUTPUT_MAX_BYTES        = int(os.getenv("CSV_DA_OUTPUT_MAX_BYTES", str(256 * 1024**2)))
+OUTPUT_PREVIEW_CHARS    = int(os.getenv("CSV_DA_OUTPUT_PREVIEW_CHARS", "4000"))
+OUTPUT_PREVIEW_ROWS     = int(os.getenv("CSV_DA_OUTPUT_PREVIEW_ROWS", "20"))
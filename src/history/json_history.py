@@ -2,16 +2,21 @@
 JSONHistory:  persistent (question, code, result, explanation) store.
 LogHelper:    central rotating logger for prompts & model outputs.
 """
-import json
+import hashlib, json
 import logging
 import logging.handlers  
+import os, threading, time
+from collections import deque
 from datetime import datetime, timezone   
 from pathlib import Path
 from typing import List, Dict
 
+from .. import config
+
 # Default directories and logging setup
 ROOT_DIR = Path(__file__).resolve().parents[2]
 DEFAULT_LOG_DIR = ROOT_DIR / "log"
+CHAT_HISTORY_DIR = Path("src/history/chat_history")
 
 
 def make_logger(
@@ -49,6 +54,55 @@ def make_logger(
 logger = make_logger(level=logging.DEBUG)   # DEBUG captures .debug()
 
 
+def migrate_json(legacy: Path) -> Path:
+    """
+    Convert a legacy JSON-array history file into <name>.jsonl and remove it.
+    """
+    legacy = Path(legacy)
+    target = legacy.with_suffix(".jsonl")
+    try:
+        rows = json.loads(legacy.read_text(encoding="utf-8"))
+    except Exception as e:
+        logger.error(f"Legacy history {legacy.name} unreadable, not migrated. {e}")
+        return target
+    with open(target, "a", encoding="utf-8") as fh:
+        for row in rows:
+            fh.write(json.dumps(row, ensure_ascii=False) + "\n")
+    legacy.unlink()
+    logger.info(f"Migrated {len(rows)} rows from {legacy.name} to {target.name}.")
+    return target
+
+
+def migrate_dir(history_dir: Path):
+    """
+    Migrate every legacy hist_*.json file in a chat-history directory.
+    """
+    for legacy in Path(history_dir).glob("hist_*.json"):
+        migrate_json(legacy)
+
+
+def history_key(csv_path) -> str:
+    """
+    Short hash naming the hist_<key>_<session>.jsonl files of a CSV.
+    """
+    return hashlib.md5(str(csv_path).encode()).hexdigest()[:8]
+
+
+def history_files(csv_path, history_dir: Path = CHAT_HISTORY_DIR) -> List[Path]:
+    """
+    Every session history of a CSV, oldest first.
+    """
+    return sorted(Path(history_dir).glob(f"hist_{history_key(csv_path)}_*.jsonl"))
+
+
+def read_rows(path: Path) -> List[Dict]:
+    """
+    Every row of a history file, without opening it as a JSONHistory.
+    """
+    with open(path, encoding="utf-8", errors="replace") as fh:
+        return JSONHistory._parse(fh)
+
+
 class JSONHistory:
     """
     Each row = {
@@ -59,59 +113,119 @@ class JSONHistory:
         "explain": str
     }
     A persistent store for question, code, and response data.
-    Data is stored as JSON, with each entry containing question, code,
-    output preview, and explanation fields.
+    Rows are appended to a JSONL file (one JSON object per line), so an
+    append is O(1); the most recent rows are also kept in memory and older
+    ones are read backwards from the end of the file, so tail(n) never
+    parses the whole history.  A legacy JSON-array file (hist_*.json) is
+    migrated to <name>.jsonl on open.
     """
 
-    def __init__(self, file_path: Path):
+    def __init__(self, file_path: Path,
+                 fsync: str = config.HISTORY_FSYNC,
+                 cache_rows: int = config.HISTORY_CACHE_ROWS):
+        file_path = Path(file_path)
+        if file_path.suffix == ".json":
+            legacy, file_path = file_path, file_path.with_suffix(".jsonl")
+            if legacy.exists():
+                migrate_json(legacy)
         self.path = file_path
         self.path.parent.mkdir(parents=True, exist_ok=True)
-        if not self.path.exists():
-            self._save([])
-
-    def _load(self) -> List[Dict]:
+        self.path.touch(exist_ok=True)
+        self.fsync = fsync
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+        self._count = self._count_rows()
+        self._recent: deque = deque(self._read_tail(cache_rows), maxlen=cache_rows)
+
+    # ── file access ───────────────────────────────────────────
+    def _count_rows(self) -> int:
+        n = 0
+        with open(self.path, "rb") as fh:
+            while block := fh.read(1 << 20):
+                n += block.count(b"\n")
+        return n
+
+    @staticmethod
+    def _parse(lines) -> List[Dict]:
+        rows = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                # e.g. a torn last line after a crash - skip it, keep the rest
+                logger.error(f"Skipping corrupted history line. {e}")
+        return rows
+
+    def _read_tail(self, n: int) -> List[Dict]:
         """
-        Load all rows from the history file, resetting it if corrupted.
+        Parse only the last n lines, reading the file backwards in blocks.
         """
-        try:
-            return json.loads(self.path.read_text(encoding="utf-8"))
-        except Exception as e:
-            logger.error(f"History file corrupted, resetting. {e}")
-            self._save([])
+        if n <= 0:
             return []
+        with open(self.path, "rb") as fh:
+            fh.seek(0, os.SEEK_END)
+            pos, buf = fh.tell(), b""
+            while pos > 0 and buf.count(b"\n") <= n:
+                step = min(1 << 16, pos)
+                pos -= step
+                fh.seek(pos)
+                buf = fh.read(step) + buf
+        lines = buf.decode("utf-8", errors="replace").splitlines()
+        return self._parse(lines[-n:])
 
-    def _save(self, rows: List[Dict]):
+    def _load(self) -> List[Dict]:
         """
-        Save all rows back to the history file.
+        Load all rows from the history file.
         """
-        self.path.write_text(
-            json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8"
-        )
+        with open(self.path, encoding="utf-8", errors="replace") as fh:
+            return self._parse(fh)
 
     @property
     def rows(self) -> List[Dict]:
         return self._load()
 
+    def __len__(self) -> int:
+        return self._count
+
     def tail(self, n: int) -> List[Dict]:
         """
         Retrieve the last 'n' rows of history.
         """
-        return self.rows[-n:]
+        with self._lock:
+            if n <= len(self._recent) or len(self._recent) == self._count:
+                return list(self._recent)[-n:] if n > 0 else []
+        return self._read_tail(n)
 
     def append(self, row: Dict):
         """
         Add a new row to the history file.
         """
-        data = self._load()
-        data.append(row)
-        self._save(data)
-        logger.info(f"History appended (total {len(data)} rows).")
+        line = json.dumps(row, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write(line)
+                fh.flush()
+                now = time.monotonic()
+                if self.fsync == "always" or (
+                    self.fsync == "interval" and now - self._last_sync >= config.HISTORY_FSYNC_S
+                ):
+                    os.fsync(fh.fileno())
+                    self._last_sync = now
+            self._recent.append(row)
+            self._count += 1
+            total = self._count
+        logger.info(f"History appended (total {total} rows).")
 
     def clear(self):
         """
         Clear all entries from the history file.
         """
-        self._save([])
+        with self._lock:
+            self.path.write_text("", encoding="utf-8")
+            self._recent.clear()
+            self._count = 0
         logger.info("History cleared.")
 
 
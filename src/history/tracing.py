@@ -0,0 +1,158 @@
+"""
+Structured tracing for each question: nested spans around every stage
+(summary, prompt build, LLM calls, sandbox create/wait/teardown, result
+parse, plot export, retries).
+
+Finished spans are appended to log/traces_<session>.jsonl, one JSON object
+per line using OTLP field names (traceId, spanId, parentSpanId, name,
+startTimeUnixNano, endTimeUnixNano, attributes, status), and their
+durations are aggregated into p50/p95 counters written by write_metrics().
+"""
+from __future__ import annotations
+import contextvars, json, os, threading, time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .. import config
+from .json_history import DEFAULT_LOG_DIR
+
+_current: contextvars.ContextVar = contextvars.ContextVar("csv_da_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "attributes", "status", "message")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: dict):
+        self.name      = name
+        self.trace_id  = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id   = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else ""
+        self.start_ns  = time.time_ns()
+        self.end_ns    = 0
+        self.attributes = dict(attributes)
+        self.status    = "OK"
+        self.message   = ""
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration_s(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def to_dict(self) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {"code": self.status, "message": self.message},
+        }
+
+
+class _Exporter:
+    def __init__(self):
+        self.path: Optional[Path] = None
+        self._fh = None
+        self._lock = threading.Lock()
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self.counters: Dict[str, float] = defaultdict(float)
+
+    def configure(self, session_tag: str, log_dir: Path = DEFAULT_LOG_DIR):
+        with self._lock:
+            if self._fh:
+                self._fh.close()
+                self._fh = None
+            log_dir.mkdir(parents=True, exist_ok=True)
+            self.path = log_dir / f"traces_{session_tag}.jsonl"
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self.durations[span.name].append(span.duration_s)
+            if self.path is None:
+                DEFAULT_LOG_DIR.mkdir(parents=True, exist_ok=True)
+                self.path = DEFAULT_LOG_DIR / "traces.jsonl"
+            if self._fh is None:
+                self._fh = open(self.path, "a", encoding="utf-8")
+            self._fh.write(line + "\n")
+            self._fh.flush()
+
+
+_exporter = _Exporter()
+
+
+def configure(session_tag: str, log_dir: Path = DEFAULT_LOG_DIR):
+    """
+    Route this session's spans to log_dir/traces_<session_tag>.jsonl.
+    """
+    _exporter.configure(session_tag, log_dir)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a block as a child of the current span (or as a new trace root).
+    """
+    if not config.TRACING_ENABLED:
+        yield Span(name, None, {})
+        return
+    s = Span(name, _current.get(), attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.status, s.message = "ERROR", f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        s.end_ns = time.time_ns()
+        _exporter.export(s)
+
+
+def current() -> Optional[Span]:
+    return _current.get()
+
+
+def count(name: str, value: float = 1):
+    """
+    Add to a session-level counter (tokens, retries, cache hits, ...).
+    """
+    with _exporter._lock:
+        _exporter.counters[name] += value
+
+
+def _pct(sorted_vals: List[float], q: float) -> float:
+    return sorted_vals[min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))]
+
+
+def metrics() -> dict:
+    """
+    Aggregated span durations (count, p50, p95, max, total) and counters.
+    """
+    with _exporter._lock:
+        spans = {}
+        for name, vals in _exporter.durations.items():
+            s = sorted(vals)
+            spans[name] = {"count": len(s), "p50_s": round(_pct(s, 0.5), 6),
+                           "p95_s": round(_pct(s, 0.95), 6), "max_s": round(s[-1], 6),
+                           "total_s": round(sum(s), 6)}
+        return {"spans": spans, "counters": dict(_exporter.counters)}
+
+
+def write_metrics(path: Optional[Path] = None) -> Optional[Path]:
+    """
+    Dump metrics() next to the trace file (metrics_<session>.json).
+    """
+    if _exporter.path is None and path is None:
+        return None
+    path = path or _exporter.path.with_name(
+        _exporter.path.name.replace("traces", "metrics", 1)).with_suffix(".json")
+    path.write_text(json.dumps(metrics(), indent=2), encoding="utf-8")
+    return path
@@ -0,0 +1,48 @@
+"""
+Deterministic offline stand-in for the LLM (CSV_DA_MODEL=fake).
+
+Replays canned responses so benchmarks and batch runs need no network.
+A script file (CSV_DA_FAKE_LLM_SCRIPT) may hold a JSON list of
+{"match": "<substring of the last user message>", "response": "..."}
+rules; the first rule that matches wins, otherwise a default response for
+the prompt kind (code / SQL / answer) is returned.
+"""
+from __future__ import annotations
+import json, os, time
+from pathlib import Path
+from typing import List
+
+DEFAULT_CODE   = "output_data = {'rows': int(len(df)), 'columns': list(df.columns)}"
+DEFAULT_SQL    = "SELECT COUNT(*) AS n FROM data"
+DEFAULT_ANSWER = "（离线模拟回答）The query ran successfully; see output_data for the figures."
+
+_rules = None
+
+
+def _load_rules() -> list:
+    global _rules
+    if _rules is None:
+        path = os.getenv("CSV_DA_FAKE_LLM_SCRIPT")
+        _rules = json.loads(Path(path).read_text(encoding="utf-8")) if path else []
+    return _rules
+
+
+def complete(messages: List[dict]) -> str:
+    """
+    Return the canned response for this message list.
+    """
+    latency = float(os.getenv("CSV_DA_FAKE_LLM_LATENCY_S", "0"))
+    if latency:
+        time.sleep(latency)
+
+    user = messages[-1]["content"]
+    for rule in _load_rules():
+        if rule["match"] in user:
+            return rule["response"]
+
+    system = messages[0]["content"]
+    if "text-to-SQL" in system:
+        return DEFAULT_SQL
+    if "explains data" in system:
+        return DEFAULT_ANSWER
+    return DEFAULT_CODE
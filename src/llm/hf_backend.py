@@ -0,0 +1,336 @@
+"""
+Local Hugging Face backend (CSV_DA_MODEL=hf), usable offline on a CPU box.
+
+The model is loaded on the first request by a single worker thread that owns
+it; callers only enqueue requests.
+
+* Prefix KV cache: every prompt starts with the same system prompt and the
+  per-session schema block.  The KV cache of recent prompts is kept, and a
+  new prompt only runs the forward pass over the tokens after its longest
+  common prefix with a cached one.
+* Batching: non-streaming requests that arrive together (same sampling
+  parameters, within CSV_DA_HF_BATCH_WAIT_S) are generated in one padded
+  `generate` call, seeded with the cached KV of their shared prefix.
+* Streaming: stream() yields text as tokens are produced.
+
+transformers / torch are optional dependencies, imported on first use.
+"""
+from __future__ import annotations
+import copy, queue, threading, time
+from collections import OrderedDict, deque
+from typing import Iterator, List, Optional
+
+from .. import config
+
+_STOP = object()
+
+
+class _Request:
+    __slots__ = ("ids", "messages", "temperature", "max_new_tokens", "stream",
+                 "chunks", "done", "result", "error")
+
+    def __init__(self, messages: List[dict], temperature: float,
+                 max_new_tokens: int, stream: bool):
+        self.messages       = messages
+        self.ids            = None
+        self.temperature    = temperature
+        self.max_new_tokens = max_new_tokens
+        self.stream         = stream
+        self.chunks: "queue.Queue" = queue.Queue()
+        self.done           = threading.Event()
+        self.result         = ""
+        self.error: Optional[BaseException] = None
+
+    def finish(self, text: str = "", error: Optional[BaseException] = None):
+        self.result, self.error = text, error
+        self.chunks.put(error if error is not None else _STOP)
+        self.done.set()
+
+
+def _crop(past, n: int):
+    if hasattr(past, "crop"):          # transformers Cache object
+        past.crop(n)
+        return past
+    return tuple((k[:, :, :n, :], v[:, :, :n, :]) for k, v in past)  # legacy tuples
+
+
+def _repeat(past, b: int):
+    if hasattr(past, "batch_repeat_interleave"):
+        past.batch_repeat_interleave(b)
+        return past
+    return tuple((k.repeat(b, 1, 1, 1), v.repeat(b, 1, 1, 1)) for k, v in past)
+
+
+def _common_prefix(batch: List[List[int]]) -> List[int]:
+    n = 0
+    for col in zip(*batch):
+        if any(t != col[0] for t in col):
+            break
+        n += 1
+    return batch[0][:n]
+
+
+class PrefixCache:
+    """
+    Small LRU of (prompt token ids -> KV cache).  lookup() returns a private
+    copy of the entry sharing the longest common prefix, cropped to it.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, object]" = OrderedDict()
+        self.hits = self.misses = self.reused_tokens = 0
+
+    def lookup(self, ids: List[int]):
+        best_key, best_n = None, 0
+        for key in self._entries:
+            n = 0
+            for a, b in zip(key, ids):
+                if a != b:
+                    break
+                n += 1
+            if n > best_n:
+                best_key, best_n = key, n
+        # at least one prompt token must still go through the model for logits
+        best_n = min(best_n, len(ids) - 1)
+        if best_key is None or best_n <= 0:
+            self.misses += 1
+            return 0, None
+        self._entries.move_to_end(best_key)
+        self.hits += 1
+        self.reused_tokens += best_n
+        return best_n, _crop(copy.deepcopy(self._entries[best_key]), best_n)
+
+    def put(self, ids: List[int], past):
+        if self.max_entries <= 0:
+            return
+        self._entries[tuple(ids)] = copy.deepcopy(past)
+        self._entries.move_to_end(tuple(ids))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class LocalModel:
+    """
+    Tokenizer + causal LM, used only from the worker thread.
+    """
+
+    def __init__(self, name: str, device: str = "auto", dtype: str = "auto"):
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        self.torch = torch
+        if device == "auto":
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        if dtype == "auto":
+            dtype = "float32" if device == "cpu" else (
+                "bfloat16" if torch.cuda.is_available() and torch.cuda.is_bf16_supported() else "float16")
+        self.device = device
+
+        token = config.HF_ACCESS_TOKEN or None
+        self.tok = AutoTokenizer.from_pretrained(name, token=token)
+        self.tok.padding_side = "left"            # batched generate needs left padding
+        if self.tok.pad_token_id is None:
+            self.tok.pad_token = self.tok.eos_token
+        self.model = AutoModelForCausalLM.from_pretrained(
+            name, token=token, torch_dtype=getattr(torch, dtype)).to(device).eval()
+
+        eos = self.model.generation_config.eos_token_id
+        self.eos_ids = set(eos if isinstance(eos, list) else [eos]) | {self.tok.eos_token_id}
+        self.eos_ids.discard(None)
+        self.cache = PrefixCache(config.HF_PREFIX_CACHE_ENTRIES)
+
+    def encode(self, messages: List[dict]) -> List[int]:
+        if getattr(self.tok, "chat_template", None):
+            return list(self.tok.apply_chat_template(messages, add_generation_prompt=True))
+        text = "\n\n".join(f"{m['role']}: {m['content']}" for m in messages) + "\n\nassistant: "
+        return self.tok(text)["input_ids"]
+
+    def _pick(self, logits, temperature: float) -> int:
+        if temperature <= 0:
+            return int(logits.argmax(-1))
+        probs = self.torch.softmax(logits / temperature, dim=-1)
+        return int(self.torch.multinomial(probs, 1))
+
+    def generate_one(self, ids: List[int], temperature: float,
+                     max_new_tokens: int) -> Iterator[str]:
+        """
+        Token-by-token decoding of one prompt, starting from the cached prefix.
+        """
+        torch = self.torch
+        n, past = self.cache.lookup(ids)
+        with torch.inference_mode():
+            out = self.model(input_ids=torch.tensor([ids[n:]], device=self.device),
+                             past_key_values=past, use_cache=True)
+            past = out.past_key_values
+            self.cache.put(ids, past)
+            logits = out.logits[0, -1]
+
+            gen: List[int] = []
+            emitted = ""
+            for _ in range(max_new_tokens):
+                nxt = self._pick(logits, temperature)
+                if nxt in self.eos_ids:
+                    break
+                gen.append(nxt)
+                text = self.tok.decode(gen, skip_special_tokens=True)
+                if not text.endswith("\ufffd"):        # wait for multi-byte characters
+                    yield text[len(emitted):]
+                    emitted = text
+                out = self.model(input_ids=torch.tensor([[nxt]], device=self.device),
+                                 past_key_values=past, use_cache=True)
+                past = out.past_key_values
+                logits = out.logits[0, -1]
+            text = self.tok.decode(gen, skip_special_tokens=True)
+            if text != emitted:
+                yield text[len(emitted):]
+
+    def generate_batch(self, batch: List[List[int]], temperature: float,
+                       max_new_tokens: int) -> List[str]:
+        """
+        One padded generate() call.  When the prompts' shared prefix is in the
+        prefix cache, its KV is repeated across the batch and only the
+        suffixes are prefilled: the padding then sits between prefix and
+        suffix, and the positions generate() derives from the mask skip it.
+        """
+        torch = self.torch
+        common = _common_prefix(batch)
+        n, past = self.cache.lookup(common) if len(common) > 1 else (0, None)
+        if past is None:
+            enc = self.tok.pad({"input_ids": batch}, padding=True, return_tensors="pt").to(self.device)
+        else:
+            width = max(len(ids) - n for ids in batch)
+            pad = self.tok.pad_token_id
+            rows, mask = [], []
+            for ids in batch:
+                gap = width - (len(ids) - n)
+                rows.append(ids[:n] + [pad] * gap + ids[n:])
+                mask.append([1] * n + [0] * gap + [1] * (len(ids) - n))
+            enc = {"input_ids": torch.tensor(rows, device=self.device),
+                   "attention_mask": torch.tensor(mask, device=self.device),
+                   "past_key_values": _repeat(past, len(batch))}
+        sampling = dict(do_sample=True, temperature=temperature) if temperature > 0 else dict(do_sample=False)
+        with self.torch.inference_mode():
+            out = self.model.generate(**enc, max_new_tokens=max_new_tokens,
+                                      pad_token_id=self.tok.pad_token_id, **sampling)
+        start = enc["input_ids"].shape[1]
+        return [self.tok.decode(row[start:], skip_special_tokens=True) for row in out]
+
+
+class _Worker:
+    """
+    Owns the model; serves the request queue, batching where it can.
+    """
+
+    def __init__(self):
+        self.requests: "queue.Queue[_Request]" = queue.Queue()
+        self.model: Optional[LocalModel] = None
+        self._held: "deque[_Request]" = deque()
+        threading.Thread(target=self._loop, name="hf-backend", daemon=True).start()
+
+    def _next(self, timeout: Optional[float] = None) -> Optional[_Request]:
+        if self._held:
+            return self._held.popleft()
+        try:
+            return self.requests.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _gather(self, first: _Request) -> List[_Request]:
+        batch = [first]
+        if first.stream:
+            return batch
+        deadline = time.monotonic() + config.HF_BATCH_WAIT_S
+        held = []
+        while len(batch) < config.HF_MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            req = self._next(remaining)
+            if req is None:
+                break
+            if req.stream or (req.temperature, req.max_new_tokens) != \
+                    (first.temperature, first.max_new_tokens):
+                held.append(req)            # served on its own next round
+            else:
+                batch.append(req)
+        self._held.extend(held)
+        return batch
+
+    def _run_one(self, req: _Request):
+        parts = []
+        for piece in self.model.generate_one(req.ids, req.temperature, req.max_new_tokens):
+            parts.append(piece)
+            if req.stream:
+                req.chunks.put(piece)
+        req.finish("".join(parts))
+
+    def _loop(self):
+        while True:
+            batch = self._gather(self._next())
+            try:
+                if self.model is None:
+                    self.model = LocalModel(config.HF_MODEL, config.HF_DEVICE, config.HF_DTYPE)
+                for req in batch:
+                    req.ids = self.model.encode(req.messages)
+                if len(batch) == 1:
+                    self._run_one(batch[0])
+                else:
+                    texts = self.model.generate_batch([r.ids for r in batch],
+                                                      batch[0].temperature, batch[0].max_new_tokens)
+                    for req, text in zip(batch, texts):
+                        req.finish(text)
+            except BaseException as e:
+                for req in batch:
+                    if not req.done.is_set():
+                        req.finish(error=e)
+
+
+_worker: Optional[_Worker] = None
+_lock = threading.Lock()
+
+
+def _submit(messages: List[dict], temperature: float, max_new_tokens: Optional[int],
+            stream: bool) -> _Request:
+    global _worker
+    with _lock:
+        if _worker is None:
+            _worker = _Worker()
+    req = _Request(messages, temperature, max_new_tokens or config.MAX_LLM_TOKENS, stream)
+    _worker.requests.put(req)
+    return req
+
+
+def complete(messages: List[dict], temperature: float = 0.0,
+             max_new_tokens: Optional[int] = None) -> str:
+    """
+    Generate the full response for one chat (blocks; safe from many threads).
+    """
+    req = _submit(messages, temperature, max_new_tokens, stream=False)
+    req.done.wait()
+    if req.error is not None:
+        raise req.error
+    return req.result
+
+
+def stream(messages: List[dict], temperature: float = 0.0,
+           max_new_tokens: Optional[int] = None) -> Iterator[str]:
+    """
+    Yield the response text piece by piece as it is generated.
+    """
+    req = _submit(messages, temperature, max_new_tokens, stream=True)
+    while True:
+        item = req.chunks.get()
+        if item is _STOP:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def stats() -> dict:
+    if _worker is None or _worker.model is None:
+        return {}
+    c = _worker.model.cache
+    return {"prefix_hits": c.hits, "prefix_misses": c.misses,
+            "reused_tokens": c.reused_tokens}
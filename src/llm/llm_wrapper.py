@@ -1,38 +1,188 @@
-from typing import List
+from typing import AsyncIterator, List, Optional
 from .. import config
-import re
+import asyncio, re
 from .prompts import builder
-import openai
+from . import response_cache, fake_backend, hf_backend
+from ..history import json_history as jh
+from ..history import tracing
 
-if config.MODEL_BACKEND == "openai":
-    openai.api_key = config.OPENAI_API_KEY
-else:  # huggingface
-    # However, this is not implemented in this demo
-    from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
-    _tokenizer = AutoTokenizer.from_pretrained(config.DEFAULT_HF_MODEL, token=config.HF_ACCESS_TOKEN)
-    _model     = AutoModelForCausalLM.from_pretrained(config.DEFAULT_HF_MODEL, token=config.HF_ACCESS_TOKEN, device_map="auto")
-    _pipe      = pipeline("text-generation", model=_model, tokenizer=_tokenizer)
+# backends are imported / loaded on first use, not at import time
+_openai = None
+
+def _openai_client():
+    global _openai
+    if _openai is None:
+        import openai
+        openai.api_key = config.OPENAI_API_KEY
+        _openai = openai
+    return _openai
 
 
 # code is easily extracted due to the consistent formatting of the gpt output
 FENCE = re.compile(r"```(?:python|sql)?\\s*([\\s\\S]*?)```", re.I)
 
 
-def chat(messages: List[dict]) -> str:
+_cache = None
+
+def _response_cache():
     """
-    Send a list of message dictionaries to the LLM backend and return the response content.
+    Lazily open the on-disk response cache (None when disabled).
+    """
+    global _cache
+    if _cache is None and config.LLM_CACHE_ENABLED:
+        _cache = response_cache.ResponseCache(config.CACHE_DIR / "llm_responses.sqlite")
+    return _cache
+
+def cache_stats() -> dict:
+    return _cache.stats() if _cache is not None else {}
+
+def _request(messages: List[dict], use_cache: bool, temperature: Optional[float]):
+    """
+    Resolve model / sampling parameters and look the call up in the cache.
+    Returns (model, params, cache, key, cached_content).
+    """
+    model  = config.DEFAULT_OPENAI_MODEL if config.MODEL_BACKEND == "openai" else config.HF_MODEL
+    params = dict(
+        temperature=config.TEMPERATURE if temperature is None else temperature,
+        max_tokens=config.MAX_LLM_TOKENS,
+    )
+    # sampled (temperature > 0) calls are meant to differ - never cache them
+    cache = _response_cache() if use_cache and params["temperature"] == 0 else None
+    key, hit = None, None
+    if cache:
+        key = response_cache.make_key(model, params, messages)
+        hit = cache.get(key)
+        jh.logger.debug(f"LLM cache {'hit' if hit is not None else 'miss'} {cache.stats()}")
+    return model, params, cache, key, hit
+
+def _record_usage(span, messages: List[dict], content: str, usage: Optional[dict] = None):
     """
-    if config.MODEL_BACKEND == "openai":
-        resp = openai.ChatCompletion.create(
-            model=config.DEFAULT_OPENAI_MODEL,
-            messages=messages,
-            temperature=config.TEMPERATURE,
-            max_tokens=config.MAX_LLM_TOKENS,
-        )
-        return code_catch(resp["choices"][0]["message"]["content"])
+    Put prompt / completion token counts on the span and the session counters;
+    estimated with the prompt tokenizer when the backend reports no usage.
+    """
+    if span is None:
+        return
+    if usage:
+        prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
     else:
-        # Huggingface model handling is not implemented in this demo
-        pass 
+        prompt = sum(builder.count_tokens(m["content"]) for m in messages)
+        completion = builder.count_tokens(content)
+    span.set(prompt_tokens=prompt, completion_tokens=completion)
+    tracing.count("llm.prompt_tokens", prompt)
+    tracing.count("llm.completion_tokens", completion)
+
+def _record_hit(span):
+    span.set(cache_hit=True)
+    tracing.count("llm.cache_hits")
+
+def chat(messages: List[dict], use_cache: bool = True,
+         temperature: Optional[float] = None) -> str:
+    """
+    Send a list of message dictionaries to the LLM backend and return the response content.
+    Deterministic (temperature 0) calls are answered from the response cache when possible;
+    use_cache=False bypasses it.
+    """
+    with tracing.span("llm.chat", backend=config.MODEL_BACKEND) as s:
+        if config.MODEL_BACKEND == "fake":
+            # offline stand-in: deterministic, never touches the response cache
+            content = fake_backend.complete(messages)
+            _record_usage(s, messages, content)
+            return code_catch(content)
+        model, params, cache, key, hit = _request(messages, use_cache, temperature)
+        s.set(model=model, temperature=params["temperature"])
+        if hit is not None:
+            _record_hit(s)
+            return code_catch(hit)
+
+        if config.MODEL_BACKEND == "openai":
+            resp = _openai_client().ChatCompletion.create(model=model, messages=messages, **params)
+            content = resp["choices"][0]["message"]["content"]
+            usage = resp.get("usage")
+        else:
+            # local Hugging Face model (batched with concurrent callers)
+            content = hf_backend.complete(messages, params["temperature"], params["max_tokens"])
+            usage = None
+        _record_usage(s, messages, content, usage)
+        if cache:
+            cache.put(key, content)
+        return code_catch(content)
+
+async def achat(messages: List[dict], use_cache: bool = True,
+                temperature: Optional[float] = None) -> str:
+    """
+    Async counterpart of chat().
+    """
+    if config.MODEL_BACKEND != "openai":
+        return await asyncio.to_thread(chat, messages, use_cache, temperature)
+
+    with tracing.span("llm.chat", backend=config.MODEL_BACKEND) as s:
+        model, params, cache, key, hit = _request(messages, use_cache, temperature)
+        s.set(model=model, temperature=params["temperature"])
+        if hit is not None:
+            _record_hit(s)
+            return code_catch(hit)
+        resp = await _openai_client().ChatCompletion.acreate(model=model, messages=messages, **params)
+        content = resp["choices"][0]["message"]["content"]
+        _record_usage(s, messages, content, resp.get("usage"))
+        if cache:
+            cache.put(key, content)
+        return code_catch(content)
+
+async def astream(messages: List[dict], use_cache: bool = True) -> AsyncIterator[str]:
+    """
+    Yield the response text as it is generated (a cache hit arrives in one piece).
+    Token usage is recorded on the caller's enclosing span: a generator that
+    is suspended between yields cannot own a span of its own.
+    """
+    if config.MODEL_BACKEND == "fake":
+        yield await asyncio.to_thread(chat, messages, use_cache)
+        return
+    if config.MODEL_BACKEND != "openai":
+        async for piece in _hf_astream(messages, use_cache):
+            yield piece
+        return
+
+    model, params, cache, key, hit = _request(messages, use_cache, None)
+    if hit is not None:
+        if tracing.current() is not None:
+            _record_hit(tracing.current())
+        yield hit
+        return
+    resp = await _openai_client().ChatCompletion.acreate(
+        model=model, messages=messages, stream=True, **params
+    )
+    parts = []
+    async for chunk in resp:
+        delta = chunk["choices"][0].get("delta", {}).get("content")
+        if delta:
+            parts.append(delta)
+            yield delta
+    _record_usage(tracing.current(), messages, "".join(parts))
+    if cache:
+        cache.put(key, "".join(parts))
+
+async def _hf_astream(messages: List[dict], use_cache: bool) -> AsyncIterator[str]:
+    """
+    Bridge hf_backend.stream() (a blocking iterator) onto the event loop.
+    """
+    model, params, cache, key, hit = _request(messages, use_cache, None)
+    if hit is not None:
+        if tracing.current() is not None:
+            _record_hit(tracing.current())
+        yield hit
+        return
+    it = hf_backend.stream(messages, params["temperature"], params["max_tokens"])
+    loop = asyncio.get_running_loop()
+    parts = []
+    while True:
+        piece = await loop.run_in_executor(None, next, it, None)
+        if piece is None:
+            break
+        parts.append(piece)
+        yield piece
+    _record_usage(tracing.current(), messages, "".join(parts))
+    if cache:
+        cache.put(key, "".join(parts))
 
 def code_catch(llm_out: str) -> str:
     """
@@ -54,4 +204,18 @@ def answer(
     Generate a natural-language answer from the LLM using the provided context.
     """
     msgs = builder.build_answer_prompt(question, summary, code, output, history_blob)
-    return chat(msgs)
\ No newline at end of file
+    return chat(msgs)
+
+async def astream_answer(
+    question: str,
+    summary: dict,
+    code: str,
+    output: str,
+    history_blob: str = "",
+) -> AsyncIterator[str]:
+    """
+    Stream the natural-language answer token by token.
+    """
+    msgs = builder.build_answer_prompt(question, summary, code, output, history_blob)
+    async for piece in astream(msgs):
+        yield piece
\ No newline at end of file
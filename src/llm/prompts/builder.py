@@ -1,35 +1,130 @@
 from . import templates as T
-import json
+from ... import config
+from ...analysis import profiler
+import csv, io
 
-def _schema_from_summary(summary: dict) -> dict:
+_ENC = None  # tiktoken encoding, loaded on the first count_tokens() call
+
+SCHEMA_KEY = "schema_block"  # rendered block is memoised on the summary dict
+
+def _encoding():
+    global _ENC
+    if _ENC is None:
+        try:
+            import tiktoken
+            _ENC = tiktoken.get_encoding("o200k_base")
+        except Exception:  # optional dependency
+            _ENC = False
+    return _ENC
+
+def count_tokens(text: str) -> int:
+    """
+    Token count with tiktoken when installed, else a ~4 chars/token estimate.
+    """
+    enc = _encoding()
+    if enc:
+        return len(enc.encode(text))
+    return (len(text) + 3) // 4
+
+def _cell(v, width: int) -> str:
+    s = "" if v is None or (isinstance(v, float) and v != v) else str(v)  # v != v: NaN
+    s = s.replace("\n", " ")
+    return s if len(s) <= width else s[: max(width - 1, 1)] + "…"
+
+def _rows_csv(columns, rows, width: int) -> str:
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow([_cell(c, width) for c in columns])
+    for r in rows:
+        w.writerow([_cell(r.get(c), width) for c in columns])
+    return buf.getvalue().rstrip("\n")
+
+def _render(summary: dict, n_head: int, n_sample: int, n_cols: int,
+            with_top: bool, width: int, n_names: int) -> str:
+    cols    = summary["columns"]
+    dtypes  = summary["dtypes"]
+    prof    = profiler.compact(summary.get("profile", {}))
+    lines = [f"Table: {summary['rows']} rows x {len(cols)} columns",
+             "column | dtype | nulls | distinct | range/format | top values"]
+    for c in cols[:n_cols]:
+        p = prof.get(str(c), {})
+        rng = p.get("format", "")
+        if "min" in p or "max" in p:
+            rng = f"{_cell(p.get('min'), width)}..{_cell(p.get('max'), width)}"
+        top = ", ".join(_cell(v, width) for v in p.get("top", [])) if with_top else ""
+        lines.append(f"{_cell(c, width)} | {dtypes.get(c, '')} | {p.get('nulls', 0)} | "
+                     f"{p.get('distinct', '')} | {rng} | {top}")
+    rest = cols[n_cols:]
+    if rest:
+        names = ", ".join(_cell(c, width) for c in rest[:n_names])
+        hidden = len(rest) - min(n_names, len(rest))
+        if hidden:
+            names += f"{', ' if names else ''}... ({hidden} not listed)"
+        lines.append(f"... {len(rest)} more columns: {names}")
+
+    head = summary["head"][:n_head]
+    if head:
+        lines += ["", "First rows (CSV):", _rows_csv(cols[:n_cols], head, width)]
+    sample = summary.get("sample", [])[:n_sample]
+    if sample:
+        lines += ["", "Random sample rows (CSV):", _rows_csv(cols[:n_cols], sample, width)]
+    return "\n".join(lines)
+
+def schema_block(summary: dict, budget: int | None = None) -> str:
     """
-    Convert the data summary into the JSON structure expected by the LLM.
+    Compact, token-budgeted description of the dataset.
+
+    Rendered once per session and memoised on the summary, so every prompt
+    (code, debug, SQL, answer) embeds the byte-identical block and providers
+    can reuse the cached prompt prefix.  When over budget, detail is shed in
+    order: sample rows, head rows, top values, cell width, per-column rows,
+    the names of the remaining columns, and finally the last per-column rows.
     """
-    return {
-        "n_rows": summary["rows"],
-        "columns": summary["columns"],
-        "dtypes": summary["dtypes"],
-        "numeric_cols": summary["numeric_cols"],
-        "head": summary["head"],  # First 5 rows for reference
-    }
+    if summary.get(SCHEMA_KEY) is not None and budget is None:
+        return summary[SCHEMA_KEY]
+    budget = budget or config.SCHEMA_TOKEN_BUDGET
+
+    n_cols = len(summary["columns"])
+    state = dict(n_head=len(summary["head"]), n_sample=len(summary.get("sample", [])),
+                 n_cols=n_cols, with_top=True, width=config.SCHEMA_CELL_CHARS,
+                 n_names=n_cols)
+    text = _render(summary, **state)
+    shrink = [
+        ("n_sample", lambda v: v - 1, lambda v: v > 0),
+        ("n_head",   lambda v: v - 1, lambda v: v > 1),
+        ("with_top", lambda v: False, lambda v: v),
+        ("width",    lambda v: v // 2, lambda v: v > 12),
+        ("n_cols",   lambda v: v * 3 // 4, lambda v: v > 8),
+        ("n_names",  lambda v: v * 3 // 4, lambda v: v > 0),
+        ("n_cols",   lambda v: v * 3 // 4, lambda v: v > 0),
+        ("n_head",   lambda v: v - 1, lambda v: v > 0),
+    ]
+    for key, step, can in shrink:
+        while count_tokens(text) > budget and can(state[key]):
+            state[key] = step(state[key])
+            text = _render(summary, **state)
+
+    summary[SCHEMA_KEY] = text
+    return text
 
 def build_code_prompt(
-    question: str, 
-    summary: dict, 
+    question: str,
+    summary: dict,
     memory: str = ""
 ) -> list[dict]:
     """
     Create a prompt for generating code based on the provided question, summary, and memory.
     """
-    schema = _schema_from_summary(summary)  
-    code_msg = ""
+    # schema first: the constant part of the prompt forms a reusable prefix
+    code_msg = (
+        "You are given the following DataFrame summary:\n"
+        f"{schema_block(summary)}\n\n"
+    )
     if memory:
         code_msg += ( "Here is the conversation/code history you must take into account:\n"
                     f"{memory}\n\n"
         )
     code_msg += (
-        "You are given the following DataFrame summary (as JSON):\n"
-        f"{json.dumps(schema, indent=2)}\n\n"
         f"**Task:** {question}\n\n"
         "Write Python code now."
     )
@@ -49,8 +144,10 @@ def build_debug_prompt(
     """
     Create a debug prompt using the error message, question, summary, and memory context.
     """
-    schema = _schema_from_summary(summary)
-    debug_msg = ""
+    debug_msg = (
+        "You are given the following DataFrame summary:\n"
+        f"{schema_block(summary)}\n\n"
+    )
     if memory:
         debug_msg += ("Conversation/code history:\n" + memory + "\n\n")
     debug_msg += (
@@ -58,8 +155,6 @@ def build_debug_prompt(
         f"```python\n{previous_code}\n```\n\n"
         "The traceback was:\n"
         f"{error}\n\n"
-        "You are given the following DataFrame summary (as JSON):\n"
-        f"{json.dumps(schema, indent=2)}\n\n"
         f"**Task (retry):** {question}\n\n"
         "Fix the code and reply with **ONLY executable Python**.\n"
         "**If the traceback shows a missing‑package or NameError for an undefined "
@@ -82,15 +177,12 @@ def build_answer_prompt(
     """
     Construct a full-context prompt for answering the given question.
     """
-    schema = _schema_from_summary(summary)
-    parts = []
+    parts = ["You are given the following DataFrame summary:\n" + schema_block(summary)]
     if history_blob:
         parts.append("Conversation context:\n" + history_blob)
 
     parts.append(
-        "You are given the following DataFrame summary (as JSON):\n"
-        f"{json.dumps(schema, indent=2)}\n\n"
-        + T.ANSWER_TEMPLATE.format(question=question, code=code, output=output)
+        T.ANSWER_TEMPLATE.format(question=question, code=code, output=output)
     )
 
     return [
@@ -99,23 +191,21 @@ def build_answer_prompt(
     ]
 
 def build_sql_prompt(question: str, summary: dict, memory="") -> list[dict]:
-    schema = _schema_from_summary(summary)
     msg = (
+        "Table schema of `data`:\n" + schema_block(summary) + "\n\n" +
         (f"Conversation context:\n{memory}\n\n" if memory else "") +
-        "Table schema (JSON):\n" + json.dumps(schema, indent=2) +
-        f"\n\n**Task:** {question}\n\nWrite SQL now."
+        f"**Task:** {question}\n\nWrite SQL now."
     )
     return [{"role": "system", "content": T.SYSTEM_SQL},
             {"role": "user", "content": msg}]
 
 def build_sql_debug_prompt(question, summary, error, prev_sql, memory="") -> list[dict]:
-    schema = _schema_from_summary(summary)
     msg = (
+        "Table schema of `data`:\n" + schema_block(summary) + "\n\n" +
         (f"History:\n{memory}\n\n" if memory else "") +
         "The previous SQL was:\n```\n" + prev_sql + "\n```\n\n"
         "Error:\n" + error + "\n\n" +
-        "Schema:\n" + json.dumps(schema, indent=2) +
-        f"\n\n**Task (retry):** {question}\n\nFix the SQL and return ONLY SQL."
+        f"**Task (retry):** {question}\n\nFix the SQL and return ONLY SQL."
     )
     return [{"role": "system", "content": T.SYSTEM_SQL},
             {"role": "user", "content": msg}]
@@ -10,7 +10,8 @@ A pandas DataFrame named **df** is ALREADY in memory and contains the full CSV.
 
 ────────── result contract ──────────
 • Put the **final answer** in a variable called `output_data`.
-  - It must be **JSON-serialisable** (list / dict of numbers & strings only).
+  - It must be **JSON-serialisable** (list / dict of numbers & strings only),
+    or a pandas DataFrame / Series for a tabular answer.
   - Strip currency symbols first; use numeric values.
 
 ────────── plot contract ────────────
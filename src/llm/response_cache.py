@@ -0,0 +1,92 @@
+"""
+Persistent on-disk cache of LLM responses.
+
+Keyed by a canonical hash of (model, sampling parameters, messages) and
+stored in a small SQLite file under CACHE_DIR.  Entries expire after a TTL
+and the least recently used ones are evicted beyond an entry / byte budget.
+"""
+from __future__ import annotations
+import hashlib, json, sqlite3, threading, time
+from pathlib import Path
+from typing import List, Optional
+
+from .. import config
+
+
+def make_key(model: str, params: dict, messages: List[dict]) -> str:
+    """
+    Canonical hash of everything that determines a deterministic response.
+    """
+    blob = json.dumps(
+        {"model": model, "params": params, "messages": messages},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: Path,
+                 max_entries: int = config.LLM_CACHE_MAX_ENTRIES,
+                 max_bytes: int = config.LLM_CACHE_MAX_BYTES,
+                 ttl_s: float = config.LLM_CACHE_TTL_S):
+        self.path        = Path(path)
+        self.max_entries = max_entries
+        self.max_bytes   = max_bytes
+        self.ttl_s       = ttl_s
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._con = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._con.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_used)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._con.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_s:
+                self.misses += 1
+                return None
+            self._con.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._con.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        con = self._con
+        con.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_s,))
+        n, size = con.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if n <= self.max_entries and size <= self.max_bytes:
+            return
+        # walk from the least recently used end until both budgets are met
+        drop = []
+        for key, sz in con.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if n <= self.max_entries and size <= self.max_bytes:
+                break
+            drop.append((key,))
+            n, size = n - 1, size - sz
+        con.executemany("DELETE FROM responses WHERE key = ?", drop)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._con.execute("DELETE FROM responses")
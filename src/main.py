@@ -1,38 +1,126 @@
-import json, textwrap, hashlib
+import argparse, asyncio, json, textwrap, time
+from collections import deque
 from datetime import datetime, timezone
 from pathlib import Path
-from .analysis import file_handler
+from . import config, speculative
+from .analysis import (code_validator, file_handler, index_advisor, result_payload,
+                       sql_preflight, sql_result)
 from .analysis.sandbox import sandbox_runner
 from .llm.prompts import builder
 from .llm import llm_wrapper
 from .history import json_history as jh
+from .history import tracing
 
 # Constants
 # Maximum number of retries for code generation
 MAX_RETRY = 3
+TAIL_N = 5 # Number of recent entries for context
 session_tag = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
 
 
-mode = input("Choose mode - [p]ython (default) or [s]ql: ").strip().lower()
-is_sql = mode.startswith("s")
-
-def run_session(csv_path: str):
-    # Load the CSV and generate a summary for the data
-    _, summary = file_handler.load_csv(csv_path)
-
-
+def _open_history(csv_path: str) -> jh.JSONHistory:
+    """
+    Create the per-session history file and point the module logger at it.
+    """
     # Create the directory for storing chat history if it doesn't exist
-    chat_history_dir = Path("src/history/chat_history")
+    chat_history_dir = jh.CHAT_HISTORY_DIR
     chat_history_dir.mkdir(parents=True, exist_ok=True)
 
     # Logger for the chat history
-    h = hashlib.md5(str(csv_path).encode()).hexdigest()[:8]
-    hist_path = chat_history_dir / f"hist_{h}_{session_tag}.json"
+    h = jh.history_key(csv_path)
+    jh.migrate_dir(chat_history_dir)
+    hist_path = chat_history_dir / f"hist_{h}_{session_tag}.jsonl"
     hist = jh.JSONHistory(hist_path)
     hist_logger = jh.make_logger(name_suffix=session_tag, level=jh.logging.DEBUG)
     jh.logger = hist_logger
+    tracing.configure(session_tag)
+    return hist
+
+def _memory_blob(rows) -> str:
+    # Construct a memory blob containing recent Q&A pairs
+    # and code/excution information for context
+    return "\n\n".join(
+        f"Q: {r['question']}\n"
+        f"Code: {r['code']}\n"
+        f"Key output: {r['output']}\n"
+        f"Explanation: {r['explain']}"
+        for r in rows
+    )
+
+def build_prompt(is_sql, question, summary, memory_blob, error, last_code) -> list:
+    """
+    Code / SQL prompt for the first attempt, debug prompt after an error.
+    """
+    if error is None:
+        return (builder.build_sql_prompt if is_sql else builder.build_code_prompt)(
+                question, summary, memory_blob)
+    return (builder.build_sql_debug_prompt if is_sql else builder.build_debug_prompt)(
+            question, summary, error, last_code, memory_blob)
+
+def execute(is_sql: bool, code: str, csv_path: str, columns=None, cancel=None):
+    # Run the generated code in a sandbox environment
+    # and capture the output
+    if is_sql:
+        # db path is <csv>.db created earlier
+        db_path = Path(csv_path).with_suffix(".db")
+        error, warnings = sql_preflight.check(code, db_path)
+        for w in warnings:
+            print(f"⚠️  {w}")
+        if error:
+            return "", None, [], error
+        return sandbox_runner.try_run_sql(code, db_path, cancel)
+    # catch certain failures on the host, without a sandbox round trip
+    error = code_validator.validate(code, columns)
+    if error:
+        return "", None, [], error
+    return sandbox_runner.try_run(code, csv_path, columns, cancel)
 
-    TAIL_N = 5 # Number of recent entries for context
+def render_output(stdout, ret_obj, plots):
+    """
+    Return (output_preview, plots_preview, combined_output) for a run.
+    """
+    plots_preview = ", ".join(Path(p).name for p in plots) if plots else ""
+    if sql_result.is_columnar(ret_obj):
+        # SQL: only the first rows and an aggregate description reach the prompt
+        output_preview = sql_result.preview(ret_obj)
+        combined_output = (stdout + "\n\nquery result (first rows, CSV):\n" + output_preview
+                           + "\n\nresult summary:\n" + sql_result.describe(ret_obj))
+        return output_preview, plots_preview, combined_output
+
+    if result_payload.is_offloaded(ret_obj):
+        # large / tabular output_data: the sandbox's summary stands in for it
+        output_preview = ret_obj["preview"]
+        combined_output = (stdout + "\n\noutput_data (" + result_payload.describe(ret_obj)
+                           + "), summary:\n" + output_preview)
+        return output_preview, plots_preview, combined_output
+
+    dumped = json.dumps(ret_obj, ensure_ascii=False) if ret_obj is not None else ""
+    output_preview = result_payload.clip(dumped) if ret_obj else ""
+    combined_output = stdout
+    if ret_obj is not None:
+        combined_output += "\n\noutput_data = " + output_preview
+    return output_preview, plots_preview, combined_output
+
+def _report(stdout, ret_obj, plots, error):
+    """
+    Print the attempt and return (output_preview, plots_preview, combined_output).
+    """
+    output_preview, plots_preview, combined_output = render_output(stdout, ret_obj, plots)
+    if error:
+        print(f"Error:\n{textwrap.indent(error, '   ')}")
+        return output_preview, plots_preview, ""
+
+    if output_preview:
+        print(f"🗂️  output_data preview:\n{textwrap.indent(output_preview, '   ')}")
+    if plots:
+        print(f"🖼️  Plots saved: {plots}")
+    return output_preview, plots_preview, combined_output
+
+def run_session(csv_path: str, is_sql: bool = False):
+    # history first: it also routes this session's trace file
+    hist = _open_history(csv_path)
+    # Load the CSV and generate a summary for the data
+    _, summary = file_handler.load_csv(csv_path)
 
     # Main loop to accept user questions and interact with the system
     while True:
@@ -41,88 +129,209 @@ def run_session(csv_path: str):
             break
 
         error = None
-        # Construct a memory blob containing recent Q&A pairs 
-        # and code/excution information for context
-        memory_blob = "\n\n".join(
-            f"Q: {r['question']}\n"
-            f"Code: {r['code']}\n"
-            f"Key output: {r['output']}\n"
-            f"Explanation: {r['explain']}"
-            for r in hist.tail(TAIL_N)
-        )
+        memory_blob = _memory_blob(hist.tail(TAIL_N))
 
         # Main loop to accept user questions and interact with the system
         last_code = ""
-        for attempt in range(1, MAX_RETRY + 1):
-            # Generate code using the LLM
-            if attempt == 1 or error is None:
-                msgs = (builder.build_sql_prompt if is_sql else builder.build_code_prompt)(
-                        question, summary, memory_blob)
+        with tracing.span("question", mode="sql" if is_sql else "python",
+                          question=question[:200]) as q:
+            for attempt in range(1, MAX_RETRY + 1):
+                q.set(attempts=attempt)
+                if attempt > 1:
+                    tracing.count("retries")
+                with tracing.span("attempt", n=attempt, retry=attempt > 1):
+                    # Generate code using the LLM
+                    with tracing.span("prompt.build"):
+                        msgs = build_prompt(is_sql, question, summary, memory_blob, error, last_code)
+                    hist.log_prompt(msgs[-1]["content"])
+                    if config.SPECULATIVE_CANDIDATES > 1:
+                        # one round of N parallel candidates instead of one program
+                        code, stdout, ret_obj, plots, error = speculative.run_round(
+                            msgs, lambda c, cancel: execute(is_sql, c, csv_path,
+                                                            summary["columns"], cancel))
+                        last_code = code
+                        print(f"\nGenerated code (attempt {attempt}, "
+                              f"{config.SPECULATIVE_CANDIDATES} candidates):\n{code}\n{'-'*40}")
+                    else:
+                        code = llm_wrapper.chat(msgs)
+                        last_code = code
+
+                        print(f"\nGenerated code (attempt {attempt}):\n{code}\n{'-'*40}")
+                        stdout, ret_obj, plots, error = execute(is_sql, code, csv_path, summary["columns"])
+                    with tracing.span("result.render"):
+                        output_preview, plots_preview, combined_output = _report(
+                            stdout, ret_obj, plots, error)
+
+                    if not error:
+                        # Generate a natural language answer of the query based on the code and output
+                        # history/and data information
+                        with tracing.span("llm.answer"):
+                            nl_answer = llm_wrapper.answer(
+                                question=question,
+                                summary=summary,
+                                code=code,
+                                output=combined_output,
+                                history_blob=memory_blob,
+                            )
+                        hist.log_response(nl_answer)
+                        print(f"🗨️  {nl_answer}")
+                        # Save the question, code, and response to the chat history
+                        # it will be used in future follow up questions
+                        # and for the next code generation
+                        hist.append(
+                             dict(
+                                 question=question,
+                                 code=code,
+                                 stdout=stdout,
+                                 output=output_preview,
+                                 plots=plots_preview,
+                                 explain=nl_answer,
+                             )
+                         )
+                        break
             else:
-                msgs = (builder.build_sql_debug_prompt if is_sql else builder.build_debug_prompt)(
-                        question, summary, error, last_code, memory_blob)
+                print("Failed after retries.")
+            q.set(ok=not error)
+    if is_sql:
+        _advise_indexes(csv_path, summary["db_path"])
+    _write_metrics()
+
+async def run_session_async(csv_path: str, is_sql: bool = False):
+    """
+    Same conversation as run_session, but non-blocking: LLM calls are async,
+    the answer is streamed as it is generated, and the history write plus the
+    next memory blob are prepared in the background while the user types.
+    """
+    hist = _open_history(csv_path)
+    _, summary = await asyncio.to_thread(file_handler.load_csv, csv_path)
+    recent = deque(hist.tail(TAIL_N), maxlen=TAIL_N)
+    memory_task = asyncio.create_task(asyncio.to_thread(_memory_blob, list(recent)))
+    pending = set()
 
-            code = llm_wrapper.chat(msgs)
-            last_code = code 
+    while True:
+        question = (await asyncio.to_thread(
+            input, "\n📝 Ask a data question (or 'exit'): ")).strip()
+        if question.lower() in {"exit", "quit"}:
+            break
 
+        error = None
+        memory_blob = await memory_task
+        last_code = ""
+        with tracing.span("question", mode="sql" if is_sql else "python",
+                          question=question[:200]) as q:
+            for attempt in range(1, MAX_RETRY + 1):
+                q.set(attempts=attempt)
+                if attempt > 1:
+                    tracing.count("retries")
+                with tracing.span("attempt", n=attempt, retry=attempt > 1):
+                    with tracing.span("prompt.build"):
+                        msgs = build_prompt(is_sql, question, summary, memory_blob, error, last_code)
+                    hist.log_prompt(msgs[-1]["content"])
+                    if config.SPECULATIVE_CANDIDATES > 1:
+                        # one round of N parallel candidates instead of one program
+                        code, stdout, ret_obj, plots, error = await speculative.first_success(
+                            msgs, lambda c, cancel: execute(is_sql, c, csv_path,
+                                                            summary["columns"], cancel))
+                        last_code = code
+                        print(f"\nGenerated code (attempt {attempt}, "
+                              f"{config.SPECULATIVE_CANDIDATES} candidates):\n{code}\n{'-'*40}")
+                    else:
+                        code = await llm_wrapper.achat(msgs)
+                        last_code = code
 
-            print(f"\nGenerated code (attempt {attempt}):\n{code}\n{'-'*40}")
-            # Run the generated code in a sandbox environment
-            # and capture the output
-            # execute
-            if is_sql:
-                # db path is <csv>.db created earlier
-                db_path = Path(csv_path).with_suffix(".db")
-                stdout, ret_obj, plots, error = sandbox_runner.try_run_sql(code, db_path)
-            else:
-                stdout, ret_obj, plots, error = sandbox_runner.try_run(code, csv_path)
-
-            output_preview = (
-                json.dumps(ret_obj, ensure_ascii=False) if ret_obj else ""
-            )
-            plots_preview = ", ".join(Path(p).name for p in plots) if plots else ""
-
-            if not error:
-                if output_preview:
-                    print(f"🗂️  output_data preview:\n{textwrap.indent(output_preview, '   ')}")
-                if plots:
-                    print(f"🖼️  Plots saved: {plots}")
-
-                combined_output = stdout
-                if ret_obj is not None:
-                    combined_output += "\n\noutput_data = " + json.dumps(ret_obj, ensure_ascii=False)
-
-
-                # Generate a natural language answer of the query based on the code and output
-                # history/and data information
-                nl_answer = llm_wrapper.answer(
-                    question=question,
-                    summary=summary,
-                    code=code,              
-                    output=combined_output,
-                    history_blob=memory_blob,  
-                )
-                hist.log_response(nl_answer)
-                print(f"🗨️  {nl_answer}")
-                # Save the question, code, and response to the chat history
-                # it will be used in future follow up questions
-                # and for the next code generation
-                hist.append(
-                     dict(
-                         question=question,
-                         code=code,
-                         stdout=stdout,
-                         output=output_preview,
-                         plots=plots_preview,
-                         explain=nl_answer,
-                     )
-                 )
-                break
+                        print(f"\nGenerated code (attempt {attempt}):\n{code}\n{'-'*40}")
+                        stdout, ret_obj, plots, error = await asyncio.to_thread(
+                            execute, is_sql, code, csv_path, summary["columns"])
+                    with tracing.span("result.render"):
+                        output_preview, plots_preview, combined_output = _report(
+                            stdout, ret_obj, plots, error)
+                    if error:
+                        continue
+
+                    print("🗨️  ", end="", flush=True)
+                    parts = []
+                    with tracing.span("llm.answer", streamed=True) as a:
+                        async for piece in llm_wrapper.astream_answer(
+                            question=question,
+                            summary=summary,
+                            code=code,
+                            output=combined_output,
+                            history_blob=memory_blob,
+                        ):
+                            if not parts:
+                                a.set(first_token_s=round((time.time_ns() - a.start_ns) / 1e9, 4))
+                            parts.append(piece)
+                            print(piece, end="", flush=True)
+                    print()
+                    nl_answer = "".join(parts).strip()
+
+                    row = dict(
+                        question=question,
+                        code=code,
+                        stdout=stdout,
+                        output=output_preview,
+                        plots=plots_preview,
+                        explain=nl_answer,
+                    )
+                    recent.append(row)
+
+                    # persist in the background; the next prompt only needs `recent`
+                    def _persist(row=row, answer=nl_answer):
+                        hist.log_response(answer)
+                        hist.append(row)
+                    task = asyncio.create_task(asyncio.to_thread(_persist))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                    break
             else:
-                print(f"Error:\n{textwrap.indent(error, '   ')}")
-        else:
-            print("Failed after retries.")
+                print("Failed after retries.")
+            q.set(ok=not error)
+        memory_task = asyncio.create_task(asyncio.to_thread(_memory_blob, list(recent)))
+
+    if pending:
+        await asyncio.gather(*pending)
+    if is_sql:
+        await asyncio.to_thread(_advise_indexes, csv_path, summary["db_path"])
+    _write_metrics()
+
+def _advise_indexes(csv_path: str, db_path):
+    """
+    Index the session DB for the SQL answered so far on this CSV.
+    """
+    for e in index_advisor.advise(db_path, index_advisor.history_queries(csv_path)):
+        print(f"🗂️  Index on ({', '.join(e['columns'])}) for {e['uses']} past queries "
+              f"({e['bytes'] / 1024**2:,.1f} MB)")
+
+def _write_metrics():
+    line = code_validator.log_stats()
+    if line:
+        print(f"🧪  {line}")
+    path = tracing.write_metrics()
+    if path:
+        print(f"📈  Timings: {path}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(
+        prog="python -m src.main",
+        description="Ask questions about a CSV in plain language; the answers are "
+                    "backed by generated Python (or SQL) run in a sandbox.")
+    ap.add_argument("csv", nargs="?", help="CSV file to analyse (prompted for if omitted)")
+    ap.add_argument("--mode", choices=("python", "sql"),
+                    help="answering style (prompted for if omitted)")
+    args = ap.parse_args(argv)
+
+    # the Docker probe runs while the user answers the prompts below
+    sandbox_runner.start_probe()
+    if args.mode:
+        is_sql = args.mode == "sql"
+    else:
+        mode = input("Choose mode - [p]ython (default) or [s]ql: ").strip().lower()
+        is_sql = mode.startswith("s")
+    csv = args.csv or input("Path to CSV: ").strip()
+    if config.ASYNC_PIPELINE:
+        asyncio.run(run_session_async(csv, is_sql))
+    else:
+        run_session(csv, is_sql)
 
 if __name__ == "__main__":
-    csv = input("Path to CSV: ").strip()
-    run_session(csv)
+    main()
@@ -0,0 +1,138 @@
+"""
+Speculative candidate generation: ask the LLM for several programs at once,
+run each in its own sandbox as soon as it arrives, keep the first one that
+satisfies the `output_data` contract and cancel the rest.
+
+Losing runs are stopped, not just abandoned: each run gets a CancelToken
+that the sandbox backend uses to kill it.  Sandbox runs go through one
+executor per parallelism bound, shared by every round, so a new round's
+runs queue behind any that are still winding down.
+"""
+from __future__ import annotations
+import asyncio, contextvars, functools, json, threading, weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import config
+from .analysis.sandbox.cancel import CancelToken
+from .llm import llm_wrapper
+
+# (code, stdout, return_obj, plots, error)
+Outcome = Tuple[str, str, object, list, str]
+
+_run_pools: Dict[int, ThreadPoolExecutor] = {}
+_llm_slots: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()   # loop -> {bound: Semaphore}
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+
+def satisfies_contract(ret_obj, error: str) -> bool:
+    """
+    Ran cleanly and produced a JSON-serialisable output_data.
+    """
+    if error or ret_obj is None:
+        return False
+    try:
+        json.dumps(ret_obj)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def _run_pool(max_parallel: int) -> ThreadPoolExecutor:
+    with _lock:
+        pool = _run_pools.get(max_parallel)
+        if pool is None:
+            pool = _run_pools[max_parallel] = ThreadPoolExecutor(
+                max_parallel, thread_name_prefix="speculative-run")
+        return pool
+
+
+def _llm_slot(max_parallel: int) -> asyncio.Semaphore:
+    # asyncio semaphores belong to one loop: one set per loop, kept across rounds
+    slots = _llm_slots.setdefault(asyncio.get_running_loop(), {})
+    if max_parallel not in slots:
+        slots[max_parallel] = asyncio.Semaphore(max_parallel)
+    return slots[max_parallel]
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="speculative-loop",
+                             daemon=True).start()
+        return _loop
+
+
+async def first_success(
+    msgs: List[dict],
+    execute: Callable[[str, CancelToken], tuple],
+    n: Optional[int] = None,
+    temperatures: Optional[List[float]] = None,
+    max_parallel: Optional[int] = None,
+) -> Outcome:
+    """
+    Race n candidates for one prompt.  Candidate i samples at
+    temperatures[i % len(temperatures)]; identical programs are executed
+    only once.  At most max_parallel LLM calls and max_parallel sandbox
+    runs are in flight at a time, across rounds.  execute(code, cancel)
+    must stop its run when the token is cancelled.
+
+    Returns the winning outcome, or the last failure if none passed.
+    """
+    n = n or config.SPECULATIVE_CANDIDATES
+    temperatures = temperatures or config.SPECULATIVE_TEMPERATURES
+    max_parallel = max_parallel or config.SPECULATIVE_MAX_PARALLEL
+    llm_slots = _llm_slot(max_parallel)
+    runs: dict = {}
+    tokens: List[CancelToken] = []
+
+    async def _run(code: str) -> tuple:
+        token = CancelToken()
+        tokens.append(token)
+        call = functools.partial(contextvars.copy_context().run, execute, code, token)
+        return await asyncio.get_running_loop().run_in_executor(_run_pool(max_parallel), call)
+
+    async def _candidate(i: int) -> Outcome:
+        async with llm_slots:
+            code = await llm_wrapper.achat(msgs, temperature=temperatures[i % len(temperatures)])
+        if code not in runs:
+            runs[code] = asyncio.ensure_future(_run(code))
+        stdout, ret_obj, plots, error = await asyncio.shield(runs[code])
+        return code, stdout, ret_obj, plots, error
+
+    tasks = [asyncio.create_task(_candidate(i)) for i in range(n)]
+    last: Optional[Outcome] = None
+    try:
+        for fut in asyncio.as_completed(tasks):
+            try:
+                outcome = await fut
+            except Exception as e:  # LLM / sandbox infrastructure failure
+                last = last or ("", "", None, [], str(e))
+                continue
+            if satisfies_contract(outcome[2], outcome[4]):
+                return outcome
+            last = outcome
+        return last
+    finally:
+        # losers: queued runs are dropped, running ones killed through their token
+        for t in tasks:
+            t.cancel()
+        for f in runs.values():
+            f.cancel()
+        for token in tokens:
+            token.cancel()
+
+
+def run_round(msgs: List[dict], execute: Callable[[str, CancelToken], tuple],
+              **kwargs) -> Outcome:
+    """
+    Blocking first_success for the synchronous session.  It runs on a
+    long-lived background loop: asyncio.run would also wait for the default
+    executor, i.e. for every losing run, before returning.
+    """
+    # the calling context (the tracing span) is carried into the round's task
+    return asyncio.run_coroutine_threadsafe(
+        first_success(msgs, execute, **kwargs), _background_loop()).result()
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from src import config
+from src.analysis import csv_cache, file_handler
+
+
+def test_streamed_summary_writes_the_frame_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(config, "CSV_CACHE_ENABLED", True)
+    # an integer column that only gets a missing value in a later chunk
+    n = 5000
+    df = pd.DataFrame({"a": pd.array(np.arange(n), dtype="Int64"),
+                       "b": np.linspace(0, 1, n),
+                       "c": [f"x{i}" for i in range(n)]})
+    df.loc[4000, "a"] = pd.NA
+    csv = tmp_path / "big.csv"
+    df.to_csv(csv, index=False)
+
+    writer = csv_cache.StreamWriter(csv)
+    summary = file_handler.summarize_csv(csv, chunk_rows=1000, frame_writer=writer)
+    out = writer.commit(summary["dtypes"])
+
+    assert out is not None
+    assert csv_cache.data_path(csv) == out
+    pd.testing.assert_frame_equal(csv_cache.read_frame(out), pd.read_csv(csv))
@@ -0,0 +1,47 @@
+from src.llm.prompts import builder
+
+
+def _summary(profile):
+    return {
+        "columns": list(profile),
+        "rows": 3,
+        "dtypes": {c: "int64" for c in profile},
+        "numeric_cols": list(profile),
+        "head": [],
+        "sample": [],
+        "profile": profile,
+    }
+
+
+def test_profile_without_max_renders():
+    # a legacy / hand-built profile may carry one bound only
+    summary = _summary({"a": {"nulls": 0, "distinct": 3, "min": -5}})
+    text = builder.schema_block(summary)
+    assert "-5.." in text
+
+
+def test_zero_bounded_column_keeps_both_bounds():
+    summary = _summary({"a": {"nulls": 0, "distinct": 3, "min": -5, "max": 0},
+                        "b": {"nulls": 0, "distinct": 3, "min": 0, "max": 100}})
+    text = builder.schema_block(summary)
+    assert "-5..0" in text
+    assert "0..100" in text
+    msgs = builder.build_code_prompt("how many rows?", summary)
+    assert "-5..0" in msgs[-1]["content"]
+
+
+def test_wide_frame_stays_within_budget():
+    cols = [f"measurement_column_{i:04d}" for i in range(800)]
+    summary = {
+        "columns": cols,
+        "rows": 10,
+        "dtypes": {c: "float64" for c in cols},
+        "numeric_cols": cols,
+        "head": [{c: 1.5 for c in cols}] * 5,
+        "sample": [{c: 2.5 for c in cols}] * 5,
+        "profile": {c: {"nulls": 1, "distinct": 10, "min": 0.0, "max": 99.5} for c in cols},
+    }
+    budget = 1500
+    text = builder.schema_block(summary, budget=budget)
+    assert builder.count_tokens(text) <= budget
+    assert "800 columns" in text